@@ -6,4 +6,4 @@ set -e
 set -u
 cd "$(dirname $0)/src"
 export PYTHONPATH="$PWD"
-python3 fme/core.py
+python3 fme/core.py "$@"
@@ -11,7 +11,8 @@ setup(
         '': 'src',
     },
     include_package_data=True,
-    packages=['fme'],
+    packages=['fme', 'fme.benchmarks'],
+    package_data={'fme.benchmarks': ['baselines.json']},
     url='https://github.com/Amsterdam/bgt',
     license='LICENSE.rst',
     description="Datapunt BGT transformaties in FME-cloud",
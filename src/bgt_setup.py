@@ -1,4 +1,5 @@
 import os
+from urllib.parse import urlparse
 
 DEBUG = os.getenv('DEBUG', False) == '1'
 SCRIPT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
@@ -13,6 +14,7 @@ GOB_OBJECTSTORE_TENANT_ID = os.getenv('GOB_OBJECTSTORE_TENANT_ID', 'tenant_id')
 
 GOB_OBJECTSTORE_CONTAINER = 'productie'
 
+FME_CLOUD_API_URL = 'https://api.fmecloud.safe.com/v1'
 FME_CLOUD_API_TOKEN = os.getenv('FMESERVERAPI', 'secret')
 FME_INSTANCE_API_TOKEN = os.getenv('FMEAPI', 'secret')
 FME_BASE_URL = os.getenv('FMESERVER', 'secret')
@@ -27,6 +29,46 @@ DB_FME_USER = os.getenv('BGT_DATABASE_ENV_POSTGRES_USER', 'dbuser')
 
 FME_TEST_RUN = os.getenv('FME_TEST_RUN', False) == '1'
 
+# Number of pipeline stages that may run at the same time
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', '4'))
+
+# Number of FME engines, at most this many FME jobs are submitted and not finished
+FME_ENGINES = int(os.getenv('FME_ENGINES', '2'))
+# Most FME jobs in flight per workspace name, for workspaces that should not run on all engines at once
+FME_WORKSPACE_LIMITS = {}
+
+# Times a failed NLCS/DGN chunk job is submitted again
+FME_CHUNK_RETRIES = int(os.getenv('FME_CHUNK_RETRIES', '2'))
+# Split a chunk that failed for lack of memory or disk space in halves instead.
+# Off by default: the chunk outputs are named by the workspaces, check they do not collide first.
+FME_SPLIT_FAILED_CHUNKS = os.getenv('FME_SPLIT_FAILED_CHUNKS', '0') == '1'
+
+# First and longest wait in seconds between two status checks of a running FME job
+FME_JOB_POLL_INITIAL_INTERVAL = float(os.getenv('FME_JOB_POLL_INITIAL_INTERVAL', '0.25'))
+FME_JOB_POLL_MAX_INTERVAL = float(os.getenv('FME_JOB_POLL_MAX_INTERVAL', '60'))
+
+# Files uploaded to FME at the same time, 1 uploads them one by one
+FME_UPLOAD_CONCURRENCY = int(os.getenv('FME_UPLOAD_CONCURRENCY', '4'))
+# Times the upload of a file is tried again after a connection error or 5xx response
+FME_UPLOAD_RETRIES = int(os.getenv('FME_UPLOAD_RETRIES', '3'))
+# Files downloaded from FME at the same time when zipping a product folder
+FME_DOWNLOAD_CONCURRENCY = int(os.getenv('FME_DOWNLOAD_CONCURRENCY', '8'))
+# Times a download from FME resumes after a connection error or 5xx response
+FME_DOWNLOAD_RETRIES = int(os.getenv('FME_DOWNLOAD_RETRIES', '3'))
+
+# Upload only new and changed workspaces and resources to FME, see `fme.manifest`
+FME_SYNC_UPLOADS = os.getenv('FME_SYNC_UPLOADS', '1') == '1'
+
+# Emulated FME server used by `--dry-run`
+DRY_RUN_JOB_DURATION = float(os.getenv('DRY_RUN_JOB_DURATION', '1'))
+DRY_RUN_FAILURE_RATE = float(os.getenv('DRY_RUN_FAILURE_RATE', '0'))
+DRY_RUN_ENGINES = int(os.getenv('DRY_RUN_ENGINES', str(FME_ENGINES)))
+
+# Local state of the import (checkpoints), mount a volume here to resume in a new container
+STATE_DIR = os.getenv('BGT_STATE_DIR', '/tmp/data/state')
+CHECKPOINT_FILE = os.path.join(STATE_DIR, 'checkpoint.json')
+RUN_REPORT_FILE = os.path.join(STATE_DIR, 'run_report.json')
+
 OBJECTSTORES = {
     'BGT': {
         'auth_version': '2.0',
@@ -54,3 +96,34 @@ OBJECTSTORES = {
 
 PDOK_DOWNLOAD_API_HOST = "https://api.pdok.nl"
 PDOK_DOWNLOAD_API = f"{PDOK_DOWNLOAD_API_HOST}/lv/bgt/download/v1_0"
+# Seconds to wait for PDOK to prepare a download
+PDOK_DOWNLOAD_TIMEOUT = int(os.getenv('PDOK_DOWNLOAD_TIMEOUT', '7200'))
+# The extract is downloaded in parts of this many bytes over this many connections, see `fme.ranged_download`
+PDOK_DOWNLOAD_CONNECTIONS = int(os.getenv('PDOK_DOWNLOAD_CONNECTIONS', '4'))
+PDOK_DOWNLOAD_PART_SIZE = int(os.getenv('PDOK_DOWNLOAD_PART_SIZE', str(32 * 1024 * 1024)))
+PDOK_DOWNLOAD_RETRIES = int(os.getenv('PDOK_DOWNLOAD_RETRIES', '5'))
+# Request the feature types in this many groups, concurrently, see `core.feature_type_groups`.
+# The large feature types get a group of their own, so the small ones can be loaded while they are generated.
+PDOK_DOWNLOAD_GROUPS = int(os.getenv('PDOK_DOWNLOAD_GROUPS', '1'))
+PDOK_LARGE_FEATURE_TYPES = ['wegdeel', 'begroeidterreindeel', 'onbegroeidterreindeel', 'ondersteunendwegdeel', 'pand']
+# Extract the GML files while the extract downloads, and upload them to FME as they come out when
+# FME_SYNC_UPLOADS is on, see `fme.progressive_unzip`
+PDOK_EXTRACT_WHILE_DOWNLOADING = os.getenv('PDOK_EXTRACT_WHILE_DOWNLOADING', '1') == '1'
+# Extract only the GML files of the feature types of the imgeo tables and app/source_data/075_mapping.csv,
+# see `fme.parallel_unzip.import_feature_types`
+PDOK_EXTRACT_MAPPED_ONLY = os.getenv('PDOK_EXTRACT_MAPPED_ONLY', '0') == '1'
+# Processes decompressing the members of a downloaded extract, the number of CPUs when 0. Used when
+# PDOK_EXTRACT_WHILE_DOWNLOADING is off, that extracts the members in a single thread as they come in
+PDOK_EXTRACT_PROCESSES = int(os.getenv('PDOK_EXTRACT_PROCESSES', '0'))
+# Skip the stages a previous run completed when PDOK published nothing new since, see `core.pdok_fingerprint`
+PDOK_SKIP_UNCHANGED = os.getenv('PDOK_SKIP_UNCHANGED', '1') == '1'
+
+# HTTP session of the REST calls, see `fme.http_session`
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '5'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+# (connect, read) timeouts in seconds, per host name
+HTTP_TIMEOUT = (10, 300)
+HTTP_HOST_TIMEOUTS = {
+    urlparse(PDOK_DOWNLOAD_API_HOST).hostname: (10, 120),
+    urlparse(FME_CLOUD_API_URL).hostname: (10, 60),
+}
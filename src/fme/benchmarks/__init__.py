@@ -0,0 +1,161 @@
+"""
+Benchmarks of the transfer and database paths, run against local stand-ins:
+the emulators in `fme.emulator` for FME filesys and Swift, and a local
+PostGIS (the `DB_FME_*` settings in `bgt_setup`) for the database paths.
+
+Run with ``python -m fme.benchmarks`` from :file:`src`, see ``--help``.
+Results are compared with the recorded baselines in :file:`baselines.json`.
+The baselines are relative to the time of `reference`, a fixed mix of local
+HTTP requests and compression timed on the same host before the benchmarks,
+so that they hold on faster and slower hosts alike.
+"""
+import json
+import logging
+import os
+import time
+import zlib
+from collections import OrderedDict
+
+from fme.emulator import Emulator
+from fme.http_session import session
+
+log = logging.getLogger(__name__)
+
+BASELINES_FILE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+# Timings shorter than this many seconds are mostly noise and not compared
+MINIMUM_SECONDS = 0.05
+
+BENCHMARKS = OrderedDict()
+
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark when its stand-in (e.g. PostGIS) is not available"""
+
+
+def benchmark(*sizes):
+    """
+    Register a benchmark that runs at each of `sizes`.
+
+    The benchmark is a generator function taking the size: it sets up, yields
+    the callable to time and cleans up after the yield.
+    """
+    def register(func):
+        BENCHMARKS[func.__name__] = (func, sizes)
+        return func
+    return register
+
+
+def run_benchmark(func, size, repeat=3) -> float:
+    """
+    Best wall time in seconds of `repeat` runs of benchmark `func` at `size`
+    """
+    generator = func(size)
+    target = next(generator)
+    try:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            target()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+    finally:
+        generator.close()
+
+
+def reference(size):
+    """`size` requests of 64 KB to a local emulator and compression of `size` times 64 KB"""
+    body = os.urandom(32 * 1024) * 2
+    with Emulator() as emulator:
+        emulator.route('GET', '/reference', lambda request: (200, {}, body))
+        url = emulator.url + '/reference'
+
+        def run():
+            for _ in range(size):
+                session.get(url).raise_for_status()
+                zlib.compress(body)
+        yield run
+
+
+def calibrate(repeat=3, size=100) -> float:
+    """
+    Best wall time in seconds of `repeat` runs of the `reference` workload on this host
+    """
+    seconds = run_benchmark(reference, size, repeat)
+    log.info("%-40s %8s %10.4f s", 'reference', size, seconds)
+    return seconds
+
+
+def run_all(names=None, repeat=3) -> dict:
+    """
+    Run the benchmarks
+    :param names: names of the benchmarks to run, all when None
+    :param repeat: runs per benchmark and size, the best one counts
+    :return: dict {name: {size: seconds}}
+    """
+    results = OrderedDict()
+    for name, (func, sizes) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        for size in sizes:
+            try:
+                seconds = run_benchmark(func, size, repeat)
+            except SkipBenchmark as e:
+                log.warning("Skipped %s: %s", name, e)
+                break
+            results.setdefault(name, OrderedDict())[str(size)] = seconds
+            log.info("%-40s %8s %10.4f s", name, size, seconds)
+    return results
+
+
+def load_baselines(path=BASELINES_FILE) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(results, reference_seconds, path=BASELINES_FILE):
+    """
+    Record `results` as baselines, relative to the time of the `reference` workload
+    :param results: dict {name: {size: seconds}}, see `run_all`
+    :param reference_seconds: the time of the reference workload, see `calibrate`
+    :param path: the baselines file
+    """
+    baselines = load_baselines(path)
+    for name, sizes in results.items():
+        baselines.setdefault(name, {}).update(
+            (size, seconds / reference_seconds) for size, seconds in sizes.items())
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+def without_baseline(results, baselines) -> list:
+    """
+    Benchmarks in `results` that have no baseline yet and are therefore not compared
+    :return: list of tuples (name, size)
+    """
+    return [(name, size) for name, sizes in results.items() for size in sizes
+            if size not in baselines.get(name, {})]
+
+
+def compare(results, baselines, reference_seconds, tolerance=0.25, minimum=MINIMUM_SECONDS) -> list:
+    """
+    Benchmarks that are more than `tolerance` slower than their baseline, relative
+    to the time of the `reference` workload. Timings shorter than `minimum` seconds
+    are not compared, nor are the benchmarks without a baseline, see `without_baseline`.
+    :param results: dict {name: {size: seconds}}, see `run_all`
+    :param baselines: dict {name: {size: multiple of the reference time}}
+    :param reference_seconds: the time of the reference workload, see `calibrate`
+    :return: list of tuples (name, size, seconds, baseline seconds on this host)
+    """
+    regressions = []
+    for name, sizes in results.items():
+        for size, seconds in sizes.items():
+            relative = baselines.get(name, {}).get(size)
+            if relative is None or seconds < minimum:
+                continue
+            baseline = relative * reference_seconds
+            if seconds > baseline * (1 + tolerance):
+                regressions.append((name, size, seconds, baseline))
+    return regressions
@@ -0,0 +1,45 @@
+import argparse
+import logging
+import sys
+
+from fme.benchmarks import BASELINES_FILE, calibrate, compare, load_baselines, run_all, save_baselines, without_baseline
+import fme.benchmarks.bench_database  # noqa: F401 registers the benchmarks
+import fme.benchmarks.bench_transfer  # noqa: F401 registers the benchmarks
+
+log = logging.getLogger('fme.benchmarks')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the BGT transfer and database paths")
+    parser.add_argument('names', nargs='*', help="benchmarks to run, default all")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark and size")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown compared to the baseline, relative to the reference workload")
+    parser.add_argument('--baselines', default=BASELINES_FILE, help="baselines file")
+    parser.add_argument('--update-baselines', action='store_true', help="store the results as new baselines")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    for name in ('fme', 'requests', 'urllib3', 'swiftclient'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    log.setLevel(logging.INFO)
+
+    reference_seconds = calibrate(repeat=args.repeat)
+    results = run_all(args.names, repeat=args.repeat)
+
+    if args.update_baselines:
+        save_baselines(results, reference_seconds, args.baselines)
+        log.info("Baselines written to %s", args.baselines)
+        return 0
+
+    baselines = load_baselines(args.baselines)
+    for name, size in without_baseline(results, baselines):
+        log.warning("%s at %s has no baseline and is not compared, record one with --update-baselines", name, size)
+    regressions = compare(results, baselines, reference_seconds, args.tolerance)
+    for name, size, seconds, baseline in regressions:
+        log.error("%s at %s: %.4f s, baseline %.4f s", name, size, seconds, baseline)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Database paths, against a local PostGIS configured with the `DB_FME_*`
+settings in `bgt_setup`. Skipped when that database is not available.
+"""
+import os
+import shutil
+import tempfile
+
+import psycopg2
+
+import bgt_setup
+import fme.comparison as fme_comparison
+import fme.core as fme_core
+from fme.benchmarks import SkipBenchmark, benchmark
+from fme.emulator import emulated_services
+from fme.sql_utils import SQLRunner
+
+POINT = 'POINT(121000 487000)'
+
+
+def _local_db():
+    try:
+        return SQLRunner(
+            host=bgt_setup.DB_FME_HOST, port=bgt_setup.DB_FME_PORT, dbname=bgt_setup.DB_FME_DBNAME,
+            user=bgt_setup.DB_FME_USER, password=bgt_setup.DB_FME_PW)
+    except psycopg2.OperationalError as e:
+        raise SkipBenchmark("no local PostGIS: {}".format(str(e).strip()))
+
+
+@benchmark(100, 1000, 10000)
+def import_csv_fixture(size):
+    """Import a CSV of `size` rows with `SQLRunner.import_csv_fixture`"""
+    db = _local_db()
+    db.run_sql("DROP TABLE IF EXISTS public.benchmark_csv;"
+               "CREATE TABLE public.benchmark_csv (gmlnaam varchar, dbnaam varchar);")
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+        f.write('gmlnaam;dbnaam\n')
+        for i in range(size):
+            f.write('plantcover_{0};BGT_BEGROEIDTERREINDEEL_{0}\n'.format(i))
+    try:
+        yield lambda: db.import_csv_fixture(f.name, 'public.benchmark_csv')
+    finally:
+        os.remove(f.name)
+        db.run_sql("DROP TABLE public.benchmark_csv;")
+        db.close()
+
+
+@benchmark(100, 1000, 5000)
+def upload_over_onderbouw_backup(size):
+    """Load `size` over- and onderbouw rows from the (emulated) GOB objectstore"""
+    db = _local_db()
+    tables = ['CFT_Onderbouw', 'CFT_Overbouw']
+    db.run_sql("CREATE SCHEMA IF NOT EXISTS imgeo;" + ''.join(
+        'DROP TABLE IF EXISTS imgeo."{0}";'
+        'CREATE TABLE imgeo."{0}" (guid varchar, relatievehoogteligging integer, bestandsnaam varchar,'
+        ' geometrie geometry(Geometry, 28992));'.format(table) for table in tables))
+
+    rows = ['guid;begin_geldigheid;eind_geldigheid;relatievehoogteligging;geometrie'] + [
+        '$${};;;-1;{}'.format(i, POINT) for i in range(size)]
+    content = ('\n'.join(rows) + '\n').encode('utf-8')
+
+    create_fme_sql_connection = fme_core.create_fme_sql_connection
+    with emulated_services(start_delay=0, instance_state='RUNNING') as (_, swift):
+        for filename in ('CFT_onderbouw.csv', 'CFT_overbouw.csv'):
+            swift.containers[bgt_setup.GOB_OBJECTSTORE_CONTAINER]['bgt/CSV_Actueel/' + filename] = content
+        fme_core.create_fme_sql_connection = lambda: db
+        try:
+            yield fme_core.upload_over_onderbouw_backup
+        finally:
+            fme_core.create_fme_sql_connection = create_fme_sql_connection
+            db.run_sql(''.join('DROP TABLE imgeo."{}";'.format(table) for table in tables))
+            db.close()
+
+
+@benchmark(100, 1000)
+def compare_counts(size):
+    """`comparison._compare_counts` with `size` features per GML file and table"""
+    if not shutil.which('ogrinfo'):
+        raise SkipBenchmark("ogrinfo is not installed")
+    db = _local_db()
+
+    script_root = bgt_setup.SCRIPT_ROOT
+    bgt_setup.SCRIPT_ROOT = tempfile.mkdtemp()
+    gml_dir = os.path.join(fme_comparison.create_work_dir(), 'GML')
+    os.makedirs(gml_dir)
+
+    db.run_sql("CREATE SCHEMA IF NOT EXISTS imgeo;")
+    for gml_name, (feature_type, table) in fme_comparison.GML_DISPATCH.items():
+        with open(os.path.join(gml_dir, gml_name + '.gml'), 'w') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml">\n')
+            for i in range(size):
+                f.write('<gml:featureMember><{0} gml:id="f{1}"><id>{1}</id><geometrie><gml:Point>'
+                        '<gml:pos>121000 487000</gml:pos></gml:Point></geometrie></{0}></gml:featureMember>\n'
+                        .format(feature_type, i))
+            f.write('</gml:FeatureCollection>\n')
+        db.run_sql("DROP TABLE IF EXISTS imgeo.{0}; CREATE TABLE imgeo.{0} AS SELECT generate_series(1, {1}) AS id;"
+                   .format(table, size))
+    try:
+        yield lambda: fme_comparison._compare_counts(db.host, db.port, db.dbname, db.user, db.password)
+    finally:
+        for _, table in fme_comparison.GML_DISPATCH.values():
+            db.run_sql("DROP TABLE imgeo.{};".format(table))
+        db.close()
+        shutil.rmtree(bgt_setup.SCRIPT_ROOT, ignore_errors=True)
+        bgt_setup.SCRIPT_ROOT = script_root
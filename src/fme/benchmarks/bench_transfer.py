@@ -0,0 +1,65 @@
+"""
+Transfers to and from FME and the objectstore, against the emulators
+"""
+import os
+import tempfile
+
+import fme.fme_utils as fme_utils
+import fme.transform_dgn as transform_dgn
+import fme.transform_nlcs as transform_nlcs
+from fme.benchmarks import benchmark
+from fme.emulator import emulated_services
+
+MB = 1024 * 1024
+KB = 1024
+
+
+def _services():
+    return emulated_services(job_duration=0, start_delay=0, instance_state='RUNNING')
+
+
+@benchmark(1, 10, 50)
+def fme_upload(size):
+    """Upload `size` MB in 10 GML files to FME"""
+    with _services(), tempfile.TemporaryDirectory() as directory:
+        for i in range(10):
+            with open(os.path.join(directory, 'bgt_{}.gml'.format(i)), 'wb') as f:
+                f.write(os.urandom(size * MB // 10))
+        yield lambda: fme_utils.upload(directory, 'resources/connections', 'Import_GML', '*.gml')
+
+
+@benchmark(1, 10, 50)
+def fme_download(size):
+    """Download a file of `size` MB from FME"""
+    with _services() as (fme, _):
+        fme.write_file('BGT_uitwissel/data.bin', os.urandom(size * MB))
+        yield lambda: fme_utils.download('BGT_uitwissel/data.bin', text=False)
+
+
+def _product_files(fme, folder, count):
+    for i in range(count):
+        fme.write_file('{}/{}.dgn'.format(folder, i), os.urandom(10 * KB))
+
+
+@benchmark(10, 100, 1000)
+def upload_dgn_files(size):
+    """Zip `size` DGN files of 10 KB from FME and upload them to the objectstore"""
+    with _services() as (fme, _):
+        _product_files(fme, 'DGNv8', size)
+        yield transform_dgn.upload_dgn_files
+
+
+@benchmark(10, 100, 1000)
+def upload_nlcs_vlakken_files(size):
+    """Zip `size` NLCS vlakken files of 10 KB from FME and upload them to the objectstore"""
+    with _services() as (fme, _):
+        _product_files(fme, 'DGNv8_vlakken_NLCS/BGT_NLCS_V', size)
+        yield transform_nlcs.upload_nlcs_vlakken_files
+
+
+@benchmark(10, 100, 1000)
+def upload_nlcs_lijnen_files(size):
+    """Zip `size` NLCS lijnen files of 10 KB from FME and upload them to the objectstore"""
+    with _services() as (fme, _):
+        _product_files(fme, 'DGNv8_lijnen_NLCS/BGT_NLCS_L', size)
+        yield transform_nlcs.upload_nlcs_lijnen_files
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+
+class Checkpoint(object):
+    """
+    Durable record of the progress of an import run.
+
+    Per stage the inputs, outputs, FME jobs and completion are stored in a
+    JSON file that is rewritten atomically after every change, so a crashed
+    run can be resumed from the stages that are left.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def load(self):
+        """
+        Load the checkpoint of an earlier run, if there is one
+        :return: self
+        """
+        with self.lock:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self.stages = json.load(f).get('stages', {})
+                log.info("Loaded checkpoint %s", self.path)
+            else:
+                self.stages = {}
+        return self
+
+    def reset(self):
+        """
+        Forget all progress, used when a new run is started
+        :return: self
+        """
+        with self.lock:
+            self.stages = {}
+            self._save()
+        return self
+
+    def keep(self, names):
+        """
+        Forget the progress of all stages but `names`
+        :param names: the stage names to keep
+        :return: self
+        """
+        with self.lock:
+            self.stages = {name: stage for name, stage in self.stages.items() if name in names}
+            self._save()
+        return self
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump({'stages': self.stages}, f, indent=2, default=repr)
+        os.replace(tmp_path, self.path)
+
+    def _stage(self, name) -> dict:
+        return self.stages.setdefault(name, {'inputs': None, 'outputs': None, 'jobs': [], 'completed': False})
+
+    def is_complete(self, name) -> bool:
+        with self.lock:
+            return self.stages.get(name, {}).get('completed', False)
+
+    def inputs(self, name):
+        """
+        The inputs recorded when stage `name` was started, see `start`
+        :param name: the stage name
+        :return: the inputs or None
+        """
+        with self.lock:
+            return self.stages.get(name, {}).get('inputs')
+
+    def jobs(self, name) -> list:
+        """
+        The FME jobs submitted by stage `name`
+        :param name: the stage name
+        :return: list of dicts with `jobid` and `urltransform`
+        """
+        with self.lock:
+            return list(self.stages.get(name, {}).get('jobs', []))
+
+    def start(self, name, inputs=None):
+        with self.lock:
+            stage = self._stage(name)
+            stage['inputs'] = inputs
+            stage['started'] = datetime.now().isoformat()
+            self._save()
+
+    def record_job(self, name, job):
+        """
+        Record a FME job submitted by stage `name`, replacing the job recorded
+        earlier for the same `task` of the stage
+        :param name: the stage name
+        :param job: dict with `jobid`, `urltransform` and `task`
+        :return:
+        """
+        with self.lock:
+            stage = self._stage(name)
+            stage['jobs'] = [recorded for recorded in stage['jobs'] if recorded.get('task') != job.get('task')]
+            stage['jobs'].append(job)
+            self._save()
+
+    def complete(self, name, outputs=None):
+        with self.lock:
+            stage = self._stage(name)
+            stage['outputs'] = outputs
+            stage['completed'] = True
+            stage['finished'] = datetime.now().isoformat()
+            self._save()
@@ -7,10 +7,46 @@ from subprocess import Popen, PIPE, STDOUT
 import psycopg2
 
 import bgt_setup
+import fme.remote_zip as remote_zip
 import fme.sql_utils as fme_sql_utils
 
 log = logging.getLogger(__name__)
 
+# GML file name: [GML feature type, database table]
+GML_DISPATCH = {
+    'bgt_begroeidterreindeel': ['plantcover', 'bgt_begroeidterreindeel'],
+    'bgt_onbegroeidterreindeel': ['onbegroeidterreindeel', 'bgt_onbegroeidterreindeel'],
+    'bgt_ondersteunendwaterdeel': ['ondersteunendwaterdeel', 'bgt_ondersteunendwaterdeel'],
+    'bgt_ondersteunendwegdeel': ['auxiliarytrafficarea', 'bgt_ondersteunendwegdeel'],
+    'bgt_ongeclassificeerdobject': ['ongeclassificeerdobject', 'bgt_ongeclassificeerdobject'],
+    'bgt_openbareruimtelabel': ['openbareruimtelabel', 'bgt_openbareruimtelabel'],
+    'bgt_overbruggingsdeel': ['bridgeconstructionelement', 'bgt_overbruggingsdeel'],
+    'bgt_pand': ['buildingpart', 'bgt_pand'],
+    'bgt_plaatsbepalingspunt': ['plaatsbepalingspunt', 'bgt_plaatsbepalingspunt'],
+    'bgt_tunneldeel': ['tunnelpart', 'bgt_tunneldeel'],
+    'bgt_waterdeel': ['waterdeel', 'bgt_waterdeel'],
+    'bgt_wegdeel': ['trafficarea', 'bgt_wegdeel'],
+    'bgt_bak': ['bak', 'imgeo_bak'],
+    'bgt_bord': ['bord', 'imgeo_bord'],
+    'bgt_functioneelgebied': ['functioneelgebied', 'imgeo_functioneelgebied'],
+    'bgt_gebouwinstallatie': ['buildingInstallation', 'imgeo_gebouwinstallatie'],
+    'bgt_installatie': ['installatie', 'imgeo_installatie'],
+    'bgt_kast': ['kast', 'imgeo_kast'],
+    'bgt_kunstwerkdeel': ['kunstwerkdeel', 'imgeo_kunstwerkdeel'],
+    'bgt_mast': ['mast', 'imgeo_mast'],
+    'bgt_overigbouwwerk': ['overigbouwwerk', 'imgeo_overigbouwwerk'],
+    'bgt_overigescheiding': ['overigescheiding', 'imgeo_overigescheiding'],
+    'bgt_paal': ['paal', 'imgeo_paal'],
+    'bgt_put': ['put', 'imgeo_put'],
+    'bgt_scheiding': ['scheiding', 'imgeo_scheiding'],
+    'bgt_sensor': ['sensor', 'imgeo_sensor'],
+    'bgt_spoor': ['railway', 'imgeo_spoor'],
+    'bgt_straatmeubilair': ['straatmeubilair', 'imgeo_straatmeubilair'],
+    'bgt_vegetatieobject': ['solitaryvegetationobject', 'imgeo_vegetatieobject'],
+    'bgt_waterinrichtingselement': ['waterinrichtingselement', 'imgeo_waterinrichtingselement'],
+    'bgt_weginrichtingselement': ['weginrichtingselement', 'imgeo_weginrichtingselement']
+}
+
 
 def create_work_dir():
     workdir = '{}/work'.format(bgt_setup.SCRIPT_ROOT)
@@ -19,9 +55,27 @@ def create_work_dir():
     return workdir
 
 
-def compare_before_after_counts_csv(host, port, dbname, user, password):
+def fetch_gml_files(url) -> list:
+    """
+    Fetch the GML files of `GML_DISPATCH` that are compared from the PDOK extract at `url`
+    into the work directory, without downloading the other members, see `fme.remote_zip`
+    :param url: url of the extract, of a server that supports Range requests
+    :return: paths of the GML files
+    """
+    names = ['{}.gml'.format(name) for name in GML_DISPATCH]
+    return remote_zip.extract_members(url, names, '{}/GML'.format(create_work_dir()))
+
+
+def compare_before_after_counts_csv(host, port, dbname, user, password, gml_url=None):
+    """
+    Write the number of objects per GML file and per table to a CSV file in the work directory
+    :param gml_url: url of the PDOK extract to fetch the GML files from, see `fetch_gml_files`,
+        None when they are in the work directory
+    """
     log.info('Aanmaken csv bestand met vergelijking aantallen database vs. gml bstanden.')
     workdir = create_work_dir()
+    if gml_url is not None:
+        fetch_gml_files(gml_url)
     csv_name = '{}/results/vergelijkings_resultaat-{}.csv'.format(workdir, datetime.now().strftime("%Y%m%d-%H%M%S"))
     results_table = [[k, v['db'], v['file']] for k, v in _compare_counts(host, port, dbname, user, password).items()]
     with open(csv_name, 'w') as csvfile:
@@ -34,39 +88,6 @@ def compare_before_after_counts_csv(host, port, dbname, user, password):
 
 def _compare_counts(host, port, dbname, user, password):
     workdir = create_work_dir()
-    gml_dispatch = {
-        'bgt_begroeidterreindeel': ['plantcover', 'bgt_begroeidterreindeel'],
-        'bgt_onbegroeidterreindeel': ['onbegroeidterreindeel', 'bgt_onbegroeidterreindeel'],
-        'bgt_ondersteunendwaterdeel': ['ondersteunendwaterdeel', 'bgt_ondersteunendwaterdeel'],
-        'bgt_ondersteunendwegdeel': ['auxiliarytrafficarea', 'bgt_ondersteunendwegdeel'],
-        'bgt_ongeclassificeerdobject': ['ongeclassificeerdobject', 'bgt_ongeclassificeerdobject'],
-        'bgt_openbareruimtelabel': ['openbareruimtelabel', 'bgt_openbareruimtelabel'],
-        'bgt_overbruggingsdeel': ['bridgeconstructionelement', 'bgt_overbruggingsdeel'],
-        'bgt_pand': ['buildingpart', 'bgt_pand'],
-        'bgt_plaatsbepalingspunt': ['plaatsbepalingspunt', 'bgt_plaatsbepalingspunt'],
-        'bgt_tunneldeel': ['tunnelpart', 'bgt_tunneldeel'],
-        'bgt_waterdeel': ['waterdeel', 'bgt_waterdeel'],
-        'bgt_wegdeel': ['trafficarea', 'bgt_wegdeel'],
-        'bgt_bak': ['bak', 'imgeo_bak'],
-        'bgt_bord': ['bord', 'imgeo_bord'],
-        'bgt_functioneelgebied': ['functioneelgebied', 'imgeo_functioneelgebied'],
-        'bgt_gebouwinstallatie': ['buildingInstallation', 'imgeo_gebouwinstallatie'],
-        'bgt_installatie': ['installatie', 'imgeo_installatie'],
-        'bgt_kast': ['kast', 'imgeo_kast'],
-        'bgt_kunstwerkdeel': ['kunstwerkdeel', 'imgeo_kunstwerkdeel'],
-        'bgt_mast': ['mast', 'imgeo_mast'],
-        'bgt_overigbouwwerk': ['overigbouwwerk', 'imgeo_overigbouwwerk'],
-        'bgt_overigescheiding': ['overigescheiding', 'imgeo_overigescheiding'],
-        'bgt_paal': ['paal', 'imgeo_paal'],
-        'bgt_put': ['put', 'imgeo_put'],
-        'bgt_scheiding': ['scheiding', 'imgeo_scheiding'],
-        'bgt_sensor': ['sensor', 'imgeo_sensor'],
-        'bgt_spoor': ['railway', 'imgeo_spoor'],
-        'bgt_straatmeubilair': ['straatmeubilair', 'imgeo_straatmeubilair'],
-        'bgt_vegetatieobject': ['solitaryvegetationobject', 'imgeo_vegetatieobject'],
-        'bgt_waterinrichtingselement': ['waterinrichtingselement', 'imgeo_waterinrichtingselement'],
-        'bgt_weginrichtingselement': ['weginrichtingselement', 'imgeo_weginrichtingselement']
-    }
 
     def count_table_rows(table, host=host, port=port, database=dbname, user=user, password=password):
         res = -1
@@ -103,7 +124,7 @@ def _compare_counts(host, port, dbname, user, password):
         os.makedirs('{}/log'.format(workdir))
 
     result_items = {}
-    for k, v in gml_dispatch.items():
+    for k, v in GML_DISPATCH.items():
         result_items[k] = {'file': -1, 'db': -1}
         result_items[k]['file'] = count_file_object(k, v[0])
         result_items[k]['db'] = count_table_rows(v[1])
@@ -1,12 +1,18 @@
+import argparse
 import json
 import logging
 import os
-import time
 import urllib.parse
 import urllib.request
 import csv
+import glob
+import hashlib
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from zipfile import ZipFile
+from fnmatch import fnmatch
+from functools import partial
+from zipfile import ZipFile, ZipInfo
 
 import requests
 
@@ -15,7 +21,18 @@ import fme.comparison as fme_comparison
 import fme.fme_server as fme_server
 import fme.fme_utils as fme_utils
 import fme.sql_utils as fme_sql_utils
+import fme.parallel_unzip as parallel_unzip
 import fme.polygon as polygon
+import fme.progressive_unzip as progressive_unzip
+import fme.ranged_download as ranged_download
+from fme.run_report import report
+from fme.checkpoint import Checkpoint
+from fme.emulator import emulated_services
+from fme.http_session import session
+from fme.job_monitor import JobMonitor
+from fme.job_queue import JobQueue, JobTask, RetryPolicy, run_tasks
+from fme.pipeline import Pipeline
+from fme.polling import poll
 from fme.transform_db import start_transformation_db
 from fme.transform_dgn import start_transformation_dgn, upload_dgn_files
 from fme.transform_gebieden import start_transformation_gebieden, upload_gebieden
@@ -72,14 +89,38 @@ def upload_pdok_zip_to_objectstore():
     """
     store = ObjectStore('BGT')
     log.info("Upload BGT source zip")
-    content = open('extract_bgt.zip', 'rb').read()
 
     # timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
     filename = 'BGT_Totaal/GML_totaal-latest.zip'
-    store.put_to_objectstore(filename, content, 'application/octet-stream')
+    archives = pdok_archives()
+    if len(archives) == 1:
+        with open(archives[0], 'rb') as content:
+            store.put_to_objectstore(filename, content, 'application/octet-stream')
+    else:
+        # the extracts per group of feature types as one zip, as a single download
+        store.put_stream(filename, partial(_merge_archives, archives), 'application/octet-stream')
     log.info("Uploaded {} to objectstore BGT/BGT_Totaal/".format(filename))
 
 
+def _merge_archives(archives, f):
+    """
+    Write a zip with the members of all `archives` to the file-like object `f`, which
+    need not be seekable. The members are streamed in blocks, decompressed from the
+    extract and compressed again, so memory use does not depend on their size.
+    """
+    with ZipFile(f, 'w') as merged:
+        for archive in archives:
+            with ZipFile(archive) as zf:
+                for info in zf.infolist():
+                    member = ZipInfo(info.filename, info.date_time)
+                    member.compress_type = info.compress_type
+                    member.external_attr = info.external_attr
+                    # the size decides whether the member needs zip64 fields, which cannot be added afterwards
+                    member.file_size = info.file_size
+                    with zf.open(info) as source, merged.open(member, 'w') as target:
+                        shutil.copyfileobj(source, target, 1024 * 1024)
+
+
 def get_gob_over_onderbouw_files():
     """
     Downloads overbouw and onderbouw files from GOB objectstore.
@@ -117,6 +158,7 @@ def upload_over_onderbouw_backup():
     db = create_fme_sql_connection()
 
     for file_location, object_type in files:
+        rows = 0
         with open(file_location, 'r') as f:
             reader = csv.reader(f, delimiter=';')
 
@@ -128,80 +170,226 @@ def upload_over_onderbouw_backup():
                       f"VALUES ('{guid.replace('$$', '')}', {relatievehoogteligging}, '{object_type}', " \
                       f"ST_GeomFromText('{geometrie}', 28992));"
                 db.run_sql(sql)
+                rows += 1
+        report.add_rows_inserted(f"imgeo.{object_type}", rows)
+
+
+def pdok_extract_feature_types():
+    """
+    The feature types to extract from a PDOK extract, see `bgt_setup.PDOK_EXTRACT_MAPPED_ONLY`
+    :return: set of feature types, None for all
+    """
+    return parallel_unzip.import_feature_types() if bgt_setup.PDOK_EXTRACT_MAPPED_ONLY else None
 
 
-def unzip_pdok_file():
+def unzip_pdok_file(path='extract_bgt.zip', directory='/tmp/data/'):
     """
-    Unzip the extract_bgt.zip file into the `/tmp/data` directory
+    Unzip the PDOK extract `path`, by default extract_bgt.zip, into `directory`, the
+    members in parallel processes, see `fme.parallel_unzip`
+    :param path: the zip file
+    :param directory: the directory to extract to
     :return:
     """
-    log.info("Start unzipping contents")
-    with ZipFile('extract_bgt.zip', 'r') as myzip:
-        myzip.extractall('/tmp/data/')
+    log.info("Start unzipping contents of %s", path)
+    parallel_unzip.extract(path, directory, pdok_extract_feature_types(), bgt_setup.PDOK_EXTRACT_PROCESSES or None)
     log.info("Unzip complete")
 
 
-def get_pdok_feature_types():
-    """Returns all available feature types from PDOK using the /dataset API endpoint.
+def get_pdok_timeliness() -> list:
+    """Returns the `timeliness` block of the /dataset API endpoint: per feature type up to when it is published.
 
     """
-    r = requests.get(f"{bgt_setup.PDOK_DOWNLOAD_API}/dataset")
+    r = session.get(f"{bgt_setup.PDOK_DOWNLOAD_API}/dataset")
     r.raise_for_status()
 
-    return [item['featuretype'] for item in r.json()['timeliness']]
+    return r.json()['timeliness']
 
 
-def pdok_url(fme_test_run=0) -> str:
-    """Requests a download with PDOK and returns the download URL.
+def get_pdok_feature_types(timeliness=None):
+    """Returns all available feature types from PDOK using the /dataset API endpoint.
+
+    :param timeliness: the `timeliness` block, requested when None
+    """
+    return [item['featuretype'] for item in (timeliness or get_pdok_timeliness())]
+
+
+def pdok_request_body(fme_test_run=0, timeliness=None, feature_types=None) -> dict:
+    """Returns the body of a custom download request of all feature types we use.
 
+    :param fme_test_run: download the small test area
+    :param timeliness: the `timeliness` block, requested when None
+    :param feature_types: request these feature types only, all that we use when None
     """
     exclude_feature_types = [
         'plaatsbepalingspunt'
     ]
 
-    body = {
-        'featuretypes': [ftype for ftype in get_pdok_feature_types() if ftype not in exclude_feature_types],
+    if feature_types is None:
+        feature_types = [ftype for ftype in get_pdok_feature_types(timeliness) if ftype not in exclude_feature_types]
+    return {
+        'featuretypes': list(feature_types),
         'format': 'citygml',
         'geofilter': polygon.full if not fme_test_run else polygon.test
     }
 
+
+def pdok_fingerprint(fme_test_run=0) -> dict:
+    """Returns what PDOK would deliver now: the timeliness per feature type and a hash of the request body.
+    A run with the same fingerprint as the previous run downloads the same data.
+
+    :param fme_test_run: download the small test area
+    """
+    timeliness = get_pdok_timeliness()
+    body = json.dumps(pdok_request_body(fme_test_run, timeliness), sort_keys=True)
+    return {
+        'request': hashlib.sha256(body.encode('utf-8')).hexdigest(),
+        'timeliness': {item['featuretype']: dict(item) for item in timeliness},
+    }
+
+
+def pdok_url(fme_test_run=0, feature_types=None) -> str:
+    """Requests a download with PDOK and returns the download URL.
+
+    :param fme_test_run: download the small test area
+    :param feature_types: download these feature types only, all that we use when None
+    """
+    body = pdok_request_body(fme_test_run, feature_types=feature_types)
+
     # Request a new custom download
     log.info("Requesting PDOK download")
-    r = requests.post(f"{bgt_setup.PDOK_DOWNLOAD_API}/full/custom", json=body)
+    r = session.post(f"{bgt_setup.PDOK_DOWNLOAD_API}/full/custom", json=body)
     r.raise_for_status()
 
     download_request_id = r.json()['downloadRequestId']
     log.info(f"PDOK download request id is {download_request_id}")
 
-    while True:
-        # Periodically check if download is ready. Return download URL when it is.
-        time.sleep(5)
-
-        r = requests.get(f"{bgt_setup.PDOK_DOWNLOAD_API}/full/custom/{download_request_id}/status")
+    def status():
+        r = session.get(f"{bgt_setup.PDOK_DOWNLOAD_API}/full/custom/{download_request_id}/status")
         r.raise_for_status()
-
-        if r.status_code == 201:
-            log.info(f"Download ready")
-            return f"{bgt_setup.PDOK_DOWNLOAD_API_HOST}{r.json()['_links']['download']['href']}"
-        elif r.status_code == 200:
+        if r.status_code == 200:
             log.info(f"Download generation in progress: {r.json()['progress']}%")
+        return r
+
+    # Periodically check if download is ready. Return download URL when it is.
+    r = poll(status, lambda r: r.status_code == 201, description='PDOK download',
+             initial=5, maximum=60, timeout=bgt_setup.PDOK_DOWNLOAD_TIMEOUT)
+    log.info(f"Download ready")
+    return f"{bgt_setup.PDOK_DOWNLOAD_API_HOST}{r.json()['_links']['download']['href']}"
+
+
+def feature_type_groups(feature_types, count) -> list:
+    """
+    Split the feature types in at most `count` groups for separate PDOK downloads: the
+    `bgt_setup.PDOK_LARGE_FEATURE_TYPES` each in a group of its own, as long as groups
+    are left for the others, and the other feature types spread over the remaining groups
+    :param feature_types: list of feature type names
+    :param count: number of groups
+    :return: list of lists of feature type names
+    """
+    if count <= 1:
+        return [list(feature_types)]
+    large = [name for name in bgt_setup.PDOK_LARGE_FEATURE_TYPES if name in feature_types][:count - 1]
+    others = [name for name in feature_types if name not in large]
+    remaining = count - len(large)
+    groups = [[name] for name in large] + [others[i::remaining] for i in range(remaining)]
+    return [group for group in groups if group]
+
+
+def pdok_archives() -> list:
+    """
+    The archives downloaded by `download_bgt`: the extract or the extracts per group of feature types
+    :return: list of file names
+    """
+    return sorted(glob.glob('extract_bgt.*.zip')) or ['extract_bgt.zip']
 
 
 def download_bgt(fme_test_run=0):
-    url = pdok_url(fme_test_run)
-    target = "extract_bgt.zip"
-    log.info("Starting download from %s to %s", url, target)
-    response = requests.get(url, stream=True)
-    start = time.clock()
-    # total_length = response.headers.get('content-length')
-    downloaded_length = 0
-    with open(target, 'wb') as newfile:
-        for chunk in response.iter_content(chunk_size=1024):
-            downloaded_length += len(chunk)
-            newfile.write(chunk)
-    log.info("Download complete, time elapsed: {}".format(time.clock() - start))
-    unzip_pdok_file()
-    log.info("Unzip complete")
+    """
+    Download the PDOK extract and extract it into `/tmp/data`. With more than one
+    `bgt_setup.PDOK_DOWNLOAD_GROUPS` the feature types are requested in groups,
+    concurrently, and each archive is extracted as soon as it is ready.
+    :param fme_test_run: download the small test area
+    :return:
+    """
+    groups = feature_type_groups(pdok_request_body(fme_test_run)['featuretypes'], bgt_setup.PDOK_DOWNLOAD_GROUPS)
+    for stale in glob.glob('extract_bgt.*.zip'):
+        os.remove(stale)
+    # with the GML files uploaded as they are extracted, the sync of `upload_data` finds them there
+    sync = fme_utils.sync_directory('resources/connections', 'Import_GML', '*.*') \
+        if bgt_setup.FME_SYNC_UPLOADS and bgt_setup.PDOK_EXTRACT_WHILE_DOWNLOADING else None
+
+    def download_group(index, feature_types):
+        target = "extract_bgt.zip" if len(groups) == 1 else "extract_bgt.{}.zip".format(index)
+        url = pdok_url(fme_test_run, feature_types=feature_types)
+        log.info("Starting download of %s from %s to %s", ', '.join(feature_types), url, target)
+        download = ranged_download.RangedDownload(
+            url, target, connections=bgt_setup.PDOK_DOWNLOAD_CONNECTIONS,
+            part_size=bgt_setup.PDOK_DOWNLOAD_PART_SIZE, retries=bgt_setup.PDOK_DOWNLOAD_RETRIES)
+        if bgt_setup.PDOK_EXTRACT_WHILE_DOWNLOADING:
+            download_and_extract_bgt(download, '/tmp/data', sync)
+        else:
+            download_and_unzip_bgt(download, '/tmp/data')
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            futures = [executor.submit(report.bind(download_group), index, feature_types)
+                       for index, feature_types in enumerate(groups)]
+        for future in futures:
+            future.result()
+    except Exception:
+        # record the files that were uploaded, without replacing the error of the download
+        if sync is not None:
+            try:
+                sync.finish(complete=False)
+            except Exception as e:
+                log.error("Finishing the upload of the extracted files failed: %s", e)
+        raise
+    if sync is not None:
+        sync.finish(complete=False)
+
+
+def download_and_unzip_bgt(download, directory):
+    """
+    Run `download` of a PDOK extract, check it and extract it into `directory`
+    :param download: `ranged_download.RangedDownload` of the extract
+    :param directory: the local directory to extract to
+    :return:
+    """
+    download.run()
+    # PDOK publishes no checksum, check the CRC of every member instead
+    with ZipFile(download.target) as zf:
+        damaged = zf.testzip()
+    if damaged is not None:
+        raise ranged_download.DownloadError("{} in {} is damaged".format(damaged, download.target))
+    log.info("Download complete")
+    unzip_pdok_file(download.target, directory)
+
+
+def download_and_extract_bgt(download, directory, sync=None):
+    """
+    Run `download` of a PDOK extract, extracting each member into `directory` as
+    soon as it is complete, and adding the extracted GML files to `sync`
+    :param download: `ranged_download.RangedDownload` of the extract
+    :param directory: the local directory to extract to
+    :param sync: `fme_utils.Sync` uploading the GML files to FME, None to only extract
+    :return:
+    """
+    def extracted(path):
+        if sync is not None and os.path.dirname(path) == os.path.normpath(directory) \
+                and fnmatch(os.path.basename(path), sync.pattern):
+            sync.add(path)
+
+    feature_types = pdok_extract_feature_types()
+    extractor = progressive_unzip.ProgressiveExtractor(
+        download.partial, directory, extracted, select=partial(parallel_unzip.selected, feature_types=feature_types))
+    download.on_part = extractor.available
+    download.tail_first = True
+    try:
+        download.run()
+        extractor.finish()
+    finally:
+        extractor.close()
+    log.info("Download and unzip of %s complete", download.target)
 
 
 def create_fme_sql_connection():
@@ -212,14 +400,19 @@ def create_fme_sql_connection():
 
 
 def upload_data():
-    """Upload the GML files, XSD and kaartbladen/shapes"""
-    fme_utils.upload('/tmp/data', 'resources/connections', 'Import_GML', '*.*')
+    """Upload the GML files of the PDOK extract"""
+    fme_utils.upload('/tmp/data', 'resources/connections', 'Import_GML', '*.*', sync=bgt_setup.FME_SYNC_UPLOADS)
+
+
+def upload_resources():
+    """Upload the XSD and kaartbladen/shapes of this repository"""
+    sync = bgt_setup.FME_SYNC_UPLOADS
     fme_utils.upload('{app}/source_data/xsd'.format(app=bgt_setup.SCRIPT_ROOT),
-                     'resources/connections', 'Import_XSD', 'imgeo.xsd')
+                     'resources/connections', 'Import_XSD', 'imgeo.xsd', sync=sync)
     fme_utils.upload('{app}/source_data/bron_csv'.format(app=bgt_setup.SCRIPT_ROOT),
-                     'resources/connections', 'Import_kaartbladen', '*.*')
+                     'resources/connections', 'Import_kaartbladen', '*.*', sync=sync)
     fme_utils.upload('{app}/source_data/aanmaak_producten_bgt/resource'.format(app=bgt_setup.SCRIPT_ROOT),
-                     'resources/connections', 'resources', '*.*')
+                     'resources/connections', 'resources', '*.*', sync=sync)
 
 
 def upload_script_resources():
@@ -227,21 +420,22 @@ def upload_script_resources():
     Upload script resources
     :return:
     """
+    sync = bgt_setup.FME_SYNC_UPLOADS
     fme_utils.upload_repository(
         '{app}/source_data/fme'.format(app=bgt_setup.SCRIPT_ROOT),
-        'BGT-DB', '*.fmw', register_fmejob=True)
+        'BGT-DB', '*.fmw', register_fmejob=True, sync=sync)
 
     fme_utils.upload_repository(
         '{app}/source_data/aanmaak_producten_bgt'.format(app=bgt_setup.SCRIPT_ROOT),
-        'BGT-SHAPES', '*shape*.*', register_fmejob=True)
+        'BGT-SHAPES', '*shape*.*', register_fmejob=True, sync=sync)
 
     fme_utils.upload_repository(
         '{app}/source_data/aanmaak_producten_bgt'.format(app=bgt_setup.SCRIPT_ROOT),
-        'BGT-DGN', '*dgn*.*', register_fmejob=True)
+        'BGT-DGN', '*dgn*.*', register_fmejob=True, sync=sync)
 
     fme_utils.upload_repository(
         '{app}/source_data/aanmaak_producten_bgt'.format(app=bgt_setup.SCRIPT_ROOT),
-        'BGT-DGN', '*kaartbladen*.*', recreate_repo=False, register_fmejob=True)
+        'BGT-DGN', '*kaartbladen*.*', recreate_repo=False, register_fmejob=True, sync=sync)
 
 
 def create_fme_dbschema():
@@ -268,11 +462,13 @@ def create_fme_shape_views():
     fme_pgsql.close()
 
 
-def run_before_after_comparisons():
+def run_before_after_comparisons(gml_url=None):
     """
     Import controle db using :file:`/tmp/data/*.gml`.
 
     Make sure sql connections are up
+    :param gml_url: url of the PDOK extract the counts are compared with, see `comparison.fetch_gml_files`,
+        None to compare with the GML files in the work directory
     """
     loc_pgsql = create_fme_sql_connection()
     loc_pgsql.import_gml_control_db()
@@ -281,7 +477,7 @@ def run_before_after_comparisons():
     # comparisons FKA: 040...
     fme_comparison.compare_before_after_counts_csv(
         loc_pgsql.host, loc_pgsql.port, loc_pgsql.dbname,
-        loc_pgsql.user, loc_pgsql.password
+        loc_pgsql.user, loc_pgsql.password, gml_url=gml_url
     )
 
     # comparisons FKA 080...
@@ -291,67 +487,292 @@ def run_before_after_comparisons():
     )
 
 
-# noinspection PyInterpreter
-def run_all(fme_run_test=0):
+NLCS_WORKSPACE = 'aanmaak_dgnNLCS_uit_DB_BGT.fmw'
+DGN_WORKSPACE = 'aanmaak_dgn_uit_DB_BGT.fmw'
 
-    download_bgt(fme_run_test)
 
-    # upload data and FMW scripts
-    upload_data()
-    upload_script_resources()
+def single_job(submit, follow_log=False):
+    """
+    Tasks of a stage that submits one FME job
+    :param submit: callable returning a job dict
+    :param follow_log: log the progress in the job log while the job runs
+    :return: callable returning a list of JobTask
+    """
+    return lambda: [JobTask('job', submit, follow_log=follow_log)]
 
-    create_fme_dbschema()
-    upload_over_onderbouw_backup()
-    create_fme_shape_views()
 
-    fme_utils.wait_for_job_to_complete(start_transformation_db())
-    fme_utils.wait_for_job_to_complete(start_transformation_gebieden())
-    fme_utils.wait_for_job_to_complete(start_transformation_stand_ligplaatsen())
+def _format_coordinate(value) -> str:
+    return '{:.3f}'.format(value).rstrip('0').rstrip('.')
+
+
+def split_envelope(min_x, min_y, max_x, max_y) -> list:
+    """
+    Split an envelope in two halves across its longest side
+    :return: list of two tuples (min_x, min_y, max_x, max_y) of coordinate strings
+    """
+    min_x, min_y, max_x, max_y = (float(c) for c in (min_x, min_y, max_x, max_y))
+    if max_x - min_x >= max_y - min_y:
+        middle = (min_x + max_x) / 2
+        halves = [(min_x, min_y, middle, max_y), (middle, min_y, max_x, max_y)]
+    else:
+        middle = (min_y + max_y) / 2
+        halves = [(min_x, min_y, max_x, middle), (min_x, middle, max_x, max_y)]
+    return [tuple(_format_coordinate(c) for c in half) for half in halves]
+
+
+def envelope_task(name, start, workspace, envelope) -> JobTask:
+    """
+    Task of the job that runs `start` for the chunk with coordinates `envelope`.
+    The chunk area is the priority, so the large chunks that take longest start first.
+    :param name: the kind of job, e.g. `dgn`
+    :param start: callable submitting the job, taking the envelope coordinates
+    :param workspace: the workspace name
+    :param envelope: tuple (min_x, min_y, max_x, max_y) of coordinate strings
+    :return: JobTask
+    """
+    min_x, min_y, max_x, max_y = (float(c) for c in envelope)
+    return JobTask(
+        '{} {}'.format(name, ','.join(envelope)),
+        partial(start, *envelope),
+        priority=(max_x - min_x) * (max_y - min_y),
+        workspace=workspace,
+        split=lambda: [envelope_task(name, start, workspace, half) for half in split_envelope(*envelope)])
+
+
+def nlcs_dgn_tasks():
+    """
+    The `NLCS` and `DGN` transformations per chunk of coordinates
+    :return: list of JobTask
+    """
+    tasks = []
+    for coordinates in retrieve_chunk_coordinates():
+        tasks.append(envelope_task('nlcs', start_transformation_nlcs_chunk, NLCS_WORKSPACE, tuple(coordinates)))
+        tasks.append(envelope_task('dgn', start_transformation_dgn, DGN_WORKSPACE, tuple(coordinates)))
+    return tasks
+
+
+def _can_reattach(job) -> bool:
+    try:
+        return fme_utils.get_job_status(job) in fme_utils.JOB_RUNNING_STATES + ['SUCCESS']
+    except requests.exceptions.RequestException:
+        return False
+
+
+def _submit_or_reattach(checkpoint, name, task):
+    def submit():
+        recorded = [job for job in checkpoint.jobs(name) if job.get('task') == task.task] if checkpoint else []
+        if recorded and _can_reattach(recorded[-1]):
+            log.info("Re-attaching %s of stage %s to FME job %s", task.task, name, recorded[-1]['jobid'])
+            return recorded[-1]
+
+        job = task.submit()
+        if checkpoint:
+            checkpoint.record_job(name, dict(job, task=task.task))
+        return job
+    return submit
+
+
+def job_stage(checkpoint, name, tasks, queue, policy=None):
+    """
+    Returns a pipeline stage that submits FME jobs and waits for them to complete.
+
+    The jobs are submitted through `queue`. When the checkpoint holds the job
+    of a task from an earlier attempt of the stage that is still running or
+    has succeeded, the stage re-attaches to that job instead of submitting a
+    new one. Failed jobs are submitted again according to `policy`; the stage
+    fails when jobs still failed after that.
+
+    :param checkpoint: Checkpoint or None
+    :param name: the stage name
+    :param tasks: callable returning a list of JobTask
+    :param queue: JobQueue submitting the jobs
+    :param policy: RetryPolicy, None to never submit failed jobs again
+    :return: callable
+    """
+    def run():
+        results = run_tasks(queue, tasks(), policy=policy,
+                            submitter=lambda task: _submit_or_reattach(checkpoint, name, task))
+        return [result['jobid'] for result in results]
+    return run
+
+
+# Stages that need PDOK or the FME database, which are not emulated in a dry run
+DRY_RUN_SKIPPED_STAGES = [
+    'download_bgt', 'create_fme_dbschema', 'upload_over_onderbouw_backup', 'create_fme_shape_views',
+    'upload_pdok_zip_to_objectstore',
+]
+
+
+def _dry_run_skip(name):
+    def skip():
+        log.info("Dry run: skipping stage %s", name)
+    return skip
+
+
+def build_pipeline(fme_run_test=0, max_workers=1, checkpoint=None, report=None, dry_run=False, queue=None, pdok=None):
+    """
+    Declares all stages of the import and the stages they depend on
+    :param fme_run_test: use the small test area
+    :param max_workers: number of stages that may run at the same time
+    :param checkpoint: Checkpoint to record progress in, or None
+    :param report: RunReport to collect the stage metrics in, or None
+    :param dry_run: skip the stages in `DRY_RUN_SKIPPED_STAGES`
+    :param queue: JobQueue submitting all FME jobs, a new one when None
+    :param pdok: the `pdok_fingerprint` of the download, recorded with its inputs
+    :return: Pipeline
+    """
+    p = Pipeline(max_workers=max_workers, checkpoint=checkpoint, report=report)
+    queue = queue or JobQueue(
+        JobMonitor(initial=bgt_setup.FME_JOB_POLL_INITIAL_INTERVAL, maximum=bgt_setup.FME_JOB_POLL_MAX_INTERVAL),
+        max_in_flight=bgt_setup.FME_ENGINES, workspace_limits=bgt_setup.FME_WORKSPACE_LIMITS)
+
+    p.add('download_bgt', lambda: download_bgt(fme_run_test), inputs={'fme_run_test': fme_run_test, 'pdok': pdok})
+
+    # upload data and FMW scripts
+    p.add('upload_data', upload_data, depends_on=['download_bgt'])
+    p.add('upload_resources', upload_resources)
+    p.add('upload_script_resources', upload_script_resources)
+
+    p.add('create_fme_dbschema', create_fme_dbschema)
+    p.add('upload_over_onderbouw_backup', upload_over_onderbouw_backup, depends_on=['create_fme_dbschema'])
+    p.add('create_fme_shape_views', create_fme_shape_views, depends_on=['create_fme_dbschema'])
+
+    p.add('transformation_db',
+          job_stage(checkpoint, 'transformation_db', single_job(start_transformation_db, follow_log=True), queue),
+          depends_on=['upload_data', 'upload_resources', 'upload_script_resources', 'upload_over_onderbouw_backup'])
+    p.add('transformation_gebieden',
+          job_stage(checkpoint, 'transformation_gebieden', single_job(start_transformation_gebieden), queue),
+          depends_on=['upload_data', 'upload_resources', 'upload_script_resources', 'create_fme_dbschema'])
+    p.add('transformation_stand_ligplaatsen',
+          job_stage(checkpoint, 'transformation_stand_ligplaatsen',
+                    single_job(start_transformation_stand_ligplaatsen), queue),
+          depends_on=['upload_script_resources', 'create_fme_dbschema'])
 
     # create coordinate search envelopes
-    fme_utils.wait_for_job_to_complete(resolve_chunk_coordinates())
+    p.add('resolve_chunk_coordinates',
+          job_stage(checkpoint, 'resolve_chunk_coordinates', single_job(resolve_chunk_coordinates), queue),
+          depends_on=['transformation_gebieden'])
 
     # run the `aanmaak_esrishape_uit_DB_BGT` script
-    start_transformation_shapes()
+    p.add('transformation_shapes', partial(start_transformation_shapes, queue),
+          depends_on=['transformation_db', 'transformation_gebieden',
+                      'transformation_stand_ligplaatsen', 'create_fme_shape_views'])
 
     # run transformation to `NLCS` and `DGN` format
-    last_job_in_queue = {}
-    for a in retrieve_chunk_coordinates():
-        start_transformation_nlcs_chunk(*a)
-        last_job_in_queue = start_transformation_dgn(*a)
-    fme_utils.wait_for_job_to_complete(last_job_in_queue, sleep_time=20)
+    p.add('transformation_nlcs_dgn',
+          job_stage(checkpoint, 'transformation_nlcs_dgn', nlcs_dgn_tasks, queue,
+                    policy=RetryPolicy(retries=bgt_setup.FME_CHUNK_RETRIES, split=bgt_setup.FME_SPLIT_FAILED_CHUNKS)),
+          depends_on=['resolve_chunk_coordinates', 'transformation_db',
+                      'transformation_stand_ligplaatsen', 'create_fme_shape_views'])
 
     # upload the resulting shapes an the source GML zip to objectstore
-    upload_gebieden()
-    upload_pdok_zip_to_objectstore()
-    upload_nlcs_lijnen_files()
-    upload_nlcs_vlakken_files()
-    upload_dgn_files()
+    p.add('upload_gebieden', upload_gebieden, depends_on=['transformation_gebieden'])
+    p.add('upload_pdok_zip_to_objectstore', upload_pdok_zip_to_objectstore, depends_on=['download_bgt'])
+    p.add('upload_nlcs_lijnen_files', upload_nlcs_lijnen_files, depends_on=['transformation_nlcs_dgn'])
+    p.add('upload_nlcs_vlakken_files', upload_nlcs_vlakken_files, depends_on=['transformation_nlcs_dgn'])
+    p.add('upload_dgn_files', upload_dgn_files, depends_on=['transformation_nlcs_dgn'])
     # run_before_after_comparisons()
 
+    if dry_run:
+        for name in DRY_RUN_SKIPPED_STAGES:
+            p.stages[name].func = _dry_run_skip(name)
+    return p
+
+
+# The stages with no other input than the PDOK extract, the others read the GOB objectstore, the BAG and
+# gebieden WFS services and the workspaces and resources in this repository, which may have changed
+PDOK_DERIVED_STAGES = ['download_bgt', 'upload_data', 'upload_pdok_zip_to_objectstore']
 
-def main() -> int:
-    """
-    This function is defined as an **entry-point** in :file:`setup.py`.
 
+def _unchanged(checkpoint, pdok) -> bool:
+    # whether the run in `checkpoint` downloaded what PDOK would deliver now
+    inputs = checkpoint.inputs('download_bgt') or {}
+    return pdok is not None and (inputs.get('inputs') or {}).get('pdok') == pdok
+
+
+def run_all(fme_run_test=0, resume=False, dry_run=False, before_run=None):
     """
-    logging.getLogger('requests').setLevel('WARNING')
-    log.info("Starting import script")
+    Run the complete import. When PDOK published nothing new since the previous
+    run, the `PDOK_DERIVED_STAGES` that run completed are skipped, see `pdok_fingerprint`.
+    :param fme_run_test: use the small test area
+    :param resume: skip the stages completed by the previous run and re-attach to its FME jobs
+    :param dry_run: skip the stages that need PDOK or the FME database
+    :param before_run: callable called before the first stage runs, not when no stage has to run
+    :return:
+    """
+    pdok = None
+    if bgt_setup.PDOK_SKIP_UNCHANGED and not dry_run:
+        pdok = pdok_fingerprint(fme_run_test)
+
+    checkpoint = Checkpoint(bgt_setup.CHECKPOINT_FILE).load()
+    if not resume:
+        if _unchanged(checkpoint, pdok):
+            log.info("PDOK published nothing new since the previous run, skipping the download it completed")
+            checkpoint.keep(PDOK_DERIVED_STAGES)
+        else:
+            checkpoint.reset()
+
+    pipeline = build_pipeline(
+        fme_run_test, max_workers=bgt_setup.PIPELINE_WORKERS, checkpoint=checkpoint, report=report,
+        dry_run=dry_run, pdok=pdok)
+    if all(checkpoint.is_complete(name) for name in pipeline.stages):
+        log.info("All stages completed before, nothing to do")
+        return
+
+    if before_run is not None:
+        before_run()
+    report.reset()
+    try:
+        pipeline.run()
+    finally:
+        report.write(bgt_setup.RUN_REPORT_FILE)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Datapunt BGT transformaties in FME-cloud")
+    parser.add_argument(
+        '--resume', action='store_true',
+        help="continue the previous run, skipping the stages it completed")
+    parser.add_argument(
+        '--dry-run', action='store_true',
+        help="run against a local emulated FME server and objectstore, skipping PDOK and database stages")
+    return parser.parse_args(argv)
+
+
+def run_import(resume=False, dry_run=False):
     server_manager = fme_server.FMEServer(
-        bgt_setup.FME_BASE_URL, bgt_setup.FME_INSTANCE_ID, bgt_setup.FME_CLOUD_API_TOKEN)
+        bgt_setup.FME_BASE_URL, bgt_setup.FME_INSTANCE_ID, bgt_setup.FME_CLOUD_API_TOKEN,
+        api_url=bgt_setup.FME_CLOUD_API_URL)
 
     try:
         log.info("Starting script, current server status is %s", server_manager.get_status())
 
-        # start the fme server
-        server_manager.start()
-        run_all(bgt_setup.FME_TEST_RUN)
+        # start the fme server, when there is something to do
+        run_all(bgt_setup.FME_TEST_RUN, resume=resume, dry_run=dry_run, before_run=server_manager.start)
     except Exception as e:
         log.exception("Could not process server jobs {}".format(e))
         raise e
     finally:
         log.info("Stopping FME service")
         server_manager.stop()
+
+
+def main(argv=None) -> int:
+    """
+    This function is defined as an **entry-point** in :file:`setup.py`.
+
+    """
+    args = parse_args(argv)
+    logging.getLogger('requests').setLevel('WARNING')
+    log.info("Starting import script")
+
+    if args.dry_run:
+        with emulated_services(
+                job_duration=bgt_setup.DRY_RUN_JOB_DURATION, failure_rate=bgt_setup.DRY_RUN_FAILURE_RATE,
+                engines=bgt_setup.DRY_RUN_ENGINES):
+            run_import(resume=args.resume, dry_run=True)
+    else:
+        run_import(resume=args.resume)
     return 0
 
 
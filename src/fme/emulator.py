@@ -0,0 +1,739 @@
+"""
+In-process stand-ins for the remote services used by the import, for dry runs,
+tests and benchmarks without paying for FME Cloud server time.
+
+`FMEEmulator` serves the parts of the FME Server REST API v2 and the FME Cloud
+instance API that we use, `SwiftEmulator` serves a Swift objectstore with v1
+authentication and `PDOKEmulator` the PDOK BGT download API. All run a local
+HTTP server in a background thread::
+
+    with FMEEmulator(job_duration=0.5, failure_rate=0.1) as fme:
+        bgt_setup.FME_BASE_URL = fme.url
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from zipfile import ZipFile
+
+import bgt_setup
+
+log = logging.getLogger(__name__)
+
+FILESYS = '/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys'
+
+
+class EmulatorRequest(object):
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    def param(self, name, default=None):
+        return self.query.get(name, [default])[0]
+
+    def form(self) -> dict:
+        return {k: v[0] for k, v in parse_qs(self.body.decode('utf-8')).items()}
+
+    def json(self):
+        return json.loads(self.body.decode('utf-8'))
+
+    def filename(self):
+        match = re.search(r'filename="([^"]+)"', self.headers.get('Content-Disposition', ''))
+        return match.group(1) if match else None
+
+
+def json_response(data, status=200):
+    return status, {'Content-Type': 'application/json'}, json.dumps(data).encode('utf-8')
+
+
+def ranged_response(request, data, content_type='application/octet-stream'):
+    """
+    Response with `data`, or the part of it asked for in a `Range: bytes=start-end` header
+    :param request: EmulatorRequest
+    :param data: bytes
+    :param content_type:
+    :return: tuple (status, headers, body)
+    """
+    headers = {'Content-Type': content_type, 'Accept-Ranges': 'bytes'}
+    match = re.match(r'bytes=(\d*)-(\d*)$', request.headers.get('Range', ''))
+    if not match:
+        return 200, headers, data
+
+    first, last = match.groups()
+    if first:
+        start, end = int(first), int(last) if last else len(data) - 1
+    else:
+        start, end = max(0, len(data) - int(last)), len(data) - 1
+    end = min(end, len(data) - 1)
+    if start >= len(data) or start > end:
+        headers['Content-Range'] = 'bytes */{}'.format(len(data))
+        return 416, headers, b''
+    headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, len(data))
+    return 206, headers, data[start:end + 1]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the status line, headers and body go out in one write when the request is handled, without
+    # Nagle delaying it: written separately on a kept-alive connection, the delayed ACK of the
+    # first write held the body back ~40 ms per request
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def _read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _dispatch(self):
+        parsed = urlparse(self.path)
+        request = EmulatorRequest(
+            self.command, unquote(parsed.path), parse_qs(parsed.query), self.headers, self._read_body())
+        status, headers, body = self.server.emulator.handle(request)
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+    def log_message(self, format, *args):
+        log.debug("%s %s", self.server.emulator.__class__.__name__, format % args)
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Emulator(object):
+    """
+    Base class of the emulators: a local HTTP server dispatching requests to
+    the handlers in `routes`, a list of (method, path regex, handler).
+
+    :param http_error_rate: fraction of requests answered with a 503, to test retries
+    :param seed: seed for the random generator, for reproducible runs
+    """
+
+    def __init__(self, http_error_rate=0.0, seed=None):
+        self.http_error_rate = http_error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.requests = []
+        self.routes = []
+        self.server = None
+        self.url = None
+
+    def route(self, method, pattern, handler):
+        self.routes.append((method, re.compile(pattern + '$'), handler))
+
+    def handle(self, request):
+        with self.lock:
+            self.requests.append((request.method, request.path))
+            if self.http_error_rate and self.random.random() < self.http_error_rate:
+                return 503, {}, b'Service Unavailable'
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if match and method == request.method:
+                try:
+                    return handler(request, *match.groups())
+                except Exception as e:
+                    log.exception("Emulator failed on %s %s", request.method, request.path)
+                    return 500, {}, str(e).encode('utf-8')
+        return 404, {}, b'Not Found'
+
+    def start(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.emulator = self
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        log.info("%s listening on %s", self.__class__.__name__, self.url)
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _fme_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def _published(params, name, default=None):
+    for param in params.get('publishedParameters', []):
+        if param['name'] == name:
+            return param['value']
+    return default
+
+
+class FMEEmulator(Emulator):
+    """
+    Stand-in for FME Server REST v2 (transformations, filesys resources and
+    repositories) and the FME Cloud instance start/pause API.
+
+    Jobs wait for one of `engines` engines, run for `job_duration` seconds
+    (or `durations[workspace]`) and fail with probability `failure_rate`,
+    logging `failure_message`. The job log grows while the job runs.
+    Jobs of the workspaces used by the import write dummy output files of
+    `output_size` bytes, so the whole pipeline can run against the emulator.
+    REST calls fail with a 503 while the instance is not running.
+
+    :param job_duration: default job run time in seconds
+    :param durations: dict with run time in seconds per workspace name
+    :param engines: number of jobs that run at the same time
+    :param failure_rate: fraction of the jobs that fail
+    :param start_delay: seconds it takes to start or pause the instance
+    :param output_size: size in bytes of the files the jobs write
+    :param chunks: number of coordinate chunks written by the kaartbladen job
+    :param instance_state: initial state of the instance
+    """
+
+    def __init__(self, job_duration=1.0, durations=None, engines=2, failure_rate=0.0, start_delay=0.5,
+                 output_size=1024, chunks=4, instance_state='PAUSED', http_error_rate=0.0, seed=None):
+        super().__init__(http_error_rate=http_error_rate, seed=seed)
+        self.job_duration = job_duration
+        self.durations = durations or {}
+        self.engines = [0.0] * max(1, engines)
+        self.failure_rate = failure_rate
+        self.start_delay = start_delay
+        self.output_size = output_size
+        self.chunks = chunks
+        self.failure_message = 'A fatal error has occurred. Check the logfile above for details'
+
+        self.instance = {'state': instance_state, 'target': None, 'changes_at': 0.0}
+        self.directories = {''}
+        self.files = {}
+        self.repositories = {}
+        self.jobs = {}
+
+        self.outputs = {
+            '00_kaartbladen_coordinatenbepaler.fmw': self._output_chunk_coordinates,
+            'aanmaak_dgn_uit_DB_BGT.fmw': self._output_dgn,
+            'aanmaak_dgnNLCS_uit_DB_BGT.fmw': self._output_nlcs,
+            'aanmaak_esrishape_csv_zip.fmw': self._output_shapes,
+            'inlezen_gebieden_uit_Shape_en_WFS.fmw': self._output_gebieden,
+        }
+
+        self.route('GET', r'/v1/instances/([^/]+)', self.get_instance)
+        self.route('PUT', r'/v1/instances/([^/]+)/start', self.start_instance)
+        self.route('PUT', r'/v1/instances/([^/]+)/pause', self.pause_instance)
+
+        self.route('POST', r'/fmerest/v2/transformations/commands/submit/([^/]+)/([^/]+)', self.submit_job)
+        self.route('GET', r'/fmerest/v2/transformations/jobs/(queued|running|completed)', self.list_jobs)
+        self.route('GET', r'/fmerest/v2/transformations/jobs/id/(\d+)', self.get_job)
+        self.route('GET', r'/fmerest/v2/transformations/jobs/id/(\d+)/log', self.get_job_log)
+
+        self.route('POST', FILESYS + r'/?', self.create_directory)
+        self.route('GET', FILESYS + r'/(.+)', self.get_path)
+        self.route('POST', FILESYS + r'/(.+)', self.upload_file)
+        self.route('DELETE', FILESYS + r'/(.+)', self.delete_path)
+
+        self.route('POST', r'/fmerest/v2/repositories/?', self.create_repository)
+        self.route('DELETE', r'/fmerest/v2/repositories/([^/]+)', self.delete_repository)
+        self.route('GET', r'/fmerest/v2/repositories/([^/]+)/items', self.list_items)
+        self.route('POST', r'/fmerest/v2/repositories/([^/]+)/items', self.upload_item)
+        self.route('DELETE', r'/fmerest/v2/repositories/([^/]+)/items/([^/]+)', self.delete_item)
+        self.route('POST', r'/fmerest/v2/repositories/([^/]+)/items/([^/]+)/services', self.register_service)
+
+    def handle(self, request):
+        with self.lock:
+            self._settle()
+            if request.path.startswith('/fmerest'):
+                if self.instance['state'] != 'RUNNING':
+                    return 503, {}, b'FME Server is not running'
+                if not request.headers.get('Authorization', '').startswith('fmetoken token='):
+                    return 401, {}, b'Unauthorized'
+            elif not request.headers.get('Authorization', '').startswith('bearer '):
+                return 401, {}, b'Unauthorized'
+        return super().handle(request)
+
+    # instance
+
+    def _settle(self):
+        now = time.time()
+        instance = self.instance
+        if instance['target'] and now >= instance['changes_at']:
+            instance['state'], instance['target'] = instance['target'], None
+        for job in self.jobs.values():
+            if job['status'] not in ('SUCCESS', 'FME_FAILURE') and now >= job['finished']:
+                self._finish_job(job)
+
+    def _change_instance(self, state, target):
+        self.instance.update(state=state, target=target, changes_at=time.time() + self.start_delay)
+
+    def get_instance(self, request, instance_id):
+        return json_response({'id': instance_id, 'state': self.instance['state']})
+
+    def start_instance(self, request, instance_id):
+        with self.lock:
+            if self.instance['state'] == 'PAUSED':
+                self._change_instance('PENDING', 'RUNNING')
+        return json_response({'id': instance_id, 'state': self.instance['state']}, 202)
+
+    def pause_instance(self, request, instance_id):
+        with self.lock:
+            if self.instance['state'] == 'RUNNING':
+                self._change_instance('STOPPING', 'PAUSED')
+        return json_response({'id': instance_id, 'state': self.instance['state']}, 202)
+
+    # transformations
+
+    def submit_job(self, request, repository, workspace):
+        with self.lock:
+            if repository not in self.repositories:
+                return 404, {}, 'Repository {} not found'.format(repository).encode('utf-8')
+            if workspace not in self.repositories[repository]['items']:
+                log.warning("Workspace %s/%s was not uploaded, running it anyway", repository, workspace)
+
+            now = time.time()
+            engine = min(range(len(self.engines)), key=lambda i: self.engines[i])
+            started = max(now, self.engines[engine])
+            finished = started + self.durations.get(workspace, self.job_duration)
+            self.engines[engine] = finished
+
+            job_id = len(self.jobs) + 1
+            self.jobs[job_id] = {
+                'id': job_id,
+                'repository': repository,
+                'workspace': workspace,
+                'params': request.json(),
+                'status': 'SUBMITTED',
+                'requested': now,
+                'started': started,
+                'finished': finished,
+                'fails': self.random.random() < self.failure_rate,
+                'features': self.random.randint(1, 100000),
+            }
+        return json_response({'id': job_id}, 202)
+
+    def _job_status(self, job):
+        if job['status'] in ('SUCCESS', 'FME_FAILURE'):
+            return job['status']
+        now = time.time()
+        if now < job['started']:
+            return 'SUBMITTED' if now - job['requested'] < 0.1 else 'QUEUED'
+        return 'PULLED'
+
+    def _finish_job(self, job):
+        job['status'] = 'FME_FAILURE' if job['fails'] else 'SUCCESS'
+        if not job['fails'] and job['workspace'] in self.outputs:
+            self.outputs[job['workspace']](job['params'])
+
+    def _job_log(self, job, now) -> str:
+        """
+        The log of `job` as far as it is written at time `now`, with a progress line for every 10% of the run
+        """
+        def line(timestamp, level, message):
+            stamp = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+            return '{}|{:6.1f}|  0.0|{}|{}\n'.format(stamp, timestamp - job['started'], level, message)
+
+        started, finished = job['started'], job['finished']
+        lines = [
+            (started, 'INFORM', 'FME 2016.1.3.2 (20161209 - Build 16709 - linux-x64)'),
+            (started, 'INFORM', 'Translation started for {}'.format(job['workspace'])),
+        ]
+        for tenth in range(1, 10):
+            lines.append((started + (finished - started) * tenth / 10, 'INFORM',
+                          'Read {} features'.format(job['features'] * tenth // 10)))
+        if job['fails']:
+            lines.append((finished, 'ERROR', self.failure_message))
+            lines.append((finished, 'INFORM', 'Translation FAILED.'))
+        else:
+            lines.append((finished, 'INFORM', 'Total Features Written {:>30}'.format(job['features'])))
+            lines.append((finished, 'INFORM', 'Translation was SUCCESSFUL with 0 warning(s) ({} feature(s) output)'
+                          .format(job['features'])))
+        return ''.join(line(*l) for l in lines if l[0] <= now)
+
+    def _job_detail(self, job):
+        status = self._job_status(job)
+        detail = {
+            'id': job['id'],
+            'status': status,
+            'request': job['params'],
+            'timeRequested': _fme_time(job['requested']),
+        }
+        if status != 'SUBMITTED' and status != 'QUEUED':
+            detail['timeStarted'] = _fme_time(job['started'])
+        if status in ('SUCCESS', 'FME_FAILURE'):
+            detail['timeFinished'] = _fme_time(job['finished'])
+            detail['result'] = {
+                'id': job['id'],
+                'status': status,
+                'numFeaturesOutput': 0 if job['fails'] else job['features'],
+                'timeRequested': detail['timeRequested'],
+                'timeStarted': detail['timeStarted'],
+                'timeFinished': detail['timeFinished'],
+            }
+        return detail
+
+    def list_jobs(self, request, state):
+        # just submitted jobs are not listed yet, as on a real FME server
+        states = {'queued': ('QUEUED',), 'running': ('PULLED',), 'completed': ('SUCCESS', 'FME_FAILURE')}[state]
+        with self.lock:
+            items = [self._job_detail(job) for job in self.jobs.values() if self._job_status(job) in states]
+        return json_response({'offset': -1, 'limit': -1, 'totalCount': len(items), 'items': items})
+
+    def get_job(self, request, job_id):
+        with self.lock:
+            job = self.jobs.get(int(job_id))
+            if not job:
+                return 404, {}, b'Job not found'
+            return json_response(self._job_detail(job))
+
+    def get_job_log(self, request, job_id):
+        with self.lock:
+            job = self.jobs.get(int(job_id))
+            if not job:
+                return 404, {}, b'Job not found'
+            now = job['finished'] if job['status'] in ('SUCCESS', 'FME_FAILURE') else time.time()
+            return ranged_response(request, self._job_log(job, now).encode('utf-8'), 'text/plain')
+
+    # job outputs
+
+    def _makedirs(self, directory):
+        parts = directory.split('/')
+        for i in range(1, len(parts) + 1):
+            self.directories.add('/'.join(parts[:i]))
+
+    def write_file(self, path, content=None):
+        """
+        Put a file on the emulated filesys, with random content of `output_size` bytes by default
+        :param path: path relative to FME_SHAREDRESOURCE_DATA
+        :param content: bytes
+        :return:
+        """
+        path = self._normalize(path)
+        self._makedirs(path.rsplit('/', 1)[0] if '/' in path else '')
+        self.files[path] = content if content is not None else bytes(
+            self.random.getrandbits(8) for _ in range(self.output_size))
+
+    def _output_chunk_coordinates(self, params):
+        rows = ['min_x,min_y,max_x,max_y']
+        for i in range(self.chunks):
+            rows.append('{},{},{},{}'.format(110000 + i * 1000, 476000, 111000 + i * 1000, 477000))
+        self.write_file('BGT_uitwissel/Kaartbladen_coordinaten.csv', ('\n'.join(rows) + '\n').encode('utf-8'))
+
+    @staticmethod
+    def _envelope_name(params):
+        return '{}_{}'.format(_published(params, 'ENVELOPE_MINX'), _published(params, 'ENVELOPE_MINY'))
+
+    def _output_dgn(self, params):
+        self.write_file('DGNv8/{}.dgn'.format(self._envelope_name(params)))
+
+    def _output_nlcs(self, params):
+        self.write_file('DGNv8_vlakken_NLCS/BGT_NLCS_V/{}.dgn'.format(self._envelope_name(params)))
+        self.write_file('DGNv8_lijnen_NLCS/BGT_NLCS_L/{}.dgn'.format(self._envelope_name(params)))
+
+    def _output_shapes(self, params):
+        view = _published(params, 'bgt_view', 'view').split('.')[-1]
+        self.write_file('ASCII_totaal/{}.csv'.format(view))
+        self.write_file('Esri_Shape_totaal/{}.shp'.format(view))
+        self.write_file('ASCII_gebieden/stadsdeel/{}.csv'.format(view))
+        self.write_file('Esri_Shape_gebieden/stadsdeel/{}.shp'.format(view))
+
+    def _output_gebieden(self, params):
+        for extension in ('dbf', 'prj', 'shp', 'shx'):
+            self.write_file('Kaartbladindeling/BGT_Gebiedsindeling.{}'.format(extension))
+        self.write_file('Kaartbladindeling/PDOK_Indeling.dgn')
+
+    # filesys
+
+    @staticmethod
+    def _normalize(path):
+        return '/'.join(part for part in path.split('/') if part)
+
+    def _listing(self, directory, depth):
+        prefix = directory + '/' if directory else ''
+        children = set()
+        for path in list(self.files) + list(self.directories):
+            if path.startswith(prefix) and path != directory:
+                children.add(path[len(prefix):].split('/')[0])
+
+        contents = []
+        for name in sorted(children):
+            path = prefix + name
+            entry = {'name': name, 'path': '/{}'.format(prefix)}
+            if path in self.files:
+                entry.update(type='FILE', size=len(self.files[path]))
+            else:
+                entry.update(type='DIR')
+                if depth > 1:
+                    entry['contents'] = self._listing(path, depth - 1)
+            contents.append(entry)
+        return contents
+
+    def create_directory(self, request):
+        form = request.form()
+        with self.lock:
+            self.directories.add(self._normalize(form['directoryname']))
+        return json_response({'name': form['directoryname'], 'type': 'DIR'}, 201)
+
+    def get_path(self, request, path):
+        path = self._normalize(path)
+        with self.lock:
+            if path in self.files:
+                return ranged_response(request, self.files[path])
+            if path in self.directories:
+                return json_response({
+                    'name': path.split('/')[-1],
+                    'path': '/' + path,
+                    'type': 'DIR',
+                    'contents': self._listing(path, int(request.param('depth', '1')))})
+        return 404, {}, b'Not Found'
+
+    def upload_file(self, request, directory):
+        directory = self._normalize(directory)
+        with self.lock:
+            if directory not in self.directories:
+                if request.param('createDirectories', 'false') != 'true':
+                    return 404, {}, b'Directory not found'
+                self._makedirs(directory)
+            name = request.filename()
+            self.files['{}/{}'.format(directory, name)] = request.body
+        return json_response({'name': name, 'size': len(request.body)}, 201)
+
+    def delete_path(self, request, path):
+        path = self._normalize(path)
+        with self.lock:
+            if path not in self.files and path not in self.directories:
+                return 404, {}, b'Not Found'
+            prefix = path + '/'
+            self.files = {k: v for k, v in self.files.items() if k != path and not k.startswith(prefix)}
+            self.directories = {d for d in self.directories if d != path and not d.startswith(prefix)}
+        return 204, {}, b''
+
+    # repositories
+
+    def create_repository(self, request):
+        name = request.form()['name']
+        with self.lock:
+            if name in self.repositories:
+                return 409, {}, b'Repository exists'
+            self.repositories[name] = {'items': {}, 'services': {}}
+        return json_response({'name': name}, 201)
+
+    def delete_repository(self, request, name):
+        with self.lock:
+            if self.repositories.pop(name, None) is None:
+                return 404, {}, b'Not Found'
+        return 204, {}, b''
+
+    def list_items(self, request, name):
+        with self.lock:
+            if name not in self.repositories:
+                return 404, {}, b'Repository not found'
+            items = [{'name': item, 'type': 'WORKSPACE'} for item in sorted(self.repositories[name]['items'])]
+        return json_response({'offset': -1, 'limit': -1, 'totalCount': len(items), 'items': items})
+
+    def delete_item(self, request, name, item):
+        with self.lock:
+            repository = self.repositories.get(name)
+            if not repository or repository['items'].pop(item, None) is None:
+                return 404, {}, b'Not Found'
+            repository['services'].pop(item, None)
+        return 204, {}, b''
+
+    def upload_item(self, request, name):
+        with self.lock:
+            if name not in self.repositories:
+                return 404, {}, b'Repository not found'
+            self.repositories[name]['items'][request.filename()] = request.body
+        return json_response({'name': request.filename()}, 201)
+
+    def register_service(self, request, name, item):
+        with self.lock:
+            repository = self.repositories.get(name)
+            if not repository or item not in repository['items']:
+                return 404, {}, b'Not Found'
+            repository['services'][item] = request.form().get('services')
+        return json_response({'name': item}, 200)
+
+
+class SwiftEmulator(Emulator):
+    """
+    Stand-in for a Swift objectstore with v1 authentication, see `credentials`.
+
+    :param containers: names of the containers that exist
+    """
+
+    def __init__(self, containers=('BGT',), http_error_rate=0.0, seed=None):
+        super().__init__(http_error_rate=http_error_rate, seed=seed)
+        self.containers = {name: {} for name in containers}
+        self.token = 'emulator-token'
+
+        self.route('GET', r'/auth/v1.0', self.auth)
+        self.route('GET', r'/v1/AUTH_bgt/([^/]+)', self.list_container)
+        self.route('PUT', r'/v1/AUTH_bgt/([^/]+)/(.+)', self.put_object)
+        self.route('GET', r'/v1/AUTH_bgt/([^/]+)/(.+)', self.get_object)
+        self.route('HEAD', r'/v1/AUTH_bgt/([^/]+)/(.+)', self.get_object)
+        self.route('DELETE', r'/v1/AUTH_bgt/([^/]+)/(.+)', self.delete_object)
+
+    def credentials(self) -> dict:
+        """
+        Connection arguments for `swiftclient.client.Connection`, as in `bgt_setup.OBJECTSTORES`
+        :return: dict
+        """
+        return {'auth_version': '1.0', 'authurl': '{}/auth/v1.0'.format(self.url), 'user': 'bgt', 'key': 'bgt'}
+
+    def handle(self, request):
+        if not request.path.startswith('/auth') and request.headers.get('X-Auth-Token') != self.token:
+            return 401, {}, b'Unauthorized'
+        return super().handle(request)
+
+    def auth(self, request):
+        return 200, {'X-Storage-Url': '{}/v1/AUTH_bgt'.format(self.url), 'X-Auth-Token': self.token}, b''
+
+    def list_container(self, request, container):
+        with self.lock:
+            if container not in self.containers:
+                return 404, {}, b'Not Found'
+            prefix = request.param('prefix', '')
+            delimiter = request.param('delimiter')
+            marker = request.param('marker', '')
+            limit = int(request.param('limit', '10000'))
+
+            listing = []
+            subdirs = set()
+            for name in sorted(self.containers[container]):
+                if not name.startswith(prefix) or name <= marker:
+                    continue
+                rest = name[len(prefix):]
+                if delimiter and delimiter in rest:
+                    subdir = prefix + rest.split(delimiter)[0] + delimiter
+                    if subdir not in subdirs:
+                        subdirs.add(subdir)
+                        listing.append({'subdir': subdir})
+                else:
+                    listing.append({'name': name, 'bytes': len(self.containers[container][name])})
+        return json_response(listing[:limit])
+
+    def put_object(self, request, container, name):
+        with self.lock:
+            if container not in self.containers:
+                return 404, {}, b'Not Found'
+            self.containers[container][name] = request.body
+        return 201, {'Etag': hashlib.md5(request.body).hexdigest()}, b''
+
+    def get_object(self, request, container, name):
+        with self.lock:
+            content = self.containers.get(container, {}).get(name)
+        if content is None:
+            return 404, {}, b'Not Found'
+        return ranged_response(request, content)
+
+    def delete_object(self, request, container, name):
+        with self.lock:
+            if self.containers.get(container, {}).pop(name, None) is None:
+                return 404, {}, b'Not Found'
+        return 204, {}, b''
+
+
+class PDOKEmulator(Emulator):
+    """
+    Stand-in for the PDOK BGT download API v1_0 at `url` + `PDOKEmulator.API`: the full
+    custom downloads, with the members `bgt_<feature type>.gml` of the feature types asked for.
+
+    :param feature_types: the feature types of the dataset
+    :param full: zip file contents of a full download
+    """
+    API = '/lv/bgt/download/v1_0'
+
+    def __init__(self, feature_types=('pand',), full=b'', http_error_rate=0.0, seed=None):
+        super().__init__(http_error_rate=http_error_rate, seed=seed)
+        self.feature_types = list(feature_types)
+        self.full = full
+        self.downloads = {}
+        self.download_requests = []
+
+        self.route('GET', self.API + r'/dataset', self.dataset)
+        self.route('POST', self.API + r'/full/custom', self.request_download)
+        self.route('GET', self.API + r'/full/custom/([^/]+)/status', self.download_status)
+        self.route('GET', self.API + r'/downloads/([^/]+)\.zip', self.get_download)
+
+    def dataset(self, request):
+        return json_response({'timeliness': [{'featuretype': name} for name in self.feature_types]})
+
+    def _full_download(self, feature_types) -> bytes:
+        buffer = io.BytesIO()
+        with ZipFile(io.BytesIO(self.full)) as full, ZipFile(buffer, 'w') as selected:
+            for name in full.namelist():
+                if os.path.splitext(name)[0][len('bgt_'):] in feature_types:
+                    selected.writestr(full.getinfo(name), full.read(name))
+        return buffer.getvalue()
+
+    def request_download(self, request):
+        body = request.json()
+        with self.lock:
+            self.download_requests.append(body)
+            download_id = 'download-{}'.format(len(self.download_requests))
+            self.downloads[download_id] = self._full_download(body['featuretypes']) if self.full else b''
+        return json_response({'downloadRequestId': download_id}, 202)
+
+    def download_status(self, request, download_id):
+        if download_id not in self.downloads:
+            return 404, {}, b'Not Found'
+        return json_response({'progress': 100, 'status': 'COMPLETED', '_links': {
+            'download': {'href': '{}/downloads/{}.zip'.format(self.API, download_id)}}}, 201)
+
+    def get_download(self, request, download_id):
+        if download_id not in self.downloads:
+            return 404, {}, b'Not Found'
+        return ranged_response(request, self.downloads[download_id], 'application/zip')
+
+
+@contextmanager
+def emulated_services(**fme_options):
+    """
+    Point the FME server, FME Cloud API and objectstore settings in `bgt_setup`
+    to emulators for the duration of the block.
+
+    :param fme_options: keyword arguments for `FMEEmulator`
+    :return: tuple (FMEEmulator, SwiftEmulator)
+    """
+    saved = (bgt_setup.FME_BASE_URL, bgt_setup.FME_CLOUD_API_URL, dict(bgt_setup.OBJECTSTORES))
+    containers = set(bgt_setup.OBJECTSTORES) | {bgt_setup.GOB_OBJECTSTORE_CONTAINER}
+
+    with FMEEmulator(**fme_options) as fme, SwiftEmulator(containers=containers) as swift:
+        bgt_setup.FME_BASE_URL = fme.url
+        bgt_setup.FME_CLOUD_API_URL = '{}/v1'.format(fme.url)
+        # update in place, `OBJECTSTORES` is imported by name in `objectstore`
+        for objectstore_id in bgt_setup.OBJECTSTORES:
+            bgt_setup.OBJECTSTORES[objectstore_id] = swift.credentials()
+        try:
+            yield fme, swift
+        finally:
+            bgt_setup.FME_BASE_URL, bgt_setup.FME_CLOUD_API_URL = saved[:2]
+            bgt_setup.OBJECTSTORES.update(saved[2])
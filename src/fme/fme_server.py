@@ -1,19 +1,26 @@
 import logging
 import socket
-import time
 from urllib.parse import urlparse
 
-import requests
+from bgt_setup import FME_CLOUD_API_URL
+from fme.http_session import session
+from fme.polling import poll
 
 log = logging.getLogger(__name__)
 
 
 class FMEServer(object):
-    def __init__(self, server_name, instance_id, api_token):
+    # Seconds to wait for the instance to start or pause
+    START_TIMEOUT = 1800
+    STOP_TIMEOUT = 1800
+
+    def __init__(self, server_name, instance_id, api_token, api_url=FME_CLOUD_API_URL):
         self.api_token = api_token
+        self.api_url = api_url
         self.instance_id = instance_id
         self.server_name = server_name
         self.server_url = urlparse(server_name)
+        self.headers = {'Authorization': 'bearer {FME_CLOUD_API_TOKEN}'.format(FME_CLOUD_API_TOKEN=api_token)}
 
     def _in_dns(self) -> bool:
         """
@@ -33,7 +40,7 @@ class FMEServer(object):
         Returns the auth header
         :return: dict
         """
-        return {'Authorization': 'bearer {FME_CLOUD_API_TOKEN}'.format(FME_CLOUD_API_TOKEN=self.api_token)}
+        return self.headers
 
 
     def _url(self, path=None) -> str:
@@ -42,10 +49,10 @@ class FMEServer(object):
         :param path:
         :return:
         """
-        return 'https://api.fmecloud.safe.com/v1/instances/{}{}'.format(self.instance_id, path or "")
+        return '{}/instances/{}{}'.format(self.api_url, self.instance_id, path or "")
 
     def get_status(self) -> str:
-        res = requests.get(self._url(), headers=self._headers())
+        res = session.get(self._url(), headers=self._headers())
         res.raise_for_status()
 
         status = res.json()['state']
@@ -60,23 +67,14 @@ class FMEServer(object):
         if self.get_status() != "RUNNING":
             # Only start the service when it is not running
             log.info("Starting server %s", self.server_name)
-            res = requests.put(self._url("/start"), headers=self._headers())
+            res = session.put(self._url("/start"), headers=self._headers())
             res.raise_for_status()
 
-            while self.get_status() in ['PENDING', 'STOPPING', 'PAUSED']:
-                time.sleep(1)
-
-            if self.get_status() == 'RUNNING':
-                log.debug("Already running")
-                return
-
-            while self.get_status() != 'RUNNING':
-                time.sleep(10)
+            poll(self.get_status, lambda status: status == 'RUNNING',
+                 description='server to start', maximum=10, timeout=self.START_TIMEOUT)
 
             log.debug("Waiting for DNS availability of server")
-
-            while not self._in_dns():
-                time.sleep(2)
+            poll(self._in_dns, bool, description='server DNS', maximum=10, timeout=self.START_TIMEOUT)
 
         log.info("Server started")
 
@@ -86,17 +84,17 @@ class FMEServer(object):
         :return:
         """
         log.info("Stopping server")
-        while self.get_status() in ['PENDING', 'STOPPING']:
-            time.sleep(1)
+        status = poll(self.get_status, lambda status: status not in ['PENDING', 'STOPPING'],
+                      description='server state change', maximum=10, timeout=self.STOP_TIMEOUT)
 
-        if self.get_status() != "RUNNING":
+        if status != "RUNNING":
             log.debug("Not running, cannot stop")
             return
 
-        res = requests.put(self._url("/pause"), headers=self._headers())
+        res = session.put(self._url("/pause"), headers=self._headers())
         res.raise_for_status()
 
-        while self.get_status() != 'PAUSED':
-            time.sleep(10)
+        poll(self.get_status, lambda status: status == 'PAUSED',
+             description='server to pause', maximum=10, timeout=self.STOP_TIMEOUT)
 
         log.info("Server paused")
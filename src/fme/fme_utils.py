@@ -1,19 +1,62 @@
+import functools
 import glob
+import io
 import json
 import logging
 import os
 import os.path
+import shutil
+import tempfile
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from zipfile import ZipFile
 
 import requests
 
-from bgt_setup import FME_INSTANCE_API_TOKEN, FME_BASE_URL
+import bgt_setup
+from fme.http_session import is_transient, session
+from fme.manifest import Manifest, file_hash
+from fme.polling import Backoff, poll
+from fme.run_report import report, size_of
 
 log = logging.getLogger(__name__)
 
+# Job states of FME jobs that are not finished yet
+JOB_RUNNING_STATES = ['SUBMITTED', 'QUEUED', 'PULLED']
 
-def fme_instance_api_auth():
-    return {'Authorization': 'fmetoken token={FME_INSTANCE_API_TOKEN}'.format(FME_INSTANCE_API_TOKEN=FME_INSTANCE_API_TOKEN)}
+# Job states of failed FME jobs that may succeed when submitted again
+JOB_RETRYABLE_STATES = ['FME_FAILURE', 'JOB_FAILURE']
+
+# FME directory with the manifests of the synced uploads, see `upload` and `fme.manifest`
+MANIFEST_DIRECTORY = 'bgt_manifests'
+
+# Files from this size in bytes have the progress of their upload logged, smaller ones only when done
+UPLOAD_PROGRESS_MINIMUM = 50 * 1024 * 1024
+
+# Messages in the job log of a job that failed for lack of memory or disk space
+RESOURCE_FAILURE_MESSAGES = [
+    'out of memory', 'memory allocation failed', 'insufficient memory', 'bad_alloc', 'no space left on device',
+]
+
+
+@functools.lru_cache(maxsize=None)
+def _fme_headers(token, content_type):
+    headers = (('Authorization', 'fmetoken token={}'.format(token)),)
+    if content_type:
+        headers += (('Content-Type', content_type),)
+    return headers
+
+
+def fme_instance_api_auth(content_type=None) -> dict:
+    """
+    The FME server auth headers, a new dict on every call that callers may change
+    :param content_type: adds a `Content-Type` header when given
+    :return: dict
+    """
+    return dict(_fme_headers(bgt_setup.FME_INSTANCE_API_TOKEN, content_type))
 
 
 def delete_directory(directory):
@@ -25,8 +68,8 @@ def delete_directory(directory):
     log.info("Delete directory %s", directory)
     url = (
         '{FME_BASE_URL}/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/{directory}?detail=low'.format(
-            FME_BASE_URL=FME_BASE_URL, directory=directory))
-    repository_res = requests.delete(url, headers=fme_instance_api_auth())
+            FME_BASE_URL=bgt_setup.FME_BASE_URL, directory=directory))
+    repository_res = session.delete(url, headers=fme_instance_api_auth())
     if repository_res.status_code == 404:
         log.debug("Directory not found")
         return repository_res.status_code
@@ -42,8 +85,8 @@ def delete_repository(repo):
     :return:
     """
     log.info("Delete repository %s", repo)
-    url = ('{FME_BASE_URL}/fmerest/v2/repositories/{repo}?detail=low'.format(FME_BASE_URL=FME_BASE_URL, repo=repo))
-    repository_res = requests.delete(url, headers=fme_instance_api_auth())
+    url = ('{FME_BASE_URL}/fmerest/v2/repositories/{repo}?detail=low'.format(FME_BASE_URL=bgt_setup.FME_BASE_URL, repo=repo))
+    repository_res = session.delete(url, headers=fme_instance_api_auth())
     if repository_res.status_code == 404:
         log.debug("Repository not found")
         return repository_res.status_code
@@ -60,8 +103,8 @@ def create_directory(directory):
     """
     log.info("Create directory %s", directory)
     url = ('{FME_BASE_URL}/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA'
-           '/filesys/?detail=low'.format(FME_BASE_URL=FME_BASE_URL))
-    res = requests.post(url, headers=fme_instance_api_auth(), data={'directoryname': directory, 'type': 'DIR', })
+           '/filesys/?detail=low'.format(FME_BASE_URL=bgt_setup.FME_BASE_URL))
+    res = session.post(url, headers=fme_instance_api_auth(), data={'directoryname': directory, 'type': 'DIR', })
     res.raise_for_status()
     log.debug("Directory created")
 
@@ -73,13 +116,89 @@ def create_repository(repo):
     :return:
     """
     log.info("Create repository %s", repo)
-    url = ('{FME_BASE_URL}/fmerest/v2/repositories/?detail=low'.format(FME_BASE_URL=FME_BASE_URL))
-    res = requests.post(url, headers=fme_instance_api_auth(), data={'name': repo})
+    url = ('{FME_BASE_URL}/fmerest/v2/repositories/?detail=low'.format(FME_BASE_URL=bgt_setup.FME_BASE_URL))
+    res = session.post(url, headers=fme_instance_api_auth(), data={'name': repo})
 
     res.raise_for_status()
     log.debug("Directory created")
 
 
+def list_directory(directory):
+    """
+    The names of the files in a FME data directory
+    :param directory: the directory name
+    :return: set of file names, None when the directory does not exist
+    """
+    url = '{FME_BASE_URL}/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/{directory}' \
+          '?depth=1&detail=low'.format(FME_BASE_URL=bgt_setup.FME_BASE_URL, directory=directory)
+    res = session.get(url, headers=fme_instance_api_auth())
+    if res.status_code == 404:
+        return None
+    res.raise_for_status()
+    return {entry['name'] for entry in res.json().get('contents', []) if entry.get('type') == 'FILE'}
+
+
+def list_repository(repo):
+    """
+    The names of the items in a FME repository
+    :param repo: the repository name
+    :return: set of item names, None when the repository does not exist
+    """
+    url = '{FME_BASE_URL}/fmerest/v2/repositories/{repo}/items?detail=low'.format(
+        FME_BASE_URL=bgt_setup.FME_BASE_URL, repo=repo)
+    res = session.get(url, headers=dict(fme_instance_api_auth(), Accept='application/json'))
+    if res.status_code == 404:
+        return None
+    res.raise_for_status()
+    items = res.json()
+    if isinstance(items, dict):
+        items = items.get('items', [])
+    return {item['name'] for item in items}
+
+
+def delete_repository_item(repo, item):
+    """
+    Deletes an item of a FME repository
+    :param repo: the repository name
+    :param item: the item name
+    :return:
+    """
+    log.info("Delete item %s of repository %s", item, repo)
+    url = '{FME_BASE_URL}/fmerest/v2/repositories/{repo}/items/{item}?detail=low'.format(
+        FME_BASE_URL=bgt_setup.FME_BASE_URL, repo=repo, item=item)
+    res = session.delete(url, headers=fme_instance_api_auth())
+    if res.status_code != 404:
+        res.raise_for_status()
+
+
+def load_manifest(name) -> Manifest:
+    """
+    The manifest of a synced destination, see `upload`
+    :param name: the manifest name
+    :return: Manifest, empty when there is none yet
+    """
+    url = '{FME_BASE_URL}/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/{directory}/{name}.json' \
+          '?accept=contents'.format(FME_BASE_URL=bgt_setup.FME_BASE_URL, directory=MANIFEST_DIRECTORY, name=name)
+    res = session.get(url, headers=fme_instance_api_auth())
+    if res.status_code == 404:
+        return Manifest()
+    res.raise_for_status()
+    return Manifest.from_json(res.text)
+
+
+def save_manifest(name, manifest):
+    """
+    Store the manifest of a synced destination on the FME server
+    :param name: the manifest name
+    :param manifest: Manifest
+    :return:
+    """
+    url = '{FME_BASE_URL}/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/{directory}' \
+          '?createDirectories=true&detail=low&overwrite=true'.format(
+              FME_BASE_URL=bgt_setup.FME_BASE_URL, directory=MANIFEST_DIRECTORY)
+    _post_file(url, name, '{}.json'.format(name), manifest.to_json().encode('utf-8'))
+
+
 def _post_file(url, full_path, filename, payload):
     """
     HTTP Post file to FME server
@@ -89,14 +208,54 @@ def _post_file(url, full_path, filename, payload):
     :param payload: the payload data
     :return:
     """
-    headers = {
-        'Content-Disposition': 'attachment; filename="{}"'.format(filename),
-        'Content-Type': "application/octet-stream",
-        'Authorization': 'fmetoken token={FME_INSTANCE_API_TOKEN}'.format(FME_INSTANCE_API_TOKEN=FME_INSTANCE_API_TOKEN),
-    }
+    headers = dict(fme_instance_api_auth('application/octet-stream'),
+                   **{'Content-Disposition': 'attachment; filename="{}"'.format(filename)})
     log.debug('Uploading {} to {}'.format(full_path, filename))
-    repository_res = requests.post(url, data=payload, headers=headers)
+    repository_res = session.post(url, data=payload, headers=headers)
     repository_res.raise_for_status()
+    sent = size_of(payload)
+    _verify_size(repository_res, filename, sent)
+    report.add_bytes_uploaded('fme', sent)
+
+
+def _verify_size(response, filename, sent):
+    """
+    Check the size FME reports for an uploaded file, when it does, against the bytes sent
+    :raises requests.HTTPError: without a response, so the upload is tried again, when the sizes differ
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return
+    received = body.get('size') if isinstance(body, dict) else None
+    if received is not None and received != sent:
+        raise requests.HTTPError("Uploaded {} has {} bytes on the server, sent {}".format(filename, received, sent))
+
+
+class _ProgressReader(object):
+    """
+    Reads the file object `f` of `size` bytes for an upload and logs the progress at every tenth
+    """
+
+    def __init__(self, f, name, size):
+        self.f = f
+        self.name = name
+        self.size = size
+        self.position = 0
+
+    def __len__(self):
+        return self.size
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, amount=-1) -> bytes:
+        block = self.f.read(amount)
+        previous, self.position = self.position, self.position + len(block)
+        if self.size and self.position * 10 // self.size > previous * 10 // self.size:
+            log.info("Uploading %s: %.1f of %.1f MB (%.0f%%)",
+                     self.name, self.position / 1e6, self.size / 1e6, 100.0 * self.position / self.size)
+        return block
 
 
 def _register_fmejobsubmitter_service(repo_name, filename):
@@ -111,13 +270,9 @@ def _register_fmejobsubmitter_service(repo_name, filename):
 
     log.debug("Register `fmejobsubmitter` service")
     reg_service_url = '{FME_BASE_URL}/{url_connect}/{repo_name}/items/{filename}/services?detail=low&accept=json'.format(
-        FME_BASE_URL=FME_BASE_URL, url_connect=url_repositories, repo_name=repo_name, filename=filename)
-    reg_service_headers = {
-        'Accept': 'application/json',
-        'Content-Type': 'application/x-www-form-urlencoded',
-        'Authorization': 'fmetoken token={FME_INSTANCE_API_TOKEN}'.format(FME_INSTANCE_API_TOKEN=FME_INSTANCE_API_TOKEN)
-    }
-    reg_service_res = requests.post(
+        FME_BASE_URL=bgt_setup.FME_BASE_URL, url_connect=url_repositories, repo_name=repo_name, filename=filename)
+    reg_service_headers = dict(fme_instance_api_auth('application/x-www-form-urlencoded'), Accept='application/json')
+    reg_service_res = session.post(
         reg_service_url, headers=reg_service_headers, data="services=fmejobsubmitter")
     reg_service_res.raise_for_status()
     log.debug("Registered `fmejobsubmitter` service")
@@ -125,28 +280,334 @@ def _register_fmejobsubmitter_service(repo_name, filename):
 
 
 def download(path, disposition='inline', text=True):
+    """
+    Download a small file from the FME data resources into memory, see
+    `download_to` for files that may be large
+    :param path: the path in the FME data resources
+    :param disposition:
+    :param text: decode the contents as UTF-8
+    :return: str or bytes
+    """
+    buffer = io.BytesIO()
+    download_to(path, buffer, disposition)
+    return buffer.getvalue().decode('utf-8') if text else buffer.getvalue()
+
+
+def download_to(path, sink, disposition='inline', chunk_size=1024 * 1024, retries=None) -> int:
+    """
+    Stream a file from the FME data resources to `sink` in chunks of `chunk_size`
+    bytes, so memory use does not depend on the size of the file. When the
+    connection drops the download resumes with a `Range` request after the bytes
+    written so far. The number of bytes written is checked against the length
+    the server announced.
+    :param path: the path in the FME data resources
+    :param sink: local file path, or file object to write to
+    :param disposition:
+    :param chunk_size: bytes read at a time
+    :param retries: times the download resumes after an error, `bgt_setup.FME_DOWNLOAD_RETRIES` when None
+    :return: bytes written
+    :raises requests.RequestException: when the download still failed after its retries
+    """
+    if isinstance(sink, str):
+        with open(sink, 'wb') as f:
+            return download_to(path, f, disposition, chunk_size, retries)
 
     log.info(f"Download {path}")
+    retries = bgt_setup.FME_DOWNLOAD_RETRIES if retries is None else retries
+    url_connect = 'fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/'
+    url = f'{bgt_setup.FME_BASE_URL}/{url_connect}{path}?disposition={disposition}&accept=contents'
+    written, total, failures = 0, None, 0
+    delays = Backoff(initial=1.0, maximum=30.0)
+
+    while total is None or written < total:
+        headers = fme_instance_api_auth()
+        if written:
+            headers['Range'] = 'bytes={}-'.format(written)
+        try:
+            with session.get(url, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                skip = written if response.status_code == 200 else 0
+                total = _content_total(response)
+                for chunk in response.iter_content(chunk_size):
+                    if skip:
+                        # the server ignored the range, skip what was written before
+                        chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+                    sink.write(chunk)
+                    written += len(chunk)
+                    report.add_bytes_downloaded('fme', len(chunk))
+            if total is None:
+                # no length announced, all there is has been read
+                total = written
+            elif written != total:
+                raise requests.exceptions.ChunkedEncodingError(
+                    "Download of {} ended after {} of {} bytes".format(path, written, total))
+        except requests.RequestException as e:
+            failures += 1
+            if failures > retries or not is_transient(e):
+                raise
+            delay = delays.next_delay()
+            log.warning("Download of %s failed (%s), resuming in %.1f s", path, e, delay)
+            time.sleep(delay)
+    return written
+
+
+def _content_total(response):
+    # length of the whole file from the Content-Range of a 206 or the Content-Length of a 200
+    if response.status_code == 206:
+        content_range = response.headers.get('Content-Range', '')
+        total = content_range.rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('Content-Length')
+    return int(length) if length and 'Content-Encoding' not in response.headers else None
+
+
+def list_folder(folder) -> list:
+    """
+    The entries of a FME data directory, in the order of the listing
+    :param folder: the directory name
+    :return: list of dicts with `name`, `path` and `type`
+    """
+    url = '{FME_BASE_URL}/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/{folder}' \
+          '?accept=json&depth=1&detail=low'.format(FME_BASE_URL=bgt_setup.FME_BASE_URL, folder=folder)
+    res = session.get(url, headers=fme_instance_api_auth('application/json'))
+    res.raise_for_status()
+    return res.json()['contents']
 
-    headers = {
-        'Content-Type': "application/json",
-        'Authorization': 'fmetoken token={FME_INSTANCE_API_TOKEN}'.format(FME_INSTANCE_API_TOKEN=FME_INSTANCE_API_TOKEN),
-    }
 
-    url_connect = f'fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/'
-    url = f'{FME_BASE_URL}/{url_connect}{path}?disposition={disposition}&accept=contents'
+def download_folder_to_zip(folder, zf, concurrency=None) -> int:
+    """
+    Download the files in a FME data directory into a zip file, `concurrency`
+    files at a time. Each file is streamed to a temporary file and copied into
+    the zip in the order of the listing, at most `2 * concurrency` files ahead
+    of the zip writer, so memory and disk use do not grow with the folder.
+    :param folder: the directory name
+    :param zf: ZipFile opened for writing
+    :param concurrency: files downloaded at the same time, `bgt_setup.FME_DOWNLOAD_CONCURRENCY` when None
+    :return: number of files added to the zip
+    """
+    concurrency = concurrency or bgt_setup.FME_DOWNLOAD_CONCURRENCY
+    entries = list_folder(folder)
+
+    def fetch(entry):
+        f = tempfile.TemporaryFile()
+        try:
+            download_to('{}/{}'.format(entry['path'], entry['name']), f)
+            f.seek(0)
+            return f
+        except Exception:
+            f.close()
+            raise
+
+    def write(entry, future):
+        with future.result() as f, zf.open(entry['name'], mode='w') as member:
+            shutil.copyfileobj(f, member)
+            return f.tell()
+
+    started, total = time.monotonic(), 0
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for entry in entries:
+                pending.append((entry, executor.submit(report.bind(fetch), entry)))
+                if len(pending) >= 2 * concurrency:
+                    total += write(*pending.popleft())
+            while pending:
+                total += write(*pending.popleft())
+        finally:
+            # after an error, close the files downloaded ahead
+            for _, future in pending:
+                if not future.cancel() and future.exception() is None:
+                    future.result().close()
+
+    elapsed = time.monotonic() - started
+    log.info("Zipped %d files, %.1f MB from %s in %.1f s (%.1f files/s, %.1f MB/s)",
+             len(entries), total / 1e6, folder, elapsed,
+             len(entries) / elapsed if elapsed else 0.0, total / 1e6 / elapsed if elapsed else 0.0)
+    return len(entries)
+
+
+def zip_folder(folder, concurrency=None):
+    """
+    Writer of a zip with the files in a FME data directory, for `ObjectStore.put_stream`
+    :param folder: the directory name
+    :param concurrency: see `download_folder_to_zip`
+    :return: callable writing the zip to the file-like object it gets
+    """
+    def write(f):
+        with ZipFile(f, mode='w') as zf:
+            download_folder_to_zip(folder, zf, concurrency)
+    return write
+
+
+def _upload_file(url, path, retries):
+    filename = os.path.split(path)[-1]
+    delays = Backoff(initial=1.0, maximum=30.0)
+    for attempt in range(retries + 1):
+        try:
+            with open(path, 'rb') as f:
+                size = os.path.getsize(path)
+                _post_file(url, path, filename,
+                           _ProgressReader(f, filename, size) if size >= UPLOAD_PROGRESS_MINIMUM else f)
+            return
+        except requests.RequestException as e:
+            if attempt >= retries or not is_transient(e):
+                raise
+            delay = delays.next_delay()
+            log.warning("Upload of %s failed (%s), trying again in %.1f s", filename, e, delay)
+            time.sleep(delay)
+
+
+def _upload_one(url, path, retries, uploaded) -> int:
+    # upload a file and report it, see `upload_files`
+    _upload_file(url, path, retries)
+    if uploaded is not None:
+        uploaded(os.path.split(path)[-1])
+    return os.path.getsize(path)
+
+
+def upload_files(url, paths, concurrency=None, retries=None, uploaded=None) -> int:
+    """
+    Post files to FME, `concurrency` files at a time. The upload of a file is
+    tried again after a connection error or 5xx response, or when FME reports
+    another size than was sent, up to `retries` times. The progress of the
+    upload of large files is logged, see `UPLOAD_PROGRESS_MINIMUM`.
+    :param url: the url to post to
+    :param paths: list of local file paths
+    :param concurrency: files uploaded at the same time, `bgt_setup.FME_UPLOAD_CONCURRENCY` when None
+    :param retries: times the upload of a file is tried again, `bgt_setup.FME_UPLOAD_RETRIES` when None
+    :param uploaded: callable called with the file name after the upload of each file, in its upload thread
+    :return: total bytes uploaded
+    :raises requests.RequestException: of the first file of which the upload failed, after all uploads finished
+    """
+    concurrency = concurrency or bgt_setup.FME_UPLOAD_CONCURRENCY
+    retries = bgt_setup.FME_UPLOAD_RETRIES if retries is None else retries
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(report.bind(_upload_one), url, path, retries, uploaded)
+                   for path in paths]
+    total = sum(future.result() for future in futures)
+
+    elapsed = time.monotonic() - started
+    log.info("Uploaded %d files, %.1f MB in %.1f s (%.1f MB/s)",
+             len(paths), total / 1e6, elapsed, total / 1e6 / elapsed if elapsed else 0.0)
+    return total
+
 
+class Sync(object):
+    """
+    Brings a FME destination in line with local files according to its
+    manifest, see `fme.manifest`. The files are added one at a time with `add`,
+    as soon as they are complete locally, and the new and changed ones are
+    uploaded in the background, `concurrency` at a time. `finish` waits for
+    the uploads, deletes the stale files and saves the manifest.
+    :param url: the url to post the files to
+    :param existing: names of the files in the destination
+    :param manifest_name: the name of the manifest of the destination
+    :param pattern: wildcard expression the local files are selected with
+    :param delete: callable deleting a file from the destination by name
+    :param replace_changed: delete changed files before uploading them again
+    :param concurrency: files uploaded at the same time, see `upload_files`
+    :param uploaded: see `upload_files`
+    """
+
+    def __init__(self, url, existing, manifest_name, pattern, delete, replace_changed=False, concurrency=None,
+                 uploaded=None):
+        self.url = url
+        self.existing = existing
+        self.manifest_name = manifest_name
+        self.pattern = pattern
+        self.delete = delete
+        self.replace_changed = replace_changed
+        self.uploaded = uploaded
+        self.manifest = load_manifest(manifest_name)
+        self.local = {}
+        self.futures = []
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency or bgt_setup.FME_UPLOAD_CONCURRENCY)
+
+    def add(self, path) -> bool:
+        """
+        Upload a local file when it is new or changed, may be called from several threads
+        :param path: the local file path
+        :return: whether the file is uploaded
+        """
+        name = os.path.split(path)[-1]
+        digest = file_hash(path)
+        with self.lock:
+            self.local[name] = digest
+        if name in self.existing and self.manifest.hashes.get(name) == digest:
+            return False
+        if self.replace_changed and name in self.existing:
+            self.delete(name)
+        future = self.executor.submit(
+            report.bind(_upload_one), self.url, path, bgt_setup.FME_UPLOAD_RETRIES, self.uploaded)
+        with self.lock:
+            self.futures.append(future)
+        return True
+
+    def finish(self, complete=True):
+        """
+        Wait for the uploads and save the manifest
+        :param complete: all local files selected with the pattern were added, so the
+            files uploaded before that were not are stale and deleted. Otherwise only
+            the added files are recorded in the manifest.
+        :raises requests.RequestException: of the first file of which the upload failed
+        """
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
+
+        stale = self.manifest.changes(self.local, self.pattern, self.existing)[1] if complete else []
+        log.info("Sync %s %s: %d of %d files new or changed, %d stale",
+                 self.manifest_name, self.pattern, len(self.futures), len(self.local), len(stale))
+        for name in stale:
+            self.delete(name)
+
+        previous = dict(self.manifest.hashes)
+        if complete:
+            self.manifest.update(self.local, self.pattern)
+        else:
+            self.manifest.hashes.update(self.local)
+        if self.manifest.hashes != previous:
+            save_manifest(self.manifest_name, self.manifest)
+
+
+def _sync(sync, source_directory, files):
+    # add the local files selected with `files` to `sync` and finish it
     try:
-        response = requests.get(url, headers=headers)
-        if text:
-            return response.text
-        return response.content
-    except requests.exceptions.RequestException as e:
-        log.debug('HTTP Request failed')
-        raise e
+        for path in sorted(glob.glob(os.path.join(source_directory, files))):
+            sync.add(path)
+    finally:
+        sync.finish()
+
+
+def _directory_url(repo, directory) -> str:
+    url_connect = 'fmerest/v2/{}'.format(repo)
+    return f'{bgt_setup.FME_BASE_URL}/{url_connect}/FME_SHAREDRESOURCE_DATA/filesys/{directory}? \
+          createDirectories=false&detail=low&overwrite=true'
+
+
+def sync_directory(repo, directory, files, concurrency=None) -> Sync:
+    """
+    Start a sync of local files to a directory of the FME data resources,
+    creating the directory when it does not exist
+    :param repo: the FME repo
+    :param directory: the FME directory in repo
+    :param files: wildcard expression the local files are selected with
+    :param concurrency: files uploaded at the same time, see `upload_files`
+    :return: Sync
+    """
+    url = _directory_url(repo, directory)
+    existing = list_directory(directory)
+    if existing is None:
+        create_directory(directory)
+        existing = set()
+    return Sync(url, existing, 'directory-{}'.format(directory), files,
+                lambda name: delete_directory('{}/{}'.format(directory, name)), concurrency=concurrency)
 
 
-def upload(source_directory, repo, directory, files, recreate_dir=True):
+def upload(source_directory, repo, directory, files, recreate_dir=True, concurrency=None, sync=False):
     """
     Upload one or more files to FME
     :param source_directory: the local source directory
@@ -154,26 +615,27 @@ def upload(source_directory, repo, directory, files, recreate_dir=True):
     :param directory: the FME directory in repo
     :param files: string with filename or wildcard expression
     :param recreate_dir: explicitly recreates the desitnation directory
+    :param concurrency: files uploaded at the same time, see `upload_files`
+    :param sync: only upload new and changed files and delete the files uploaded before
+        that are gone, instead of recreating the directory, see `fme.manifest`
     :return: bool
     """
-    url_connect = 'fmerest/v2/{}'.format(repo)
+    if sync:
+        _sync(sync_directory(repo, directory, files, concurrency), source_directory, files)
+        return
 
     if recreate_dir:
         delete_directory(directory)
         create_directory(directory)
 
-    url = f'{FME_BASE_URL}/{url_connect}/FME_SHAREDRESOURCE_DATA/filesys/{directory}? \
-          createDirectories=false&detail=low&overwrite=true'
-
-    for infile in glob.glob(os.path.join(source_directory, files)):
-        log.debug('upload {}'.format(infile))
-        with open(infile, 'rb') as f:
-            _post_file(url, infile, os.path.split(infile)[-1], f)
+    upload_files(_directory_url(repo, directory), sorted(glob.glob(os.path.join(source_directory, files))),
+                 concurrency)
 
     log.debug("Upload {} completed".format(files))
 
 
-def upload_repository(source_directory, directory, files, recreate_repo=True, register_fmejob=False):
+def upload_repository(source_directory, directory, files, recreate_repo=True, register_fmejob=False,
+                      concurrency=None, sync=False):
     """
     Upload one or more files to FME
     :param source_directory: the local source directory
@@ -181,22 +643,31 @@ def upload_repository(source_directory, directory, files, recreate_repo=True, re
     :param files: string with filename or wildcard expression
     :param recreate_repo: explicitly recreates the destination repo
     :param register_fmejob:
+    :param concurrency: files uploaded at the same time, see `upload_files`
+    :param sync: only upload and register new and changed files and delete the files
+        uploaded before that are gone, instead of recreating the repo, see `fme.manifest`
     :return: bool
     """
     url_connect = 'fmerest/v2/repositories/{}'.format(directory)
+    url = '{FME_BASE_URL}/{url_connect}/items?detail=low&accept=json'.format(
+        FME_BASE_URL=bgt_setup.FME_BASE_URL, url_connect=url_connect)
+    register = (lambda filename: _register_fmejobsubmitter_service(directory, filename)) if register_fmejob else None
+
+    if sync:
+        existing = list_repository(directory)
+        if existing is None:
+            create_repository(directory)
+            existing = set()
+        _sync(Sync(url, existing, 'repository-{}'.format(directory), files,
+                   lambda name: delete_repository_item(directory, name), replace_changed=True,
+                   concurrency=concurrency, uploaded=register), source_directory, files)
+        return
 
     if recreate_repo:
         delete_repository(directory)
         create_repository(directory)
 
-    for infile in glob.glob(os.path.join(source_directory, files)):
-        print(infile)
-        with open(infile, 'rb') as f:
-            url = '{FME_BASE_URL}/{url_connect}/items?detail=low&accept=json'.format(
-                FME_BASE_URL=FME_BASE_URL, url_connect=url_connect)
-            _post_file(url, infile, os.path.split(infile)[-1], f)
-            if register_fmejob:
-                _register_fmejobsubmitter_service(directory, os.path.split(infile)[-1])
+    upload_files(url, sorted(glob.glob(os.path.join(source_directory, files))), concurrency, uploaded=register)
 
     log.debug("Upload {} completed".format(files))
 
@@ -211,16 +682,14 @@ def run_transformation_job(repository, workspace, params):
     """
     urltransform = 'fmerest/v2/transformations'
     target_url = '{FME_BASE_URL}/{urltransform}/commands/submit/{repository}/{workspace}?detail=low&accept=json'.format(
-        FME_BASE_URL=FME_BASE_URL, urltransform=urltransform, repository=repository, workspace=workspace)
+        FME_BASE_URL=bgt_setup.FME_BASE_URL, urltransform=urltransform, repository=repository, workspace=workspace)
     try:
-        response = requests.post(
+        response = session.post(
             url=target_url,
-            headers={
-                "Referer": "{FME_BASE_URL}/fmerest/v2/apidoc/".format(FME_BASE_URL=FME_BASE_URL),
-                "Origin": "{FME_BASE_URL}".format(FME_BASE_URL=FME_BASE_URL),
-                "Authorization": "fmetoken token={FME_INSTANCE_API_TOKEN}".format(FME_INSTANCE_API_TOKEN=FME_INSTANCE_API_TOKEN),
-                "Content-Type": "application/json",
-                "Accept": "application/json"},
+            headers=dict(fme_instance_api_auth('application/json'), **{
+                "Referer": "{FME_BASE_URL}/fmerest/v2/apidoc/".format(FME_BASE_URL=bgt_setup.FME_BASE_URL),
+                "Origin": "{FME_BASE_URL}".format(FME_BASE_URL=bgt_setup.FME_BASE_URL),
+                "Accept": "application/json"}),
             data=json.dumps(params))
 
         log.debug('Response HTTP Status Code: {status_code}'.format(status_code=response.status_code))
@@ -240,37 +709,130 @@ def fetch_log_for_job(job):
     :return:
     """
     url = '{FME_BASE_URL}/{urltransform}/jobs/id/{jobid}/log?detail=low'.format(
-        FME_BASE_URL=FME_BASE_URL, urltransform=job['urltransform'], jobid=job['jobid'])
-    res = requests.get(url, headers=fme_instance_api_auth())
+        FME_BASE_URL=bgt_setup.FME_BASE_URL, urltransform=job['urltransform'], jobid=job['jobid'])
+    res = session.get(url, headers=fme_instance_api_auth())
     res.raise_for_status()
     return res.content.decode(encoding='utf-8')
 
 
+def get_job(job):
+    """
+    Fetches the job details for job `job`
+    :param job:
+    :return: dict
+    """
+    url = '{FME_BASE_URL}/{urltransform}/jobs/id/{jobid}?detail=low'.format(
+        FME_BASE_URL=bgt_setup.FME_BASE_URL, urltransform=job['urltransform'], jobid=job['jobid'])
+    res = session.get(url, headers=fme_instance_api_auth())
+    res.raise_for_status()
+    return res.json()
+
+
 def get_job_status(job):
     """
     Fetches the job status for job `job`
     :param job:
     :return:
     """
-    url = '{FME_BASE_URL}/{urltransform}/jobs/id/{jobid}?detail=low'.format(
-        FME_BASE_URL=FME_BASE_URL, urltransform=job['urltransform'], jobid=job['jobid'])
-    res = requests.get(url, headers=fme_instance_api_auth())
-    res.raise_for_status()
-    log.debug("Status for job %s: %s", job, res.json()['status'])
-    return res.json()['status']
+    status = get_job(job)['status']
+    log.debug("Status for job %s: %s", job, status)
+    return status
+
+
+def get_active_job_statuses(urltransform='fmerest/v2/transformations') -> dict:
+    """
+    Fetches the status of all queued and running jobs on the server, with one
+    listing call per state. Jobs that are just submitted or finished are not listed.
+    :param urltransform: the transformations url of the jobs
+    :return: dict {jobid: status}
+    """
+    statuses = {}
+    # queued before running: a job that starts in between is then listed as running
+    for state, default_status in (('queued', 'QUEUED'), ('running', 'PULLED')):
+        url = '{FME_BASE_URL}/{urltransform}/jobs/{state}'.format(
+            FME_BASE_URL=bgt_setup.FME_BASE_URL, urltransform=urltransform, state=state)
+        res = session.get(url, params={'limit': -1, 'offset': -1, 'detail': 'low'}, headers=fme_instance_api_auth())
+        res.raise_for_status()
+        for item in res.json()['items']:
+            statuses[item['id']] = item.get('status') or default_status
+    return statuses
+
+
+def get_job_statuses(jobs) -> dict:
+    """
+    Fetches the status of many jobs at once. Queued and running jobs come from
+    `get_active_job_statuses`; the other jobs, or all jobs when the listings
+    are not available, are fetched per job.
+    :param jobs: list of dicts with `jobid` and `urltransform`
+    :return: dict {jobid: status}
+    """
+    try:
+        active = get_active_job_statuses()
+    except requests.exceptions.RequestException as e:
+        log.warning("Could not list the active jobs, fetching the status per job: %s", e)
+        active = {}
+    return {job['jobid']: active[job['jobid']] if job['jobid'] in active else get_job_status(job) for job in jobs}
+
+
+def is_resource_failure(job_log) -> bool:
+    """
+    Did the job with log `job_log` fail for lack of resources
+    :param job_log: the job log text, see `fetch_log_for_job`
+    :return: bool
+    """
+    job_log = (job_log or '').lower()
+    return any(message in job_log for message in RESOURCE_FAILURE_MESSAGES)
+
+
+def _parse_job_time(value):
+    try:
+        return datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+    except (TypeError, ValueError):
+        return None
 
 
-def wait_for_job_to_complete(job, sleep_time=60):
+def job_timings(job_detail):
+    """
+    Queue time and run time in seconds of a finished job
+    :param job_detail: the job details as returned by `get_job`
+    :return: tuple (queue_time, run_time), None when unknown
+    """
+    result = job_detail.get('result') or {}
+    requested, started, finished = (
+        _parse_job_time(result.get(name) or job_detail.get(name))
+        for name in ('timeRequested', 'timeStarted', 'timeFinished'))
+
+    queue_time = (started - requested).total_seconds() if requested and started else None
+    run_time = (finished - started).total_seconds() if started and finished else None
+    return queue_time, run_time
+
+
+def report_job(job, job_detail):
+    """
+    Add the outcome of a finished job to the run report
+    :param job: dictionary with `jobid` and `urltransform`
+    :param job_detail: the job details as returned by `get_job`
+    :return:
+    """
+    queue_time, run_time = job_timings(job_detail)
+    report.add_job(
+        job, job_detail['status'], queue_time=queue_time, run_time=run_time,
+        features_output=(job_detail.get('result') or {}).get('numFeaturesOutput'))
+
+
+def wait_for_job_to_complete(job, **backoff):
     """
     Monitors the job, waits for it to complete and reports in log.
     :param job:  dictionary with `jobid` and `urltransform`
-    :return:
+    :param backoff: arguments of `fme.polling.Backoff`
+    :return: the final job status
     """
-    while get_job_status(job) in ['SUBMITTED', 'QUEUED', 'PULLED']:
-        time.sleep(sleep_time)
+    job_detail = poll(lambda: get_job(job), lambda detail: detail['status'] not in JOB_RUNNING_STATES,
+                      description='job {}'.format(job['jobid']), **backoff)
 
     # Job is completed or has failed, check and report
-    job_status = get_job_status(job)
+    job_status = job_detail['status']
+    report_job(job, job_detail)
     log.debug("Job completed with status: {}".format(job_status))
 
     if job_status != 'SUCCESS':
@@ -278,3 +840,4 @@ def wait_for_job_to_complete(job, sleep_time=60):
             log.debug("Log for job {} {}".format(job['jobid'], line))
 
     log.debug("Job {} finished with status {}".format(job['jobid'], job_status))
+    return job_status
@@ -0,0 +1,75 @@
+"""
+The HTTP session shared by all FME, FME Cloud and PDOK REST calls.
+
+It keeps connections alive in a pool per host, retries idempotent requests
+on connection errors and transient 5xx responses with backoff, and applies a
+default timeout per host (`bgt_setup.HTTP_TIMEOUT` and `HTTP_HOST_TIMEOUTS`).
+"""
+import logging
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import bgt_setup
+
+log = logging.getLogger(__name__)
+
+# Methods that have the same effect when sent twice, only these are retried
+# after the server received them
+IDEMPOTENT_METHODS = frozenset(['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT'])
+
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+
+
+def _retry(retries) -> Retry:
+    options = dict(
+        total=retries, backoff_factor=0.5, status_forcelist=RETRY_STATUSES, raise_on_status=False)
+    try:
+        return Retry(allowed_methods=IDEMPOTENT_METHODS, **options)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=IDEMPOTENT_METHODS, **options)
+
+
+class Session(requests.Session):
+    """
+    `requests.Session` with a connection pool, retries and a default timeout per host
+    :param retries: number of retries of a request
+    :param pool_size: number of connections kept alive per host
+    """
+
+    def __init__(self, retries=5, pool_size=10):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=_retry(retries))
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = timeout_for(url)
+        return super().request(method, url, **kwargs)
+
+
+def is_transient(error) -> bool:
+    """
+    Whether a failed request may succeed when sent again: connection errors,
+    timeouts and 5xx responses, not the 4xx responses
+    :param error: requests.RequestException
+    :return: bool
+    """
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code >= 500
+
+
+def timeout_for(url) -> tuple:
+    """
+    The (connect, read) timeout in seconds for requests to `url`
+    :param url:
+    :return: tuple
+    """
+    return bgt_setup.HTTP_HOST_TIMEOUTS.get(urlparse(url).hostname, bgt_setup.HTTP_TIMEOUT)
+
+
+session = Session(retries=bgt_setup.HTTP_RETRIES, pool_size=bgt_setup.HTTP_POOL_SIZE)
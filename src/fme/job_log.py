@@ -0,0 +1,126 @@
+import logging
+import re
+from collections import deque, namedtuple
+
+import bgt_setup
+import fme.fme_utils as fme_utils
+from fme.http_session import session
+from fme.run_report import report
+
+log = logging.getLogger(__name__)
+
+# A parsed line of a FME job log: `kind` is one of the `EVENT_PATTERNS` kinds,
+# `error` for ERROR lines or `message` for the other lines
+LogEvent = namedtuple('LogEvent', ['kind', 'value', 'level', 'elapsed', 'message'])
+
+# The whole message of a progress line in percent: `Translation progress: 45%`, `Progress 45%`,
+# `45% complete` or only `45%`. Other messages with a percentage, such as memory or CPU usage, are not.
+PROGRESS_PERCENT = re.compile(r'^(?:(?:Translation )?[Pp]rogress:?\s+)?(\d+(?:\.\d+)?)\s?%(?: (?:complete|done)\.?)?$')
+
+# (kind, pattern) of the progress and feature count lines, the first group is the value
+EVENT_PATTERNS = [
+    ('features_read', re.compile(r'Total Features Read\s+(\d+)')),
+    ('features_written', re.compile(r'Total Features Written\s+(\d+)')),
+    ('features_output', re.compile(r'Translation was SUCCESSFUL .*\((\d+) feature\(s\) output\)')),
+    ('translation_failed', re.compile(r'Translation (FAILED)')),
+    ('progress', re.compile(r'(?:Read|Processed|Wrote|Written)\s+(\d+)\s+features?\b')),
+    ('progress_percent', PROGRESS_PERCENT),
+]
+
+
+def parse_line(line) -> LogEvent:
+    """
+    Parse a FME job log line `timestamp|elapsed|cpu|level|message`
+    :param line: str
+    :return: LogEvent
+    """
+    parts = line.split('|', 4)
+    if len(parts) == 5:
+        _, elapsed, _, level, message = (part.strip() for part in parts)
+        try:
+            elapsed = float(elapsed)
+        except ValueError:
+            elapsed = None
+    else:
+        elapsed, level, message = None, None, line.strip()
+
+    for kind, pattern in EVENT_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            value = match.group(1)
+            return LogEvent(kind, value if kind == 'translation_failed' else float(value), level, elapsed, message)
+    if level in ('ERROR', 'FATAL'):
+        return LogEvent('error', None, level, elapsed, message)
+    return LogEvent('message', None, level, elapsed, message)
+
+
+class JobLogFollower(object):
+    """
+    Reads the log of a (running) FME job incrementally.
+
+    Every call of `lines` asks only for the bytes after the ones read before,
+    with a `Range` request, and streams them in chunks of `chunk_size`, so
+    memory use does not grow with the size of the log.
+
+    The last `tail_lines` lines read are kept in `tail`.
+
+    :param job: dict with `jobid` and `urltransform`
+    :param chunk_size: bytes read at a time
+    :param tail_lines: number of lines kept in `tail`
+    """
+
+    def __init__(self, job, chunk_size=64 * 1024, tail_lines=100):
+        self.job = job
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.partial = b''
+        self.tail = deque(maxlen=tail_lines)
+
+    def _url(self) -> str:
+        return '{FME_BASE_URL}/{urltransform}/jobs/id/{jobid}/log?detail=low'.format(
+            FME_BASE_URL=bgt_setup.FME_BASE_URL, urltransform=self.job['urltransform'], jobid=self.job['jobid'])
+
+    def lines(self, final=False):
+        """
+        Generator of the complete log lines written since the previous call
+        :param final: the job is finished, also return a last line without line end
+        :return: generator of str
+        """
+        headers = dict(fme_utils.fme_instance_api_auth(), Range='bytes={}-'.format(self.offset))
+        with session.get(self._url(), headers=headers, stream=True) as response:
+            chunks, skip = [], 0
+            # 416: nothing new
+            if response.status_code != 416:
+                response.raise_for_status()
+                chunks = response.iter_content(self.chunk_size)
+                skip = self.offset if response.status_code == 200 else 0
+
+            for chunk in chunks:
+                if skip:
+                    # the server ignored the range, skip what was read before
+                    chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+                self.offset += len(chunk)
+                report.add_bytes_downloaded('fme', len(chunk))
+                lines = (self.partial + chunk).split(b'\n')
+                self.partial = lines.pop()
+                for line in lines:
+                    yield self._line(line)
+
+        if final and self.partial:
+            line, self.partial = self.partial, b''
+            yield self._line(line)
+
+    def _line(self, line) -> str:
+        line = line.decode('utf-8', errors='replace').rstrip('\r')
+        self.tail.append(line)
+        return line
+
+    def events(self, final=False):
+        """
+        Generator of the parsed log lines written since the previous call
+        :param final: the job is finished, also return a last line without line end
+        :return: generator of LogEvent
+        """
+        for line in self.lines(final):
+            if line.strip():
+                yield parse_line(line)
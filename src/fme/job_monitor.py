@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+import fme.fme_utils as fme_utils
+from fme.job_log import JobLogFollower
+from fme.polling import Backoff, PollTimeout
+from fme.run_report import report
+
+log = logging.getLogger(__name__)
+
+# Status of a job the monitor gave up on
+TIMED_OUT = 'TIMED_OUT'
+
+# Number of jobs due for a status check from which the active jobs are listed
+# in bulk, instead of fetching the status per job
+BULK_STATUS_MINIMUM = 3
+
+# Fraction of its delay by which a job may be checked early, together with other due jobs
+EARLY_POLL_FRACTION = 0.25
+
+
+class JobError(Exception):
+    def __init__(self, job, status, job_log=None):
+        super().__init__("FME job {} finished with status {}".format(job['jobid'], status))
+        self.job = job
+        self.status = status
+        self.job_log = job_log
+
+
+class JobsFailed(Exception):
+    def __init__(self, errors):
+        super().__init__("{} FME job(s) failed: {}".format(len(errors), ', '.join(
+            '{} ({})'.format(e.job['jobid'], e.status) if isinstance(e, JobError) else repr(e) for e in errors)))
+        self.errors = errors
+
+
+class JobMonitor(object):
+    """
+    Watches any number of FME jobs from a single background thread.
+
+    `watch` returns a `Future` per job that resolves to a dict with the final
+    `status`, `queue_time` and `run_time` of the job, or fails with a
+    `JobError` when the job did not succeed. Every job is polled with its own
+    `fme.polling.Backoff`; when several jobs are due their status is listed in
+    bulk. An unexpected error while a job is checked fails its future with that
+    error, the other jobs are still watched. The thread stops when there are no
+    jobs left to watch.
+
+    :param timeout: seconds after which a job is given up on, None to wait forever
+    :param backoff: other arguments of `fme.polling.Backoff`
+    """
+
+    def __init__(self, timeout=None, **backoff):
+        self.timeout = timeout
+        self.backoff = backoff
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.watched = {}
+        self.thread = None
+
+    def watch(self, job, callback=None, expected=None, follow_log=False) -> Future:
+        """
+        Start watching `job`
+        :param job: dict with `jobid` and `urltransform`
+        :param callback: called with the future when the job is finished
+        :param expected: expected run time of the job in seconds, None when unknown
+        :param follow_log: log the progress in the job log while the job runs
+        :return: Future
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+
+        with self.lock:
+            self.watched[job['jobid']] = {
+                'job': job,
+                'future': future,
+                'stage': report.current_stage(),
+                'watched': time.monotonic(),
+                'running': None,
+                'backoff': Backoff(timeout=self.timeout, expected=expected, **self.backoff),
+                'next_poll': 0,
+                'due': 0,
+                'log': JobLogFollower(job) if follow_log else None,
+            }
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='fme-job-monitor', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return future
+
+    def _run(self):
+        while True:
+            with self.lock:
+                if not self.watched:
+                    self.thread = None
+                    return
+                now = time.monotonic()
+                due = [entry for entry in self.watched.values() if entry['due'] <= now]
+            try:
+                self._poll(due)
+            except Exception as e:
+                # the jobs of this round are given up on, the thread must go on for the others
+                log.exception("Checking the status of %d jobs failed", len(due))
+                for entry in due:
+                    self._fail(entry, e)
+
+            with self.lock:
+                next_poll = min((entry['next_poll'] for entry in self.watched.values()), default=None)
+            if next_poll is not None:
+                self.wakeup.wait(max(0, next_poll - time.monotonic()))
+            self.wakeup.clear()
+
+    def _poll(self, entries):
+        active = self._active_job_statuses() if len(entries) >= BULK_STATUS_MINIMUM else {}
+        for entry in entries:
+            try:
+                self._poll_job(entry, active.get(entry['job']['jobid']))
+            except Exception as e:
+                log.exception("Checking the status of job %s failed", entry['job']['jobid'])
+                self._fail(entry, e)
+
+    def _poll_job(self, entry, status):
+        if status in fme_utils.JOB_RUNNING_STATES:
+            self._update(entry, {'status': status})
+            return
+
+        # finished or not listed yet, the details of finished jobs are needed anyway
+        try:
+            job_detail = fme_utils.get_job(entry['job'])
+        except requests.exceptions.RequestException as e:
+            log.warning("Could not get status of job %s: %s", entry['job']['jobid'], e)
+            self._schedule(entry)
+            return
+        self._update(entry, job_detail)
+
+    def _fail(self, entry, error):
+        with self.lock:
+            self.watched.pop(entry['job']['jobid'], None)
+        if not entry['future'].done():
+            entry['future'].set_exception(error)
+
+    def _active_job_statuses(self) -> dict:
+        try:
+            return fme_utils.get_active_job_statuses()
+        except requests.exceptions.RequestException as e:
+            log.warning("Could not list the active jobs, fetching the status per job: %s", e)
+            return {}
+
+    def _schedule(self, entry):
+        try:
+            delay = entry['backoff'].next_delay()
+        except PollTimeout as e:
+            log.error("Waiting for job %s: %s", entry['job']['jobid'], e)
+            with self.lock:
+                del self.watched[entry['job']['jobid']]
+            entry['future'].set_exception(JobError(entry['job'], TIMED_OUT))
+            return
+        entry['next_poll'] = time.monotonic() + delay
+        # checked along with other jobs when it is almost time, so that their status is checked in one go
+        entry['due'] = entry['next_poll'] - delay * EARLY_POLL_FRACTION
+
+    def _update(self, entry, job_detail):
+        status = job_detail['status']
+        if status in fme_utils.JOB_RUNNING_STATES:
+            if status == 'PULLED' and entry['running'] is None:
+                entry['running'] = time.monotonic()
+            if entry['log'] and status == 'PULLED':
+                self._follow_log(entry)
+            self._schedule(entry)
+            return
+
+        with self.lock:
+            del self.watched[entry['job']['jobid']]
+        self._finish(entry, job_detail)
+
+    def _finish(self, entry, job_detail):
+        job, status = entry['job'], job_detail['status']
+        queue_time, run_time = fme_utils.job_timings(job_detail)
+        if queue_time is None and entry['running'] is not None:
+            # fall back on what we observed ourselves
+            queue_time = entry['running'] - entry['watched']
+            run_time = time.monotonic() - entry['running']
+
+        with report.stage(entry['stage']):
+            report.add_job(job, status, queue_time=queue_time, run_time=run_time,
+                           features_output=(job_detail.get('result') or {}).get('numFeaturesOutput'))
+
+        if entry['log'] or status != 'SUCCESS':
+            # the rest of the followed log, or the log of the failed job
+            entry['log'] = entry['log'] or JobLogFollower(job)
+            self._follow_log(entry, final=True)
+
+        log.info("Job %s finished with status %s (queued %s s, ran %s s)",
+                 job['jobid'], status, queue_time, run_time)
+        if status == 'SUCCESS':
+            entry['future'].set_result(
+                {'jobid': job['jobid'], 'status': status, 'queue_time': queue_time, 'run_time': run_time})
+        else:
+            entry['future'].set_exception(JobError(job, status, '\n'.join(entry['log'].tail)))
+
+    def _follow_log(self, entry, final=False):
+        jobid = entry['job']['jobid']
+        try:
+            with report.stage(entry['stage']):
+                for event in entry['log'].events(final):
+                    if event.kind == 'message':
+                        log.debug("Log for job %s %s", jobid, event.message)
+                    else:
+                        log.info("Job %s: %s", jobid, event.message)
+        except requests.exceptions.RequestException as e:
+            log.warning("Could not fetch log of job %s: %s", jobid, e)
+
+
+def wait_for_jobs(futures) -> list:
+    """
+    Wait until all jobs are finished
+    :param futures: futures returned by `JobMonitor.watch`
+    :return: list with the result of every job
+    :raises JobsFailed: when one or more jobs did not succeed
+    """
+    results, errors = [], []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except JobError as e:
+            errors.append(e)
+    if errors:
+        raise JobsFailed(errors)
+    return results
@@ -0,0 +1,229 @@
+import itertools
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import fme.fme_utils as fme_utils
+from fme.job_monitor import JobError, JobsFailed
+from fme.run_report import report
+
+log = logging.getLogger(__name__)
+
+# A FME job to submit: `task` names the job, `submit` submits it and returns
+# the job dict. `split` returns tasks covering the same work in smaller parts,
+# or is None when the job cannot be split. With `follow_log` the progress in
+# the job log is logged while the job runs.
+JobTask = namedtuple('JobTask', ['task', 'submit', 'priority', 'workspace', 'split', 'follow_log'])
+JobTask.__new__.__defaults__ = (0, None, None, False)
+
+
+class RetryPolicy(object):
+    """
+    Decides which failed jobs are submitted again.
+
+    A job that failed with one of `fme_utils.JOB_RETRYABLE_STATES`, or could not
+    be submitted at all, is submitted again up to `retries` times. When `split`
+    is set and the job failed for lack of resources (see
+    `fme_utils.is_resource_failure`), its task is split in parts instead, at
+    most `max_splits` times over.
+
+    :param retries: times a failed task is submitted again
+    :param split: split tasks that failed for lack of resources
+    :param max_splits: times a task and its parts may be split
+    """
+
+    def __init__(self, retries=2, split=False, max_splits=2):
+        self.retries = retries
+        self.split = split
+        self.max_splits = max_splits
+
+    def retry(self, task, attempt, splits, error) -> list:
+        """
+        The tasks to submit after `task` failed
+        :param task: the JobTask that failed
+        :param attempt: number of earlier attempts of the task
+        :param splits: number of times the task was split from the original task
+        :param error: JobError, or the exception raised when the job was submitted
+        :return: list of tuples (JobTask, attempt, splits), empty when the failure is permanent
+        """
+        if attempt >= self.retries:
+            return []
+        if not isinstance(error, JobError):
+            log.warning("Submitting %s failed (%s), submitting it again (attempt %d of %d)",
+                        task.task, error, attempt + 1, self.retries)
+            return [(task, attempt + 1, splits)]
+        if error.status not in fme_utils.JOB_RETRYABLE_STATES:
+            return []
+        if self.split and task.split and splits < self.max_splits and fme_utils.is_resource_failure(error.job_log):
+            parts = task.split()
+            log.warning("Job %s of %s failed for lack of resources, splitting it in %d parts",
+                        error.job['jobid'], task.task, len(parts))
+            return [(part, 0, splits + 1) for part in parts]
+        log.warning("Job %s of %s failed with status %s, submitting it again (attempt %d of %d)",
+                    error.job['jobid'], task.task, error.status, attempt + 1, self.retries)
+        return [(task, attempt + 1, splits)]
+
+
+class JobQueue(object):
+    """
+    Submits FME jobs so that at most `max_in_flight` of them are submitted and
+    not finished at the same time, normally the number of FME engines. This
+    keeps the engines busy without flooding the FME queue, and leaves the
+    order in which the jobs start to us.
+
+    Waiting jobs are submitted highest `priority` first, in the order they were
+    queued for equal priorities. A workspace in `workspace_limits` never has
+    more jobs in flight than its limit.
+
+    A job without an expected run time is expected to take as long as the
+    shortest job of its workspace that succeeded before, so that the monitor
+    does not poll it before then, see `fme.polling.Backoff`.
+
+    The jobs that wait for a finished job are submitted by `executor`, not in
+    the thread of the monitor, which would not poll while they are submitted.
+
+    :param monitor: JobMonitor watching the submitted jobs
+    :param max_in_flight: most jobs submitted and not finished
+    :param workspace_limits: dict with the most jobs in flight per workspace name
+    :param executor: executor submitting the waiting jobs, a thread of its own when None
+    """
+
+    def __init__(self, monitor, max_in_flight=2, workspace_limits=None, executor=None):
+        self.monitor = monitor
+        self.max_in_flight = max_in_flight
+        self.workspace_limits = workspace_limits or {}
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='fme-job-queue')
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.counter = itertools.count()
+        self.in_flight = 0
+        self.in_flight_per_workspace = {}
+        # shortest run time in seconds of the successful jobs per workspace
+        self.run_times = {}
+
+    def submit(self, submit, priority=0, workspace=None, expected=None, follow_log=False) -> Future:
+        """
+        Queue a job
+        :param submit: callable that submits the job and returns a dict with `jobid` and `urltransform`
+        :param priority: jobs with a higher priority are submitted first
+        :param workspace: the workspace name, for `workspace_limits`
+        :param expected: expected run time of the job in seconds, None for that of its workspace
+        :param follow_log: log the progress in the job log while the job runs
+        :return: Future, see `JobMonitor.watch`
+        """
+        future = Future()
+        with self.lock:
+            self.waiting.append((-priority, next(self.counter), {
+                'submit': submit,
+                'workspace': workspace,
+                'expected': expected,
+                'follow_log': follow_log,
+                'future': future,
+                'stage': report.current_stage(),
+            }))
+        self._dispatch()
+        return future
+
+    def _next(self):
+        # highest priority waiting job of which the workspace is below its limit
+        for entry in sorted(self.waiting):
+            item = entry[2]
+            limit = self.workspace_limits.get(item['workspace'])
+            if limit is None or self.in_flight_per_workspace.get(item['workspace'], 0) < limit:
+                self.waiting.remove(entry)
+                return item
+        return None
+
+    def _dispatch(self):
+        while True:
+            with self.lock:
+                if self.in_flight >= self.max_in_flight:
+                    return
+                item = self._next()
+                if item is None:
+                    return
+                self._count(item['workspace'], 1)
+            try:
+                self._start(item)
+            except Exception as e:
+                # the job is not in flight, go on with the next one here instead of through `_finished`
+                log.error("Submitting job failed: %s", e)
+                with self.lock:
+                    self._count(item['workspace'], -1)
+                item['future'].set_exception(e)
+
+    def _count(self, workspace, delta):
+        self.in_flight += delta
+        self.in_flight_per_workspace[workspace] = self.in_flight_per_workspace.get(workspace, 0) + delta
+
+    def _start(self, item):
+        with report.stage(item['stage']):
+            job = item['submit']()
+
+        def done(monitored):
+            exception = monitored.exception()
+            if exception is not None:
+                item['future'].set_exception(exception)
+            else:
+                self._record_run_time(item['workspace'], monitored.result().get('run_time'))
+                item['future'].set_result(monitored.result())
+            self.executor.submit(self._finished, item)
+
+        expected = item['expected'] if item['expected'] is not None else self.run_times.get(item['workspace'])
+        self.monitor.watch(job, callback=done, expected=expected, follow_log=item['follow_log'])
+
+    def _record_run_time(self, workspace, run_time):
+        if workspace is None or run_time is None:
+            return
+        with self.lock:
+            self.run_times[workspace] = min(run_time, self.run_times.get(workspace, run_time))
+
+    def _finished(self, item):
+        with self.lock:
+            self._count(item['workspace'], -1)
+        self._dispatch()
+
+
+def run_tasks(queue, tasks, policy=None, submitter=None) -> list:
+    """
+    Submit `tasks` through `queue` and wait for all their jobs, submitting
+    failed jobs again according to `policy`
+    :param queue: JobQueue
+    :param tasks: list of JobTask
+    :param policy: RetryPolicy, None to never submit again
+    :param submitter: callable returning the submit callable of a task, `task.submit` when None
+    :return: list with the result of every successful job
+    :raises JobsFailed: when jobs still failed or could not be submitted after their retries,
+        once all jobs are finished
+    """
+    policy = policy or RetryPolicy(retries=0)
+    submitter = submitter or (lambda task: task.submit)
+
+    def submit(task, attempt, splits):
+        future = queue.submit(
+            submitter(task), priority=task.priority, workspace=task.workspace, follow_log=task.follow_log)
+        pending[future] = (task, attempt, splits)
+
+    pending = {}
+    for task in tasks:
+        submit(task, 0, 0)
+
+    results, errors = [], []
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            task, attempt, splits = pending.pop(future)
+            try:
+                results.append(future.result())
+            except Exception as e:
+                retries = policy.retry(task, attempt, splits, e)
+                if not retries:
+                    log.error("%s failed permanently: %s", task.task, e)
+                    errors.append(e)
+                for retry in retries:
+                    submit(*retry)
+
+    if errors:
+        raise JobsFailed(errors)
+    return results
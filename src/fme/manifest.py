@@ -0,0 +1,77 @@
+"""
+Content hashes of the files uploaded to a FME directory or repository.
+
+The manifest of a destination is kept on the FME server next to the uploads
+(see `fme_utils.upload`), so a run only uploads the files that are new or
+changed since the previous run and deletes the files it uploaded before that
+are gone locally.
+"""
+import hashlib
+import json
+import logging
+from fnmatch import fnmatch
+
+log = logging.getLogger(__name__)
+
+
+def file_hash(path, chunk_size=1024 * 1024) -> str:
+    """
+    SHA-256 of the contents of a file, read in chunks
+    :param path: the local file path
+    :param chunk_size: bytes read at a time
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest(object):
+    """
+    The hashes of the files in a FME destination, by file name
+    :param hashes: dict file name -> hash
+    """
+
+    def __init__(self, hashes=None):
+        self.hashes = dict(hashes or {})
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        Read a manifest written by `to_json`, an empty manifest when `text` is not one
+        :param text: str
+        :return: Manifest
+        """
+        try:
+            return cls(json.loads(text)['files'])
+        except (ValueError, KeyError, TypeError):
+            log.warning("Ignoring invalid manifest")
+            return cls()
+
+    def to_json(self) -> str:
+        return json.dumps({'files': self.hashes}, indent=2, sort_keys=True)
+
+    def changes(self, local, pattern, existing) -> tuple:
+        """
+        The files to upload and to delete to bring the destination in line with `local`
+        :param local: dict file name -> hash of the local files selected with `pattern`
+        :param pattern: wildcard expression the local files were selected with
+        :param existing: names of the files on the server
+        :return: tuple (sorted names to upload, sorted names to delete)
+        """
+        upload = sorted(
+            name for name, digest in local.items() if name not in existing or self.hashes.get(name) != digest)
+        stale = sorted(
+            name for name in self.hashes if fnmatch(name, pattern) and name not in local and name in existing)
+        return upload, stale
+
+    def update(self, local, pattern):
+        """
+        Record that the files selected with `pattern` are now `local`
+        :param local: dict file name -> hash of the local files selected with `pattern`
+        :param pattern: wildcard expression the local files were selected with
+        """
+        self.hashes = {name: digest for name, digest in self.hashes.items() if not fnmatch(name, pattern)}
+        self.hashes.update(local)
@@ -0,0 +1,140 @@
+"""
+Extraction of the members of a zip file in parallel processes, selected by feature type.
+
+The GML members of a PDOK extract are compressed separately, so they are
+decompressed independently, each in a process of its own, the largest first.
+Only the members of the feature types in an allowlist are extracted, such as
+those the import loads, or those of `comparison.GML_DISPATCH`::
+
+    extract('extract_bgt.zip', '/tmp/data', import_feature_types())
+    extract('extract_bgt.zip', work, {feature_type(name) for name in GML_DISPATCH})
+
+The time each member took is logged and added to the run report.
+"""
+import csv
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import namedtuple
+from zipfile import ZipFile
+
+import bgt_setup
+from fme.run_report import report
+
+log = logging.getLogger(__name__)
+
+MAPPING_FILE = os.path.join(bgt_setup.SCRIPT_ROOT, 'source_data', '075_mapping.csv')
+TABLES_FILE = os.path.join(bgt_setup.SCRIPT_ROOT, 'fme_source_sql', '060_aanmaak_tabellen_BGT.sql')
+
+MemberTiming = namedtuple('MemberTiming', ['name', 'path', 'size', 'seconds'])
+
+
+def feature_type(name) -> str:
+    """
+    The feature type of a member of a PDOK extract
+    :param name: member or file name such as `bgt_pand.gml`
+    :return: feature type such as `pand`
+    """
+    base = os.path.splitext(os.path.basename(name))[0]
+    return base[len('bgt_'):] if base.startswith('bgt_') else base
+
+
+def mapping_feature_types(path=MAPPING_FILE) -> set:
+    """
+    The feature types of the GML files in a mapping file with a `gmlbestand` column
+    :param path: the mapping file, `;` separated
+    :return: set of feature types
+    """
+    with open(path, encoding='utf-8') as f:
+        return {feature_type(row['gmlbestand']) for row in csv.DictReader(f, delimiter=';')}
+
+
+def table_feature_types(path=TABLES_FILE) -> set:
+    """
+    The feature types of the `imgeo.bgt_*` and `imgeo.imgeo_*` tables created by a SQL script
+    :param path: the SQL script
+    :return: set of feature types
+    """
+    with open(path, encoding='utf-8') as f:
+        return set(re.findall(r'CREATE TABLE imgeo\.(?:bgt|imgeo)_(\w+)', f.read(), re.IGNORECASE))
+
+
+def import_feature_types() -> set:
+    """
+    The feature types the import loads: those of the imgeo tables and of the GML files in the mapping
+    :return: set of feature types
+    """
+    return table_feature_types() | mapping_feature_types()
+
+
+def selected(name, feature_types) -> bool:
+    """
+    Whether member `name` is of a feature type in the allowlist
+    :param name:
+    :param feature_types: allowlist of feature types, None for all
+    :return: bool
+    """
+    return feature_types is None or feature_type(name) in feature_types
+
+
+def _extract_member(path, name, directory) -> MemberTiming:
+    # runs in a worker process
+    started = time.monotonic()
+    with ZipFile(path) as zf:
+        info = zf.getinfo(name)
+        target = zf.extract(info, directory)
+    return MemberTiming(name, target, info.file_size, time.monotonic() - started)
+
+
+def _extract_member_args(args) -> MemberTiming:
+    return _extract_member(*args)
+
+
+def extract(path, directory, feature_types=None, processes=None) -> list:
+    """
+    Extract the members of zip file `path` of the feature types in the allowlist into `directory`,
+    see the module documentation
+    :param path: the zip file
+    :param directory: the directory to extract to
+    :param feature_types: allowlist of feature types, None for all
+    :param processes: number of worker processes, the number of CPUs when None
+    :return: list of `MemberTiming`, in the order the members were done
+    :raises BadZipFile: when a member is damaged
+    """
+    started = time.monotonic()
+    with ZipFile(path) as zf:
+        members = [info for info in zf.infolist() if not info.is_dir()]
+    skipped = [info.filename for info in members if not selected(info.filename, feature_types)]
+    if skipped:
+        log.info("Not extracting %s", ', '.join(skipped))
+    members = sorted((info for info in members if selected(info.filename, feature_types)),
+                     key=lambda info: info.compress_size, reverse=True)
+    # made here, the workers would race to make the same directories
+    for folder in {os.path.join(directory, os.path.dirname(info.filename)) for info in members}:
+        os.makedirs(folder, exist_ok=True)
+
+    tasks = [(path, info.filename, directory) for info in members]
+    processes = min(processes or os.cpu_count() or 1, len(tasks))
+    timings = []
+    if processes <= 1:
+        results = map(_extract_member_args, tasks)
+        pool = None
+    else:
+        # spawned, forking a process with running threads may copy locks that are held
+        pool = multiprocessing.get_context('spawn').Pool(processes)
+        results = pool.imap_unordered(_extract_member_args, tasks)
+    try:
+        for timing in results:
+            log.info("Extracted %s, %.1f MB in %.1f s", timing.name, timing.size / 1e6, timing.seconds)
+            report.add_extraction(timing.name, timing.size, timing.seconds)
+            timings.append(timing)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    log.info("Extracted %d members of %s in %.1f s with %d processes",
+             len(timings), path, time.monotonic() - started, max(processes, 1))
+    return timings
@@ -0,0 +1,177 @@
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+log = logging.getLogger(__name__)
+
+
+class PipelineError(Exception):
+    pass
+
+
+class Stage(object):
+    def __init__(self, name, func, depends_on=(), inputs=None):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.inputs = inputs
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        """
+        Wall time of the stage in seconds, 0 when it did not run
+        :return: float
+        """
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class Pipeline(object):
+    """
+    Runs stages as soon as the stages they depend on are done, with at most
+    `max_workers` stages running at the same time.
+
+    Stages must be added after the stages they depend on, which keeps the
+    graph free of cycles.
+
+    With a `Checkpoint` the progress is recorded per stage and stages that
+    were completed in an earlier run are skipped. With a `RunReport` the
+    stage timings are reported and counters are attributed to the stages.
+    """
+
+    def __init__(self, max_workers=1, checkpoint=None, report=None):
+        self.max_workers = max(1, max_workers)
+        self.checkpoint = checkpoint
+        self.report = report
+        self.stages = OrderedDict()
+
+    def add(self, name, func, depends_on=(), inputs=None):
+        """
+        Add a stage to the pipeline
+        :param name: unique name of the stage
+        :param func: callable without arguments that performs the stage
+        :param depends_on: names of the stages that must be completed first
+        :param inputs: JSON serializable description of the stage inputs, stored in the checkpoint
+        :return: the added stage
+        """
+        if name in self.stages:
+            raise PipelineError("Stage {} already defined".format(name))
+        for dependency in depends_on:
+            if dependency not in self.stages:
+                raise PipelineError("Stage {} depends on unknown stage {}".format(name, dependency))
+        stage = Stage(name, func, depends_on, inputs)
+        self.stages[name] = stage
+        return stage
+
+    def _call(self, stage):
+        if self.report:
+            with self.report.stage(stage.name):
+                return stage.func()
+        return stage.func()
+
+    def _run_stage(self, stage):
+        log.info("Stage %s started", stage.name)
+        if self.checkpoint:
+            self.checkpoint.start(stage.name, {'depends_on': list(stage.depends_on), 'inputs': stage.inputs})
+        stage.started = time.monotonic()
+        try:
+            stage.result = self._call(stage)
+        except Exception:
+            stage.finished = time.monotonic()
+            if self.report:
+                self.report.stage_finished(stage.name, stage.duration, failed=True)
+            raise
+        stage.finished = time.monotonic()
+        if self.report:
+            self.report.stage_finished(stage.name, stage.duration)
+        if self.checkpoint:
+            self.checkpoint.complete(stage.name, stage.result)
+        log.info("Stage %s done in %.1f s", stage.name, stage.duration)
+        return stage.result
+
+    def run(self) -> dict:
+        """
+        Run all stages, independent stages concurrently.
+        When a stage fails no new stages are started; the running stages are
+        allowed to finish before a `PipelineError` is raised.
+        :return: dict with the result per stage name
+        """
+        done = set()
+        failed = []
+        pending = OrderedDict(self.stages)
+        running = {}
+
+        if self.checkpoint:
+            for name in list(pending):
+                if self.checkpoint.is_complete(name):
+                    log.info("Stage %s completed in an earlier run, skipped", name)
+                    del pending[name]
+                    done.add(name)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if not failed:
+                    for name, stage in list(pending.items()):
+                        if len(running) >= self.max_workers:
+                            break
+                        if all(d in done for d in stage.depends_on):
+                            del pending[name]
+                            running[executor.submit(self._run_stage, stage)] = stage
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    if future.exception() is not None:
+                        stage.error = future.exception()
+                        log.error("Stage %s failed: %s", stage.name, stage.error)
+                        failed.append(stage)
+                    else:
+                        done.add(stage.name)
+
+        self.log_report()
+
+        if failed:
+            raise PipelineError("Stage(s) failed: {}".format(
+                ', '.join(stage.name for stage in failed))) from failed[0].error
+        return {name: stage.result for name, stage in self.stages.items()}
+
+    def critical_path(self):
+        """
+        The chain of dependent stages with the longest total wall time
+        :return: tuple (list of stage names, seconds)
+        """
+        costs = {}
+        previous = {}
+        for name, stage in self.stages.items():
+            slowest = max(stage.depends_on, key=lambda d: costs[d], default=None)
+            previous[name] = slowest
+            costs[name] = stage.duration + (costs[slowest] if slowest else 0.0)
+
+        if not costs:
+            return [], 0.0
+
+        name = max(costs, key=lambda n: costs[n])
+        total = costs[name]
+        path = []
+        while name:
+            path.insert(0, name)
+            name = previous[name]
+        return path, total
+
+    def log_report(self):
+        for name, stage in self.stages.items():
+            if stage.started is not None:
+                log.info("Stage %-40s %8.1f s%s", name, stage.duration, ' FAILED' if stage.error else '')
+        path, total = self.critical_path()
+        log.info("Critical path (%.1f s): %s", total, ' -> '.join(path))
+        if self.report:
+            self.report.set_critical_path(path)
@@ -0,0 +1,78 @@
+import logging
+import random
+import time
+
+log = logging.getLogger(__name__)
+
+
+class PollTimeout(Exception):
+    pass
+
+
+class Backoff(object):
+    """
+    Delays between two polls of something that is expected to change.
+
+    The delays start at `initial` seconds and grow by `factor` up to `maximum`,
+    each with a random `jitter` fraction added or subtracted. When an `expected`
+    duration is given, the first delay skips to just before the expected end
+    and polling speeds up again from there. No delay ends after the deadline of
+    `timeout` seconds; asking for a delay after the deadline raises `PollTimeout`.
+
+    :param initial: first delay in seconds
+    :param maximum: longest delay in seconds
+    :param factor: growth of the delay after each poll
+    :param jitter: fraction of the delay to randomly add or subtract
+    :param timeout: seconds after which to give up, None to wait forever
+    :param expected: expected duration in seconds, None when unknown
+    """
+
+    def __init__(self, initial=1.0, maximum=60.0, factor=2.0, jitter=0.1, timeout=None, expected=None):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.expected = expected
+        self.delay = initial
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout is not None else None
+
+    def next_delay(self) -> float:
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            raise PollTimeout("Gave up after {:.0f} s".format(now - self.started))
+
+        remaining = self.started + self.expected - now if self.expected else 0
+        if remaining > self.initial:
+            delay = remaining * 0.9
+        else:
+            delay = self.delay
+            self.delay = min(self.delay * self.factor, self.maximum)
+
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        if self.deadline is not None:
+            delay = min(delay, self.deadline - now)
+        return delay
+
+
+def poll(func, until, description='condition', **backoff):
+    """
+    Call `func` until `until` holds for its result, backing off between the calls
+    :param func: callable without arguments
+    :param until: callable that gets the result of `func` and returns True when done
+    :param description: what is waited for, used in the log and the timeout message
+    :param backoff: arguments of `Backoff`
+    :return: the last result of `func`
+    :raises PollTimeout: when `until` did not hold before the timeout
+    """
+    delays = Backoff(**backoff)
+    while True:
+        result = func()
+        if until(result):
+            return result
+        try:
+            delay = delays.next_delay()
+        except PollTimeout as e:
+            raise PollTimeout("Waiting for {}: {}".format(description, e)) from None
+        log.debug("Waiting %.1f s for %s", delay, description)
+        time.sleep(delay)
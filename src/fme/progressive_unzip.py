@@ -0,0 +1,143 @@
+"""
+Extraction of the members of a zip file while it is being downloaded.
+
+`fme.ranged_download` reports the ranges of the partial file that are
+complete. Once the central directory at the end of the file is in, the
+extractor knows where each member is, and extracts a member as soon as all of
+its bytes are in. Extraction runs in a thread of its own, so it overlaps with
+the download of the rest of the file, and every member is read completely, so
+its CRC is checked as by `ZipFile.testzip`.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import BadZipFile, ZipFile
+
+from fme.run_report import report
+
+log = logging.getLogger(__name__)
+
+# Size of the end of central directory record, without comment
+END_RECORD_SIZE = 22
+
+
+class ProgressiveExtractor(object):
+    """
+    Extracts the zip file `path` into `directory` while it is downloaded, see the module documentation
+    :param path: the partial zip file, of its full size
+    :param directory: the directory to extract to
+    :param extracted: callable called with the path of each extracted file, in the extraction thread
+    :param select: callable telling by member name whether to extract it, all members are extracted when None
+    """
+
+    def __init__(self, path, directory, extracted=None, select=None):
+        self.path = path
+        self.directory = directory
+        self.extracted = extracted
+        self.select = select
+        self.lock = threading.Lock()
+        self.ranges = []
+        self.file = None
+        self.zf = None
+        self.pending = None
+        self.paths = []
+        self.futures = []
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def available(self, start, end):
+        """
+        Record that bytes `start` to `end` (inclusive) of the file are complete
+        and extract the members that are complete now, in the background
+        :param start:
+        :param end:
+        """
+        with self.lock:
+            if self.file is None:
+                # opened now, the download renames the partial file once it is complete;
+                # unbuffered, a buffer would keep bytes read before they were downloaded
+                self.file = open(self.path, 'rb', buffering=0)
+            self.ranges = _merge(self.ranges + [(start, end + 1)])
+            self.futures.append(self.executor.submit(report.bind(self._extract_ready)))
+
+    def close(self):
+        """
+        Stop extracting, after the extraction in progress
+        """
+        self.executor.shutdown(wait=True)
+        if self.zf is not None:
+            self.zf.close()
+        if self.file is not None:
+            self.file.close()
+
+    def finish(self) -> list:
+        """
+        Wait for the extraction of the members
+        :return: paths of the extracted members
+        :raises BadZipFile: when a member is damaged or not all members are complete
+        """
+        self.close()
+        for future in self.futures:
+            future.result()
+        if self.pending is None or self.pending:
+            raise BadZipFile("{} is not complete".format(self.path))
+        log.info("Extracted %d members of %s", len(self.paths), self.path)
+        return self.paths
+
+    def _covered(self, start, end) -> bool:
+        # whether bytes `start` up to `end` (exclusive) are complete
+        with self.lock:
+            return any(first <= start and end <= last for first, last in self.ranges)
+
+    def _open(self):
+        size = os.fstat(self.file.fileno()).st_size
+        if not self._covered(max(0, size - END_RECORD_SIZE), size):
+            return
+        try:
+            zf = ZipFile(self.file)
+        except (BadZipFile, OSError):
+            # the central directory or a comment is not complete yet, its signatures do not match
+            return
+        # the central directory and the records after it are complete
+        if not self._covered(zf.start_dir, size):
+            zf.close()
+            return
+        members = sorted(zf.infolist(), key=lambda info: info.header_offset)
+        ends = [info.header_offset for info in members[1:]] + [zf.start_dir]
+        self.zf = zf
+        self.pending = [(info, end) for info, end in zip(members, ends)
+                        if self.select is None or info.is_dir() or self.select(info.filename)]
+        log.info("Central directory of %s complete, extracting %d of %d members",
+                 self.path, len(self.pending), len(members))
+
+    def _extract_ready(self):
+        if self.zf is None:
+            self._open()
+            if self.zf is None:
+                return
+        while self.pending:
+            ready = [member for member in self.pending if self._covered(member[0].header_offset, member[1])]
+            if not ready:
+                return
+            info = ready[0][0]
+            started = time.monotonic()
+            path = self.zf.extract(info, self.directory)
+            self.pending.remove(ready[0])
+            self.paths.append(path)
+            if not info.is_dir():
+                report.add_extraction(info.filename, info.file_size, time.monotonic() - started)
+            log.debug("Extracted %s", info.filename)
+            if self.extracted is not None and not info.is_dir():
+                self.extracted(path)
+
+
+def _merge(ranges) -> list:
+    # sorted [start, end) ranges with the overlapping and adjacent ones merged
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,227 @@
+"""
+Download of a large file over several connections with HTTP Range requests.
+
+The file is split in parts of `part_size` bytes that are downloaded in
+parallel into `<target>.part`. The parts that are complete are recorded in
+`<target>.part.json`, so a download of the same url, size and ETag that
+failed or was interrupted resumes with the missing parts only. A server that does not support ranges gets a
+single streaming request.
+
+The ranges of the file that are complete are reported to `on_part` as they
+come in, so a consumer can start on them while the rest is still downloading,
+see `fme.progressive_unzip`.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fme.http_session import is_transient, session
+from fme.polling import Backoff
+from fme.run_report import report
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+def _probe(url) -> tuple:
+    # (total size, etag) when the server supports ranges, (None, None) otherwise
+    with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            return None, None
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        return (int(total) if total.isdigit() else None), response.headers.get('ETag')
+
+
+def sha256_of(path) -> str:
+    """
+    SHA-256 of a file, read in chunks
+    :param path:
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RangedDownload(object):
+    """
+    Downloads `url` to `target`, see the module documentation
+    :param url:
+    :param target: local file path
+    :param connections: parts downloaded at the same time
+    :param part_size: bytes per part
+    :param retries: times a part is tried again after a connection error or 5xx response
+    :param source: name of the source in the run report
+    :param on_part: callable called with the first and last byte (inclusive) of each part of the
+        partial file that is complete, in the download threads
+    :param tail_first: download the last part first, where a zip file has its central directory
+    """
+
+    def __init__(self, url, target, connections=4, part_size=32 * 1024 * 1024, retries=5, source='pdok',
+                 on_part=None, tail_first=False):
+        self.url = url
+        self.target = target
+        self.connections = connections
+        self.part_size = part_size
+        self.retries = retries
+        self.source = source
+        self.on_part = on_part
+        self.tail_first = tail_first
+        self.partial = target + '.part'
+        self.state_file = target + '.part.json'
+        self.lock = threading.Lock()
+        self.downloaded = 0
+
+    def run(self, sha256=None) -> int:
+        """
+        Download the file
+        :param sha256: expected SHA-256 hex digest of the file, None to skip the check
+        :return: size of the file
+        :raises DownloadError: when the file has another size or checksum than expected
+        :raises requests.RequestException: when a part still failed after its retries
+        """
+        started = time.monotonic()
+        total, etag = _probe(self.url)
+        if total is None:
+            log.info("%s does not support ranges, downloading it in one request", self.url)
+            self._download_part(None, None)
+            total = os.path.getsize(self.partial)
+            self._part_done(0, total - 1)
+        else:
+            self._download_parts(total, etag)
+
+        size = os.path.getsize(self.partial)
+        if size != total:
+            raise DownloadError("Downloaded {} bytes of {}, expected {}".format(size, self.url, total))
+        if sha256 is not None and sha256_of(self.partial) != sha256:
+            os.remove(self.partial)
+            self._remove_state()
+            raise DownloadError("Checksum of {} does not match".format(self.url))
+        os.replace(self.partial, self.target)
+        self._remove_state()
+
+        elapsed = time.monotonic() - started
+        log.info("Downloaded %.1f MB (%.1f MB this run) in %.1f s (%.1f MB/s)", total / 1e6,
+                 self.downloaded / 1e6, elapsed, self.downloaded / 1e6 / elapsed if elapsed else 0.0)
+        return total
+
+    def _download_parts(self, total, etag):
+        parts = [(start, min(start + self.part_size, total) - 1) for start in range(0, total, self.part_size)]
+        done = self._load_state(total, etag)
+        if done:
+            log.info("Resuming download, %d of %d parts done before", len(done), len(parts))
+        else:
+            with open(self.partial, 'wb') as f:
+                f.truncate(total)
+        for part in parts:
+            if part[0] in done:
+                self._part_done(*part)
+        state = {'url': self.url, 'total': total, 'etag': etag, 'done': sorted(done)}
+
+        def download(part):
+            self._download_part(*part, truncate=False)
+            with self.lock:
+                state['done'] = sorted(state['done'] + [part[0]])
+                with open(self.state_file, 'w') as f:
+                    json.dump(state, f)
+                if len(state['done']) * 10 // len(parts) > (len(state['done']) - 1) * 10 // len(parts):
+                    log.info("Downloaded %d of %d parts", len(state['done']), len(parts))
+            self._part_done(*part)
+
+        todo = [part for part in parts if part[0] not in done]
+        if self.tail_first:
+            todo = todo[-1:] + todo[:-1]
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            futures = [executor.submit(report.bind(download), part) for part in todo]
+        for future in futures:
+            future.result()
+
+    def _download_part(self, start, end, truncate=True):
+        """
+        Download bytes `start` to `end` (inclusive) into the partial file,
+        resuming after the bytes received when the connection fails. Without
+        `start` the whole file is downloaded without a range.
+        """
+        offset = start or 0
+        delays = Backoff(initial=1.0, maximum=30.0)
+        failures = 0
+        while end is None or offset <= end:
+            headers = {}
+            if start is not None:
+                headers['Range'] = 'bytes={}-{}'.format(offset, end)
+            try:
+                with session.get(self.url, headers=headers, stream=True) as response, \
+                        open(self.partial, 'wb' if truncate else 'r+b') as f:
+                    response.raise_for_status()
+                    if start is not None and response.status_code != 206:
+                        raise DownloadError("{} ignored the range of a part".format(self.url))
+                    f.seek(offset)
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        offset += len(chunk)
+                        self._count(len(chunk))
+                if end is None:
+                    return
+                if offset <= end:
+                    raise requests.exceptions.ChunkedEncodingError("Part ended early")
+            except requests.RequestException as e:
+                failures += 1
+                if failures > self.retries or not is_transient(e):
+                    raise
+                delay = delays.next_delay()
+                log.warning("Download of bytes %s-%s failed (%s), resuming in %.1f s", offset, end, e, delay)
+                time.sleep(delay)
+                if end is None:
+                    # no ranges, start over
+                    offset = 0
+
+    def _part_done(self, start, end):
+        if self.on_part is not None and end >= start:
+            self.on_part(start, end)
+
+    def _count(self, amount):
+        with self.lock:
+            self.downloaded += amount
+        report.add_bytes_downloaded(self.source, amount)
+
+    def _load_state(self, total, etag) -> set:
+        # the parts done before, when the partial file is of the same download
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if state.get('url') != self.url or state.get('total') != total or state.get('etag') != etag \
+                or not os.path.exists(self.partial) or os.path.getsize(self.partial) != total:
+            return set()
+        return set(state.get('done', []))
+
+    def _remove_state(self):
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+
+def download(url, target, sha256=None, **options) -> int:
+    """
+    Download `url` to `target` over several connections, see `RangedDownload`
+    :param url:
+    :param target: local file path
+    :param sha256: expected SHA-256 hex digest of the file, None to skip the check
+    :param options: arguments of `RangedDownload`
+    :return: size of the file
+    """
+    return RangedDownload(url, target, **options).run(sha256)
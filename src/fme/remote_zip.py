@@ -0,0 +1,169 @@
+"""
+Extraction of selected members of a remote zip file, without downloading the rest.
+
+`RangedFile` is a read-only, seekable file over HTTP Range requests. It reads
+ahead in blocks and starts with the tail of the file, where a zip file has its
+central directory, so `RemoteZip` lists the members with a single request and
+then fetches only the bytes of the members asked for. The members are read by
+`zipfile`, so their CRC is checked as by `ZipFile.testzip`::
+
+    with RemoteZip(url) as archive:
+        archive.extract(['bgt_pand.gml', 'bgt_wegdeel.gml'], '/tmp/data')
+"""
+import io
+import logging
+import os
+import re
+import time
+from zipfile import ZipFile
+
+from fme.http_session import session
+from fme.ranged_download import DownloadError
+from fme.run_report import report
+
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = 16 * 1024 * 1024
+# Read at the end of the file when it is opened: the end of central directory record, a
+# comment and the central directory of an extract of all feature types fit in it
+TAIL_SIZE = 1024 * 1024
+
+
+class RangedFile(io.RawIOBase):
+    """
+    Read-only file over HTTP Range requests of `url`, see the module documentation
+    :param url:
+    :param block_size: bytes fetched at least per request
+    :param tail_size: bytes fetched at the end of the file when it is opened
+    :param source: name of the source in the run report
+    :raises DownloadError: when the server does not support ranges
+    """
+
+    def __init__(self, url, block_size=BLOCK_SIZE, tail_size=TAIL_SIZE, source='pdok'):
+        super().__init__()
+        self.url = url
+        self.block_size = block_size
+        self.source = source
+        self.position = 0
+        self.requests = 0
+        self.downloaded = 0
+        self.size = None
+        # the bytes of the last request and where they start
+        self.buffer = b''
+        self.buffer_start = 0
+        # the size comes with the first response
+        self._fetch(None, tail_size)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position {}".format(offset))
+        self.position = offset
+        return self.position
+
+    def readinto(self, b) -> int:
+        wanted = min(len(b), self.size - self.position)
+        if wanted <= 0:
+            return 0
+        offset = self.position - self.buffer_start
+        if offset < 0 or offset + wanted > len(self.buffer):
+            self._fetch(self.position, max(wanted, self.block_size))
+            offset = 0
+        b[:wanted] = self.buffer[offset:offset + wanted]
+        self.position += wanted
+        return wanted
+
+    def _fetch(self, start, length):
+        # bytes `start` up to `start + length` into the buffer, the last `length` bytes when start is None
+        if start is None:
+            header = 'bytes=-{}'.format(length)
+        else:
+            header = 'bytes={}-{}'.format(start, min(start + length, self.size) - 1)
+        response = session.get(self.url, headers={'Range': header})
+        response.raise_for_status()
+        match = re.match(r'bytes (\d+)-(\d+)/(\d+)$', response.headers.get('Content-Range', ''))
+        if response.status_code != 206 or not match:
+            raise DownloadError("{} does not support ranges".format(self.url))
+        first, last, total = (int(value) for value in match.groups())
+        if self.size is not None and total != self.size:
+            raise DownloadError("{} changed while it was read".format(self.url))
+        if len(response.content) != last - first + 1:
+            raise DownloadError("Received {} bytes of {} of {}".format(
+                len(response.content), header, self.url))
+        self.size = total
+        self.buffer = response.content
+        self.buffer_start = first
+        self.requests += 1
+        self.downloaded += len(self.buffer)
+        report.add_bytes_downloaded(self.source, len(self.buffer))
+
+
+class RemoteZip(object):
+    """
+    The zip file at `url`, read with Range requests, see the module documentation
+    :param url:
+    :param options: arguments of `RangedFile`
+    """
+
+    def __init__(self, url, **options):
+        self.file = RangedFile(url, **options)
+        self.zf = ZipFile(self.file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.zf.close()
+        self.file.close()
+
+    def namelist(self) -> list:
+        return self.zf.namelist()
+
+    def extract(self, names, directory) -> list:
+        """
+        Download and extract the members `names` into `directory`
+        :param names: names of the members
+        :param directory: the directory to extract to
+        :return: paths of the extracted files
+        :raises KeyError: when a member is not in the zip file
+        """
+        started = time.monotonic()
+        paths = [self.zf.extract(self.zf.getinfo(name), directory) for name in names]
+        log.info("Extracted %d of %d members of %s, %.1f MB of %.1f MB in %d requests in %.1f s", len(paths),
+                 len(self.zf.infolist()), self.file.url, self.file.downloaded / 1e6, self.file.size / 1e6,
+                 self.file.requests, time.monotonic() - started)
+        return paths
+
+
+def extract_members(url, names, directory, **options) -> list:
+    """
+    Extract the members `names` of the remote zip file `url` into `directory`, see `RemoteZip`.
+    Names that are not in the zip file are skipped.
+    :param url:
+    :param names: names of the members
+    :param directory: the directory to extract to
+    :param options: arguments of `RangedFile`
+    :return: paths of the extracted files
+    """
+    with RemoteZip(url, **options) as archive:
+        present = set(archive.namelist())
+        missing = [name for name in names if name not in present]
+        if missing:
+            log.warning("Not in %s: %s", url, ', '.join(missing))
+        os.makedirs(directory, exist_ok=True)
+        return archive.extract([name for name in names if name in present], directory)
@@ -0,0 +1,177 @@
+import functools
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+NO_STAGE = '-'
+
+
+class RunReport(object):
+    """
+    Collects per stage wall time, FME job timings, bytes transferred, rows
+    inserted and extraction timings during an import run.
+
+    Counters are attributed to the stage that runs in the current thread, see
+    `stage` and `bind`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = datetime.now().isoformat()
+            self.stages = OrderedDict()
+            self.critical_path = []
+
+    def _stage(self, name) -> dict:
+        return self.stages.setdefault(name, {
+            'wall_time': None,
+            'failed': False,
+            'jobs': [],
+            'extractions': [],
+            'bytes_downloaded': {},
+            'bytes_uploaded': {},
+            'rows_inserted': {},
+        })
+
+    def current_stage(self) -> str:
+        return getattr(self.local, 'stage', NO_STAGE)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Attribute everything counted in this thread to stage `name`
+        :param name: the stage name
+        """
+        previous = self.current_stage()
+        self.local.stage = name
+        try:
+            yield
+        finally:
+            self.local.stage = previous
+
+    def bind(self, func):
+        """
+        Wrap `func` so it counts for the current stage when it is run in another thread
+        :param func: callable
+        :return: callable
+        """
+        name = self.current_stage()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def _add(self, counter, key, amount):
+        with self.lock:
+            values = self._stage(self.current_stage())[counter]
+            values[key] = values.get(key, 0) + amount
+
+    def add_bytes_downloaded(self, source, amount):
+        self._add('bytes_downloaded', source, amount)
+
+    def add_bytes_uploaded(self, destination, amount):
+        self._add('bytes_uploaded', destination, amount)
+
+    def add_rows_inserted(self, table, amount):
+        self._add('rows_inserted', table, amount)
+
+    def add_job(self, job, status, queue_time=None, run_time=None, features_output=None):
+        """
+        Record the outcome of a FME job
+        :param job: dict with `jobid` and `urltransform`
+        :param status: final job status
+        :param queue_time: seconds between submission and start on an engine
+        :param run_time: seconds the job ran on an engine
+        :param features_output: number of features written by the job
+        :return:
+        """
+        with self.lock:
+            self._stage(self.current_stage())['jobs'].append({
+                'jobid': job['jobid'],
+                'status': status,
+                'queue_time': queue_time,
+                'run_time': run_time,
+                'features_output': features_output,
+            })
+
+    def add_extraction(self, member, size, seconds):
+        """
+        Record the extraction of a member of a zip file
+        :param member: the member name
+        :param size: bytes extracted
+        :param seconds: time the extraction took
+        :return:
+        """
+        with self.lock:
+            self._stage(self.current_stage())['extractions'].append({
+                'member': member,
+                'size': size,
+                'seconds': seconds,
+            })
+
+    def stage_finished(self, name, wall_time, failed=False):
+        with self.lock:
+            stage = self._stage(name)
+            stage['wall_time'] = wall_time
+            stage['failed'] = failed
+
+    def set_critical_path(self, path):
+        with self.lock:
+            self.critical_path = list(path)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            totals = {'bytes_downloaded': {}, 'bytes_uploaded': {}, 'rows_inserted': {}}
+            for stage in self.stages.values():
+                for counter, values in totals.items():
+                    for key, amount in stage[counter].items():
+                        values[key] = values.get(key, 0) + amount
+            return {
+                'started': self.started,
+                'finished': datetime.now().isoformat(),
+                'critical_path': self.critical_path,
+                'totals': totals,
+                'stages': json.loads(json.dumps(self.stages)),
+            }
+
+    def write(self, path):
+        """
+        Write the report as JSON to `path`
+        :param path: the file name
+        :return:
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        log.info("Run report written to %s", path)
+
+
+def size_of(content) -> int:
+    """
+    Size in bytes of `content`, which is either bytes/str or a file object
+    :param content:
+    :return: int
+    """
+    if hasattr(content, 'read'):
+        try:
+            return os.fstat(content.fileno()).st_size
+        except (AttributeError, OSError):
+            return content.tell()
+    return len(content)
+
+
+report = RunReport()
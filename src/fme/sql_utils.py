@@ -7,6 +7,8 @@ import subprocess
 import psycopg2
 import psycopg2.extensions
 
+from fme.run_report import report
+
 log = logging.getLogger(__name__)
 
 
@@ -87,6 +89,7 @@ class SQLRunner(object):
             return False
         finally:
             log.info("Import CSV succeeded, {} rows imported to {}".format(rows, table_name))
+            report.add_rows_inserted(table_name, rows)
             return True
 
     def get_ogr2_ogr_login(self, schema):
@@ -0,0 +1,12 @@
+import pytest
+
+import bgt_setup
+from fme.emulator import FMEEmulator
+
+
+@pytest.fixture
+def fme(monkeypatch):
+    """A running emulated FME server that `bgt_setup.FME_BASE_URL` points to"""
+    with FMEEmulator(job_duration=0.1, start_delay=0.0, instance_state='RUNNING', seed=1) as emulator:
+        monkeypatch.setattr(bgt_setup, 'FME_BASE_URL', emulator.url)
+        yield emulator
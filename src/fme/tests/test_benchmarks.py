@@ -0,0 +1,54 @@
+import pytest
+
+from fme.benchmarks import BENCHMARKS, benchmark, calibrate, compare, load_baselines, run_all, run_benchmark, \
+    save_baselines, without_baseline
+
+
+def test_run_benchmark_cleans_up():
+    calls = []
+
+    def bench(size):
+        calls.append('setup {}'.format(size))
+        try:
+            yield lambda: calls.append('run')
+        finally:
+            calls.append('cleanup')
+
+    assert run_benchmark(bench, 10, repeat=2) >= 0
+    assert ['setup 10', 'run', 'run', 'cleanup'] == calls
+
+
+def test_compare():
+    results = {'fme_upload': {'1': 1.3, '10': 2.0, '50': 0.01}, 'new': {'1': 1.0}}
+    baselines = {'fme_upload': {'1': 2.0, '10': 4.0, '50': 0.001}}
+    # relative to a reference of 0.5 s, timings under the minimum are not compared
+    assert [('fme_upload', '1', 1.3, 1.0)] == compare(results, baselines, 0.5, tolerance=0.25, minimum=0.05)
+
+
+def test_without_baseline():
+    results = {'fme_upload': {'1': 1.3, '10': 2.0}, 'new': {'1': 1.0}}
+    baselines = {'fme_upload': {'1': 2.0}}
+    assert [('fme_upload', '10'), ('new', '1')] == without_baseline(results, baselines)
+
+
+def test_benchmark_against_its_baseline(tmpdir, monkeypatch):
+    monkeypatch.setattr('fme.benchmarks.BENCHMARKS', BENCHMARKS.copy())
+
+    @benchmark(1, 2)
+    def tiny(size):
+        yield lambda: sum(range(size * 10000))
+
+    reference_seconds = calibrate(repeat=1, size=1)
+    results = run_all(['tiny'], repeat=1)
+    assert ['1', '2'] == list(results['tiny'])
+
+    path = str(tmpdir.join('baselines.json'))
+    save_baselines(results, reference_seconds, path)
+    baselines = load_baselines(path)
+    assert results['tiny']['2'] / reference_seconds == pytest.approx(baselines['tiny']['2'])
+    assert [] == without_baseline(results, baselines)
+
+    # on a host twice as slow the benchmark is twice as slow as well, which is no regression
+    slower = {'tiny': {size: 2 * seconds for size, seconds in results['tiny'].items()}}
+    assert [] == compare(slower, baselines, 2 * reference_seconds, minimum=0)
+    assert 2 == len(compare(slower, baselines, reference_seconds, minimum=0))
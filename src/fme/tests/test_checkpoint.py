@@ -0,0 +1,48 @@
+import pytest
+
+from fme.checkpoint import Checkpoint
+
+
+@pytest.fixture
+def checkpoint(tmpdir):
+    return Checkpoint(str(tmpdir.join('state', 'checkpoint.json')))
+
+
+def test_checkpoint_survives_reload(checkpoint):
+    job = {'jobid': 12, 'urltransform': 'fmerest/v2/transformations', 'task': 'transformation_db'}
+    checkpoint.start('transformation_db', {'depends_on': ['upload_data']})
+    checkpoint.record_job('transformation_db', job)
+
+    loaded = Checkpoint(checkpoint.path).load()
+    assert not loaded.is_complete('transformation_db')
+    assert [job] == loaded.jobs('transformation_db')
+
+    loaded.complete('transformation_db', [12])
+    assert Checkpoint(checkpoint.path).load().is_complete('transformation_db')
+
+
+def test_checkpoint_replaces_job_of_task(checkpoint):
+    checkpoint.record_job('nlcs_dgn', {'jobid': 1, 'task': 'dgn 1'})
+    checkpoint.record_job('nlcs_dgn', {'jobid': 2, 'task': 'dgn 2'})
+    checkpoint.record_job('nlcs_dgn', {'jobid': 3, 'task': 'dgn 1'})
+    assert [2, 3] == [job['jobid'] for job in Checkpoint(checkpoint.path).load().jobs('nlcs_dgn')]
+
+
+def test_checkpoint_reset(checkpoint):
+    checkpoint.complete('download_bgt')
+    checkpoint.reset()
+    assert not Checkpoint(checkpoint.path).load().is_complete('download_bgt')
+
+
+def test_checkpoint_keep(checkpoint):
+    checkpoint.complete('download_bgt')
+    checkpoint.complete('transformation_db')
+    checkpoint.keep(['download_bgt'])
+    loaded = Checkpoint(checkpoint.path).load()
+    assert loaded.is_complete('download_bgt')
+    assert not loaded.is_complete('transformation_db')
+
+
+def test_checkpoint_load_without_file(checkpoint):
+    assert {} == checkpoint.load().stages
+    assert [] == checkpoint.jobs('download_bgt')
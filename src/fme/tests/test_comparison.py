@@ -0,0 +1,36 @@
+import io
+import os
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import bgt_setup
+import fme.comparison as comparison
+from fme.emulator import Emulator, ranged_response
+
+
+def test_counts_compared_with_the_gml_files_of_a_remote_extract(tmpdir, monkeypatch):
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w', ZIP_DEFLATED) as zf:
+        zf.writestr('bgt_pand.gml', b'<pand/>' * 5000)
+        zf.writestr('bgt_bak.gml', b'<bak/>' * 5000)
+        zf.writestr('bgt_nieuw.gml', b'<nieuw/>' * 5000)
+    monkeypatch.setattr(bgt_setup, 'SCRIPT_ROOT', str(tmpdir))
+    gml_dir = tmpdir.join('work', 'GML')
+
+    def compare_counts(host, port, dbname, user, password):
+        # the counts of the GML files that are there when the counting starts
+        return {name: {'db': 1, 'file': 1 if gml_dir.join(name + '.gml').exists() else -1}
+                for name in comparison.GML_DISPATCH}
+
+    monkeypatch.setattr(comparison, '_compare_counts', compare_counts)
+    with Emulator() as pdok:
+        pdok.route('GET', r'/extract.zip', lambda request: ranged_response(request, buffer.getvalue()))
+        comparison.compare_before_after_counts_csv(
+            'localhost', 5432, 'gisdb', 'user', 'secret', gml_url='{}/extract.zip'.format(pdok.url))
+
+    # only the GML files of the comparison are fetched
+    assert ['bgt_bak.gml', 'bgt_pand.gml'] == sorted(os.listdir(str(gml_dir)))
+    assert b'<pand/>' * 5000 == gml_dir.join('bgt_pand.gml').read_binary()
+    [result] = tmpdir.join('work', 'results').listdir()
+    rows = result.read().splitlines()
+    assert 'bgt_pand;1;1' in rows
+    assert 'bgt_wegdeel;1;-1' in rows
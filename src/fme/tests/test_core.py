@@ -1,9 +1,27 @@
+import io
+import os
+import shutil
+import tempfile
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import requests
+
+import bgt_setup
+import fme.core as core
+import fme.fme_utils as fme_utils
 import fme.polygon as polygon
 
 from unittest import TestCase
 from unittest.mock import patch, call, MagicMock
 
 from fme.core import get_gob_over_onderbouw_files, upload_over_onderbouw_backup, get_pdok_feature_types, pdok_url
+from fme.core import _submit_or_reattach, build_pipeline, envelope_task, pdok_fingerprint, run_all, split_envelope
+from fme.core import PDOK_DERIVED_STAGES, download_bgt, feature_type_groups
+from fme.core import download_and_extract_bgt
+from fme.checkpoint import Checkpoint
+from fme.emulator import Emulator, PDOKEmulator, ranged_response
+from fme.job_queue import JobTask
+from fme.ranged_download import RangedDownload
 from bgt_setup import GOB_OBJECTSTORE_CONTAINER, PDOK_DOWNLOAD_API, PDOK_DOWNLOAD_API_HOST
 
 
@@ -68,7 +86,7 @@ class TestOverOnderbouwFromGOB(TestCase):
                 "VALUES ('guid2', -5, 'ObjectTypeB', ST_GeomFromText('geometrie1', 28992));"),
         ])
 
-    @patch("fme.core.requests")
+    @patch("fme.core.session")
     def test_get_pdok_feature_types(self, mock_requests):
         mock_requests.get.return_value.json.return_value = {
             'timeliness': [
@@ -80,9 +98,9 @@ class TestOverOnderbouwFromGOB(TestCase):
         self.assertEqual(['feature type a', 'feature type b'], get_pdok_feature_types())
         mock_requests.get().raise_for_status.assert_called_once()
 
-    @patch("fme.core.time.sleep")
+    @patch("fme.polling.time.sleep")
     @patch("fme.core.get_pdok_feature_types")
-    @patch("fme.core.requests")
+    @patch("fme.core.session")
     def test_pdok_url(self, mock_requests, mock_get_feature_types, mock_sleep):
         mock_get_feature_types.return_value = ['feature a', 'feature b', 'plaatsbepalingspunt', 'feature d']
 
@@ -114,3 +132,181 @@ class TestOverOnderbouwFromGOB(TestCase):
         mock_requests.get.assert_called_with(f"{PDOK_DOWNLOAD_API}/full/custom/the download request id/status")
         self.assertEqual(3, mock_requests.get.call_count)
         self.assertEqual(f"{PDOK_DOWNLOAD_API_HOST}/the/download/url", res)
+
+
+class TestDownloadBGT(TestCase):
+
+    @patch("bgt_setup.PDOK_LARGE_FEATURE_TYPES", ['wegdeel', 'pand'])
+    def test_feature_type_groups(self):
+        feature_types = ['bak', 'pand', 'put', 'wegdeel', 'kast']
+        self.assertEqual([feature_types], feature_type_groups(feature_types, 1))
+        self.assertEqual([['wegdeel'], ['pand'], ['bak', 'kast'], ['put']], feature_type_groups(feature_types, 4))
+        # a group is left for the small feature types
+        self.assertEqual([['wegdeel'], ['bak', 'pand', 'put', 'kast']], feature_type_groups(feature_types, 2))
+        self.assertEqual([['bak'], ['put']], feature_type_groups(['bak', 'put'], 5))
+
+    @patch("bgt_setup.PDOK_DOWNLOAD_GROUPS", 2)
+    @patch("bgt_setup.FME_SYNC_UPLOADS", True)
+    @patch("bgt_setup.PDOK_EXTRACT_WHILE_DOWNLOADING", True)
+    @patch("fme.core.pdok_url")
+    @patch("fme.core.fme_utils.sync_directory")
+    @patch("fme.core.pdok_request_body")
+    def test_download_bgt_keeps_the_download_error(self, mock_body, mock_sync_directory, mock_pdok_url):
+        mock_body.return_value = {'featuretypes': ['bak', 'put']}
+        mock_sync_directory.return_value.finish.side_effect = requests.ConnectionError("upload failed")
+        mock_pdok_url.side_effect = requests.HTTPError("download failed")
+
+        with self.assertRaisesRegex(requests.HTTPError, "download failed"):
+            download_bgt()
+        mock_sync_directory.return_value.finish.assert_called_once_with(complete=False)
+
+
+class TestJobStage(TestCase):
+
+    @patch("fme.core._can_reattach")
+    def test_submit_or_reattach(self, mock_can_reattach):
+        checkpoint = MagicMock()
+        checkpoint.jobs.return_value = [{'jobid': 1, 'task': 'dgn 1'}, {'jobid': 2, 'task': 'dgn 2'}]
+        submit = MagicMock(return_value={'jobid': 3})
+
+        mock_can_reattach.return_value = True
+        self.assertEqual({'jobid': 2, 'task': 'dgn 2'},
+                         _submit_or_reattach(checkpoint, 'nlcs_dgn', JobTask('dgn 2', submit))())
+        submit.assert_not_called()
+
+        mock_can_reattach.return_value = False
+        self.assertEqual({'jobid': 3}, _submit_or_reattach(checkpoint, 'nlcs_dgn', JobTask('dgn 2', submit))())
+        checkpoint.record_job.assert_called_with('nlcs_dgn', {'jobid': 3, 'task': 'dgn 2'})
+
+    def test_split_envelope(self):
+        self.assertEqual([('0', '0', '50', '20'), ('50', '0', '100', '20')], split_envelope('0', '0', '100', '20'))
+        self.assertEqual([('0', '0', '10', '10.25'), ('0', '10.25', '10', '20.5')], split_envelope(0, 0, 10, 20.5))
+
+    def test_envelope_task(self):
+        start = MagicMock()
+        task = envelope_task('dgn', start, 'dgn.fmw', ('0', '0', '100', '20'))
+        self.assertEqual('dgn 0,0,100,20', task.task)
+        self.assertEqual(2000, task.priority)
+
+        halves = task.split()
+        self.assertEqual(['dgn 0,0,50,20', 'dgn 50,0,100,20'], [half.task for half in halves])
+        halves[1].submit()
+        start.assert_called_once_with('50', '0', '100', '20')
+
+
+class TestSkipUnchanged(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint_file = os.path.join(self.directory, 'checkpoint.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @patch("fme.core.get_pdok_timeliness")
+    def test_pdok_fingerprint(self, mock_timeliness):
+        mock_timeliness.return_value = [
+            {'featuretype': 'pand', 'datetimeTo': '2020-01-01T00:00:00Z'},
+            {'featuretype': 'plaatsbepalingspunt', 'datetimeTo': '2020-01-01T00:00:00Z'},
+        ]
+        fingerprint = pdok_fingerprint()
+        self.assertEqual(fingerprint, pdok_fingerprint())
+        self.assertNotEqual(fingerprint['request'], pdok_fingerprint(fme_test_run=1)['request'])
+        self.assertEqual('2020-01-01T00:00:00Z', fingerprint['timeliness']['pand']['datetimeTo'])
+
+        mock_timeliness.return_value[0]['datetimeTo'] = '2020-01-02T00:00:00Z'
+        self.assertNotEqual(fingerprint, pdok_fingerprint())
+
+    def _completed_run(self, pdok):
+        checkpoint = Checkpoint(self.checkpoint_file).reset()
+        for name, stage in build_pipeline(pdok=pdok).stages.items():
+            checkpoint.start(name, {'depends_on': list(stage.depends_on), 'inputs': stage.inputs})
+            checkpoint.complete(name)
+
+    @patch("fme.core.Pipeline.run")
+    @patch("fme.core.pdok_fingerprint")
+    def test_run_all_skips_unchanged(self, mock_fingerprint, mock_run):
+        mock_fingerprint.return_value = {'request': 'a', 'timeliness': {'pand': {'datetimeTo': '1'}}}
+        self._completed_run(mock_fingerprint.return_value)
+        before_run = MagicMock()
+
+        with patch("bgt_setup.CHECKPOINT_FILE", self.checkpoint_file):
+            run_all(before_run=before_run)
+            before_run.assert_called_once_with()
+            mock_run.assert_called_once_with()
+            # only the stages derived from PDOK alone are skipped
+            checkpoint = Checkpoint(self.checkpoint_file).load()
+            for name in PDOK_DERIVED_STAGES:
+                self.assertTrue(checkpoint.is_complete(name))
+            for name in ['upload_resources', 'upload_script_resources', 'upload_over_onderbouw_backup',
+                         'transformation_stand_ligplaatsen', 'transformation_gebieden', 'transformation_db']:
+                self.assertFalse(checkpoint.is_complete(name))
+
+            # PDOK published new data
+            self._completed_run({'request': 'a', 'timeliness': {'pand': {'datetimeTo': '1'}}})
+            mock_fingerprint.return_value = {'request': 'a', 'timeliness': {'pand': {'datetimeTo': '2'}}}
+            run_all(before_run=before_run)
+            self.assertEqual(2, mock_run.call_count)
+            self.assertFalse(Checkpoint(self.checkpoint_file).load().is_complete('download_bgt'))
+
+
+def test_download_and_extract_bgt_uploads_extracted_gml(fme, tmpdir, monkeypatch):
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w') as zf:
+        zf.writestr('bgt_pand.gml', b'<pand/>' * 5000)
+        zf.writestr('bgt_wegdeel.gml', b'<wegdeel/>' * 5000)
+    with Emulator() as pdok:
+        pdok.route('GET', r'/extract.zip', lambda request: ranged_response(request, buffer.getvalue()))
+        download = RangedDownload('{}/extract.zip'.format(pdok.url), str(tmpdir.join('extract_bgt.zip')),
+                                  part_size=10000)
+        sync = fme_utils.sync_directory('resources/connections', 'Import_GML', '*.*')
+        core.download_and_extract_bgt(download, str(tmpdir.join('data')), sync)
+        sync.finish(complete=False)
+    assert b'<pand/>' * 5000 == tmpdir.join('data', 'bgt_pand.gml').read_binary()
+    assert b'<wegdeel/>' * 5000 == fme.files['Import_GML/bgt_wegdeel.gml']
+
+    # the sync of upload_data finds them uploaded
+    requests_before = len(fme.requests)
+    fme_utils.upload(str(tmpdir.join('data')), 'resources/connections', 'Import_GML', '*.*', sync=True)
+    assert not [path for method, path in fme.requests[requests_before:] if method == 'POST']
+
+
+def test_download_bgt_in_groups(fme, tmpdir, monkeypatch):
+    feature_types = ['pand', 'wegdeel', 'bak', 'put', 'kast']
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w', ZIP_DEFLATED) as zf:
+        for name in feature_types:
+            zf.writestr('bgt_{}.gml'.format(name), '<{}/>'.format(name) * 5000)
+    monkeypatch.setattr('fme.polling.time.sleep', lambda delay: None)
+    monkeypatch.setattr(bgt_setup, 'PDOK_DOWNLOAD_GROUPS', 3)
+    monkeypatch.setattr(bgt_setup, 'FME_SYNC_UPLOADS', True)
+    monkeypatch.chdir(str(tmpdir))
+    extracted = []
+    monkeypatch.setattr(core, 'download_and_extract_bgt', lambda download, directory, sync: extracted.append(
+        (download.target, download_and_extract_bgt(download, str(tmpdir.join('data')), sync))))
+    with PDOKEmulator(feature_types=feature_types, full=buffer.getvalue()) as pdok:
+        monkeypatch.setattr(bgt_setup, 'PDOK_DOWNLOAD_API_HOST', pdok.url)
+        monkeypatch.setattr(bgt_setup, 'PDOK_DOWNLOAD_API', pdok.url + PDOKEmulator.API)
+        core.download_bgt()
+
+    # requested concurrently, in any order
+    assert [['bak', 'put', 'kast'], ['pand'], ['wegdeel']] == sorted(body['featuretypes']
+                                                                    for body in pdok.download_requests)
+    # the feature types are requested once, not per group
+    assert 1 == pdok.requests.count(('GET', PDOKEmulator.API + '/dataset'))
+    assert ['extract_bgt.0.zip', 'extract_bgt.1.zip', 'extract_bgt.2.zip'] == core.pdok_archives()
+    for name in feature_types:
+        assert '<{}/>'.format(name).encode() * 5000 == fme.files['Import_GML/bgt_{}.gml'.format(name)]
+
+    merged = io.BytesIO()
+    # written to a stream that cannot seek, as by `ObjectStore.put_stream`
+    core._merge_archives(core.pdok_archives(), Unseekable(merged))
+    with ZipFile(merged) as zf:
+        assert sorted('bgt_{}.gml'.format(name) for name in feature_types) == sorted(zf.namelist())
+        assert zf.testzip() is None
+        assert b'<bak/>' * 5000 == zf.read('bgt_bak.gml')
+
+
+class Unseekable(object):
+    def __init__(self, f):
+        self.write, self.flush = f.write, f.flush
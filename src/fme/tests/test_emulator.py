@@ -0,0 +1,23 @@
+import io
+
+import requests
+
+import bgt_setup
+from fme.emulator import emulated_services
+from objectstore.objectstore import ObjectStore
+
+
+def test_not_running_instance_refuses_requests(fme):
+    fme.instance['state'] = 'PAUSED'
+    assert 503 == requests.get('{}/fmerest/v2/repositories/'.format(fme.url)).status_code
+
+
+def test_emulated_objectstore():
+    with emulated_services() as (_, swift):
+        store = ObjectStore('BGT')
+        store.put_to_objectstore('BGT_Totaal/a.zip', b'zip', 'application/octet-stream')
+        store.put_to_objectstore('BGT_Totaal/b.zip', io.BytesIO(b'zip'), 'application/octet-stream')
+        assert b'zip' == store.get_store_object('BGT_Totaal/a.zip')
+        assert ['BGT_Totaal/'] == store.folders('')
+        assert b'zip' == swift.containers['BGT']['BGT_Totaal/b.zip']
+    assert 'secret' == bgt_setup.FME_BASE_URL
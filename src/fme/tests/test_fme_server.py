@@ -1,6 +1,7 @@
 import pytest
 import logging
 from unittest.mock import MagicMock, patch
+
 from ..fme_server import FMEServer
 
 log = logging.getLogger(__name__)
@@ -43,3 +44,12 @@ def test_stop(fme_server):
     with patch.object(fme_server, 'stop') as mocked_stop:
         fme_server.stop()
         mocked_stop.assert_called_once_with()
+
+
+def test_instance_start_and_stop(fme):
+    fme.instance['state'] = 'PAUSED'
+    server = FMEServer(fme.url, '2222', 'token', api_url='{}/v1'.format(fme.url))
+    server.start()
+    assert 'RUNNING' == server.get_status()
+    server.stop()
+    assert 'PAUSED' == server.get_status()
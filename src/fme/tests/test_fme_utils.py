@@ -1,19 +1,25 @@
+import io
+import logging
+import time
 from unittest.mock import MagicMock, create_autospec
+from zipfile import ZipFile
 
 import pytest
 import requests
 
 import fme.fme_utils as fme_utils
+from fme.emulator import emulated_services, json_response
+from objectstore.objectstore import ObjectStore
 
 
 @pytest.fixture
 def requests_delete(mocker):
-    return mocker.patch('requests.delete')
+    return mocker.patch('fme.fme_utils.session.delete')
 
 
 @pytest.fixture
 def requests_post(mocker):
-    return mocker.patch('requests.post')
+    return mocker.patch('fme.fme_utils.session.post')
 
 
 @pytest.fixture
@@ -31,6 +37,13 @@ def test_fme_api_auth(fme_utils_api_auth):
     fme_utils_api_auth.assert_called_once_with()
 
 
+def test_fme_instance_api_auth_returns_a_new_dict():
+    headers = fme_utils.fme_instance_api_auth('application/json')
+    headers['Range'] = 'bytes=10-'
+    assert {'Authorization': 'fmetoken token=secret', 'Content-Type': 'application/json'} == \
+        fme_utils.fme_instance_api_auth('application/json')
+
+
 def test_delete_directory_fails(requests_delete, fme_utils_log):
     requests_delete.return_value = MagicMock(status_code=404)
     fme_utils.delete_directory('test')
@@ -107,3 +120,223 @@ def test_upload_repository(requests_post, fme_utils_log):
     requests_post.return_value = create_autospec(requests.Response, status_code=201)
     fme_utils.upload_repository('fixtures', 'repositories', 'test_repo.*', recreate_repo=False, register_fmejob=False)
     fme_utils_log.debug.assert_called_once_with("Upload test_repo.* completed")
+
+
+def test_job_timings():
+    assert (30.0, 90.0) == fme_utils.job_timings({
+        'status': 'SUCCESS',
+        'result': {
+            'timeRequested': '2017-04-11T13:00:00',
+            'timeStarted': '2017-04-11T13:00:30',
+            'timeFinished': '2017-04-11T13:02:00',
+        }})
+    assert (None, None) == fme_utils.job_timings({'status': 'SUCCESS'})
+
+
+def test_upload_and_download(fme, tmpdir):
+    tmpdir.join('a.gml').write('<gml/>')
+    fme_utils.upload(str(tmpdir), 'resources/connections', 'Import_GML', '*.gml')
+    assert b'<gml/>' == fme.files['Import_GML/a.gml']
+    assert '<gml/>' == fme_utils.download('Import_GML/a.gml')
+
+
+def test_parallel_upload_retries_failed_files(fme, tmpdir, monkeypatch):
+    monkeypatch.setattr('fme.fme_utils.time.sleep', lambda delay: None)
+    for i in range(8):
+        tmpdir.join('{}.gml'.format(i)).write('<gml id="{}"/>'.format(i))
+    fme_utils.create_directory('Import_GML')
+    url = '{}/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/Import_GML'.format(fme.url)
+
+    fme.http_error_rate = 0.3
+    total = fme_utils.upload_files(url, [str(path) for path in tmpdir.listdir()], concurrency=4, retries=10)
+
+    assert 8 == len([path for path in fme.files if path.startswith('Import_GML/')])
+    assert sum(path.size() for path in tmpdir.listdir()) == total
+    assert len(fme.requests) > 9
+
+
+def test_upload_client_errors_are_not_retried(fme, tmpdir):
+    tmpdir.join('a.gml').write('<gml/>')
+    url = '{}/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/missing'.format(fme.url)
+    with pytest.raises(requests.HTTPError):
+        fme_utils.upload_files(url, [str(tmpdir.join('a.gml'))], retries=3)
+    assert 1 == len(fme.requests)
+
+
+def test_download_to_file(fme, tmpdir):
+    fme.write_file('BGT_uitwissel/data.bin', bytes(range(256)) * 100)
+    target = str(tmpdir.join('data.bin'))
+    assert 25600 == fme_utils.download_to('BGT_uitwissel/data.bin', target, chunk_size=1000)
+    assert bytes(range(256)) * 100 == tmpdir.join('data.bin').read_binary()
+
+
+def test_download_resumes_after_dropped_connection(fme, monkeypatch):
+    monkeypatch.setattr('fme.fme_utils.time.sleep', lambda delay: None)
+    content = bytes(range(256)) * 100
+    fme.write_file('BGT_uitwissel/data.bin', content)
+    get = fme_utils.session.get
+    ranges = []
+
+    def dropping_get(url, headers=None, **kwargs):
+        ranges.append(headers.get('Range'))
+        response = get(url, headers=headers, **kwargs)
+        if len(ranges) == 1:
+            chunks = response.iter_content
+
+            def iter_content(chunk_size):
+                iterator = chunks(chunk_size)
+                yield next(iterator)
+                raise requests.exceptions.ChunkedEncodingError("Connection broken")
+            response.iter_content = iter_content
+        return response
+
+    monkeypatch.setattr(fme_utils.session, 'get', dropping_get)
+    sink = io.BytesIO()
+    fme_utils.download_to('BGT_uitwissel/data.bin', sink, chunk_size=1000)
+    assert content == sink.getvalue()
+    assert [None, 'bytes=1000-'] == ranges
+
+
+def test_download_missing_file_fails(fme):
+    with pytest.raises(requests.HTTPError):
+        fme_utils.download('BGT_uitwissel/missing.csv')
+
+
+def test_upload_with_another_size_on_the_server_is_retried(fme, tmpdir, monkeypatch):
+    monkeypatch.setattr('fme.fme_utils.time.sleep', lambda delay: None)
+    tmpdir.join('a.gml').write('<gml/>')
+    fme_utils.create_directory('Import_GML')
+    url = '{}/fmerest/v2/resources/connections/FME_SHAREDRESOURCE_DATA/filesys/Import_GML'.format(fme.url)
+    handled = []
+
+    def truncate_first(handler):
+        def handle(request, *args):
+            handler(request, *args)
+            handled.append(request.filename())
+            return json_response({'name': request.filename(), 'size': 3 if len(handled) == 1 else 6}, 201)
+        return handle
+
+    fme.routes = [(method, pattern, truncate_first(handler) if handler == fme.upload_file else handler)
+                  for method, pattern, handler in fme.routes]
+    assert 6 == fme_utils.upload_files(url, [str(tmpdir.join('a.gml'))], retries=1)
+    assert ['a.gml', 'a.gml'] == handled
+
+    del handled[:]
+    with pytest.raises(requests.HTTPError):
+        fme_utils.upload_files(url, [str(tmpdir.join('a.gml'))], retries=0)
+
+
+def test_upload_progress_of_large_files(fme, tmpdir, monkeypatch, caplog):
+    monkeypatch.setattr(fme_utils, 'UPLOAD_PROGRESS_MINIMUM', 1000)
+    tmpdir.join('large.gml').write_binary(b'x' * 100000)
+    tmpdir.join('small.gml').write_binary(b'x' * 100)
+    with caplog.at_level(logging.INFO, logger='fme.fme_utils'):
+        fme_utils.upload(str(tmpdir), 'resources/connections', 'Import_GML', '*.gml')
+
+    assert 100000 == len(fme.files['Import_GML/large.gml'])
+    progress = [record.getMessage() for record in caplog.records if record.getMessage().startswith('Uploading ')]
+    assert progress and all('large.gml' in message for message in progress)
+    assert progress[-1].endswith('(100%)')
+
+
+def test_sync_uploads_only_changes(fme, tmpdir):
+    tmpdir.join('a.fmw').write('a')
+    tmpdir.join('b.fmw').write('b')
+    fme_utils.upload_repository(str(tmpdir), 'BGT-DB', '*.fmw', register_fmejob=True, sync=True)
+    assert {'a.fmw': b'a', 'b.fmw': b'b'} == fme.repositories['BGT-DB']['items']
+
+    del fme.requests[:]
+    fme_utils.upload_repository(str(tmpdir), 'BGT-DB', '*.fmw', register_fmejob=True, sync=True)
+    assert [method for method, _ in fme.requests] == ['GET', 'GET']
+
+    tmpdir.join('a.fmw').write('changed')
+    tmpdir.join('b.fmw').remove()
+    fme.repositories['BGT-DB']['services'].clear()
+    fme_utils.upload_repository(str(tmpdir), 'BGT-DB', '*.fmw', register_fmejob=True, sync=True)
+    assert {'a.fmw': b'changed'} == fme.repositories['BGT-DB']['items']
+    assert ['a.fmw'] == list(fme.repositories['BGT-DB']['services'])
+
+
+def test_sync_directory_deletes_stale_files(fme, tmpdir):
+    tmpdir.join('a.gml').write('a')
+    tmpdir.join('b.gml').write('b')
+    fme_utils.upload(str(tmpdir), 'resources/connections', 'Import_GML', '*.gml', sync=True)
+    tmpdir.join('b.gml').remove()
+    fme.files['Import_GML/other.csv'] = b'not ours'
+    fme_utils.upload(str(tmpdir), 'resources/connections', 'Import_GML', '*.gml', sync=True)
+    assert ['Import_GML/a.gml', 'Import_GML/other.csv'] == sorted(
+        path for path in fme.files if path.startswith('Import_GML/'))
+
+    # files deleted on the server are uploaded again
+    del fme.files['Import_GML/a.gml']
+    fme_utils.upload(str(tmpdir), 'resources/connections', 'Import_GML', '*.gml', sync=True)
+    assert b'a' == fme.files['Import_GML/a.gml']
+
+
+def test_job_writes_outputs(fme, tmpdir):
+    tmpdir.join('00_kaartbladen_coordinatenbepaler.fmw').write('fmw')
+    fme_utils.upload_repository(str(tmpdir), 'BGT-DGN', '*.fmw', register_fmejob=True)
+
+    job = fme_utils.run_transformation_job('BGT-DGN', '00_kaartbladen_coordinatenbepaler.fmw', {})
+    fme_utils.wait_for_job_to_complete(job, initial=0.05)
+
+    assert 'SUCCESS' == fme_utils.get_job_status(job)
+    assert 'Translation was SUCCESSFUL' in fme_utils.fetch_log_for_job(job)
+    assert 5 == len(fme_utils.download('BGT_uitwissel/Kaartbladen_coordinaten.csv').split('\n')[1:])
+
+
+def test_job_failure_rate(fme, tmpdir):
+    fme.failure_rate = 1.0
+    tmpdir.join('w.fmw').write('fmw')
+    fme_utils.upload_repository(str(tmpdir), 'BGT-DB', '*.fmw')
+    job = fme_utils.run_transformation_job('BGT-DB', 'w.fmw', {})
+    fme_utils.wait_for_job_to_complete(job, initial=0.05)
+    assert 'FME_FAILURE' == fme_utils.get_job_status(job)
+
+
+def test_job_statuses_in_bulk(fme, tmpdir, mocker):
+    tmpdir.join('w.fmw').write('fmw')
+    fme_utils.upload_repository(str(tmpdir), 'BGT-DB', '*.fmw')
+    fme.job_duration = 2.0
+    jobs = [fme_utils.run_transformation_job('BGT-DB', 'w.fmw', {}) for _ in range(4)]
+    time.sleep(0.15)
+    get_job = mocker.spy(fme_utils, 'get_job')
+
+    statuses = fme_utils.get_job_statuses(jobs)
+
+    assert ['PULLED', 'PULLED', 'QUEUED', 'QUEUED'] == [statuses[job['jobid']] for job in jobs]
+    assert 0 == get_job.call_count
+
+    # jobs that are not listed are fetched per job
+    for job in fme.jobs.values():
+        job['finished'] = 0
+    assert ['SUCCESS'] * 4 == list(fme_utils.get_job_statuses(jobs).values())
+    assert 4 == get_job.call_count
+
+
+def test_download_folder_to_zip(fme, tmpdir):
+    names = ['{:03d}.dgn'.format(i) for i in range(25)]
+    for name in reversed(names):
+        fme.write_file('DGNv8/{}'.format(name), name.encode('ascii') * 100)
+
+    with ZipFile(str(tmpdir.join('dgn.zip')), 'w') as zf:
+        assert 25 == fme_utils.download_folder_to_zip('DGNv8', zf, concurrency=3)
+    with ZipFile(str(tmpdir.join('dgn.zip'))) as zf:
+        assert names == zf.namelist()
+        assert b'007.dgn' * 100 == zf.read('007.dgn')
+
+
+def test_download_folder_to_zip_fails_on_missing_folder(fme, tmpdir):
+    with pytest.raises(requests.HTTPError), ZipFile(str(tmpdir.join('dgn.zip')), 'w') as zf:
+        fme_utils.download_folder_to_zip('DGNv8', zf)
+
+
+def test_zip_folder_to_objectstore(tmpdir):
+    with emulated_services(instance_state='RUNNING') as (fme, swift):
+        for i in range(10):
+            fme.write_file('DGNv8/{}.dgn'.format(i), b'dgn' * 1000)
+        ObjectStore('BGT').put_stream('DGNv8-latest.zip', fme_utils.zip_folder('DGNv8'), 'application/zip')
+        tmpdir.join('dgn.zip').write_binary(swift.containers['BGT']['DGNv8-latest.zip'])
+    with ZipFile(str(tmpdir.join('dgn.zip'))) as zf:
+        assert ['{}.dgn'.format(i) for i in range(10)] == zf.namelist()
+        assert zf.testzip() is None
@@ -0,0 +1,47 @@
+import pytest
+
+import bgt_setup
+from fme.emulator import Emulator
+from fme.http_session import Session, timeout_for
+
+
+@pytest.fixture
+def flaky():
+    """Server that answers 503 to the first two requests of every path"""
+    with Emulator() as emulator:
+        counts = {}
+
+        def handler(request, path):
+            counts[path] = counts.get(path, 0) + 1
+            if counts[path] <= 2:
+                return 503, {}, b'Service Unavailable'
+            return 200, {}, b'ok'
+
+        emulator.route('GET', r'/(\w+)', handler)
+        emulator.route('POST', r'/(\w+)', handler)
+        yield emulator
+
+
+def test_idempotent_requests_are_retried(flaky):
+    session = Session(retries=3)
+    response = session.get('{}/a'.format(flaky.url))
+    assert 200 == response.status_code
+    assert 3 == len(flaky.requests)
+
+
+def test_post_is_not_retried(flaky):
+    session = Session(retries=3)
+    response = session.post('{}/b'.format(flaky.url))
+    assert 503 == response.status_code
+    assert 1 == len(flaky.requests)
+
+
+def test_last_response_after_retries(flaky):
+    session = Session(retries=1)
+    assert 503 == session.get('{}/c'.format(flaky.url)).status_code
+
+
+def test_timeout_per_host(monkeypatch):
+    monkeypatch.setattr(bgt_setup, 'HTTP_HOST_TIMEOUTS', {'api.pdok.nl': (1, 2)})
+    assert (1, 2) == timeout_for('https://api.pdok.nl/lv/bgt/download/v1_0/dataset')
+    assert bgt_setup.HTTP_TIMEOUT == timeout_for('https://example.com/')
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+import fme.fme_utils as fme_utils
+from fme.job_log import JobLogFollower, parse_line
+
+
+def running_job(fme, tmpdir):
+    fme.job_duration = 100.0
+    tmpdir.join('w.fmw').write('fmw')
+    fme_utils.upload_repository(str(tmpdir), 'BGT-DB', '*.fmw')
+    job = fme_utils.run_transformation_job('BGT-DB', 'w.fmw', {})
+    emulated = fme.jobs[job['jobid']]
+    now = time.time()
+    emulated['started'], emulated['finished'] = now - 25, now + 75
+    return job, emulated
+
+
+def test_parse_line():
+    event = parse_line('2017-01-01 10:00:00|  12.5|  0.0|INFORM|Total Features Written          1234')
+    assert ('features_written', 1234.0, 'INFORM', 12.5) == event[:4]
+
+    assert 'error' == parse_line('2017-01-01 10:00:00|   1.0|  0.0|ERROR |Memory allocation failed').kind
+    assert 'translation_failed' == parse_line('2017-01-01 10:00:00|   1.0|  0.0|INFORM|Translation FAILED.').kind
+    assert ('message', None, None) == parse_line('no separators')[:3]
+
+
+@pytest.mark.parametrize('message, percent', [
+    ('Translation progress: 45%', 45.0),
+    ('Progress 12.5%', 12.5),
+    ('80% complete', 80.0),
+    ('100%', 100.0),
+    ('Peak memory usage 85% of 4 GB', None),
+    ('CPU 90%', None),
+    ('Dropped 3% of the features (12 of 400)', None),
+])
+def test_parse_progress_percent(message, percent):
+    event = parse_line('2017-01-01 10:00:00|  12.5|  0.0|INFORM|{}'.format(message))
+    assert (percent, 'progress_percent' if percent else 'message') == (event.value, event.kind)
+
+
+def test_follow_reads_only_new_lines(fme, tmpdir):
+    job, emulated = running_job(fme, tmpdir)
+    follower = JobLogFollower(job)
+
+    first = list(follower.lines())
+    assert ['Read' in line for line in first].count(True) == 2
+    offset = follower.offset
+    assert [] == list(follower.lines())
+
+    emulated['finished'] = time.time() - 1
+    rest = list(follower.lines(final=True))
+    assert follower.offset > offset
+    assert len(''.join(line + '\n' for line in first + rest).encode('utf-8')) == follower.offset
+    assert not set(first) & set(rest)
+    assert 'Translation was SUCCESSFUL' in rest[-1]
+    assert rest[-1] == follower.tail[-1]
+
+
+def test_follow_events(fme, tmpdir):
+    job, emulated = running_job(fme, tmpdir)
+    emulated['finished'] = time.time() - 1
+    kinds = [event.kind for event in JobLogFollower(job).events(final=True)]
+    assert ['message', 'message'] + ['progress'] * 9 + ['features_written', 'features_output'] == kinds
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+import fme.fme_utils as fme_utils
+from fme.job_monitor import JobError, JobMonitor, JobsFailed, wait_for_jobs
+from fme.run_report import report
+
+
+@pytest.fixture
+def fme(fme, tmpdir):
+    # the emulator of conftest.py, with a workspace to run
+    fme.job_duration = 0.2
+    tmpdir.join('w.fmw').write('fmw')
+    fme_utils.upload_repository(str(tmpdir), 'BGT-DB', '*.fmw')
+    return fme
+
+
+def submit(count):
+    return [fme_utils.run_transformation_job('BGT-DB', 'w.fmw', {}) for _ in range(count)]
+
+
+def test_watch_all_jobs_at_once(fme):
+    report.reset()
+    monitor = JobMonitor(initial=0.05)
+    finished = []
+    with report.stage('chunks'):
+        futures = [monitor.watch(job, callback=finished.append) for job in submit(4)]
+
+    results = wait_for_jobs(futures)
+
+    assert ['SUCCESS'] * 4 == [r['status'] for r in results]
+    # callbacks run in the monitor thread, right after the future is resolved
+    for _ in range(100):
+        if len(finished) == 4:
+            break
+        time.sleep(0.01)
+    assert 4 == len(finished)
+    assert all(r['queue_time'] is not None and r['run_time'] is not None for r in results)
+    assert 4 == len(report.to_dict()['stages']['chunks']['jobs'])
+
+
+def test_failed_jobs_are_reported_after_all_finished(fme):
+    jobs = submit(3)
+    fme.jobs[int(jobs[1]['jobid'])]['fails'] = True
+    monitor = JobMonitor(initial=0.05)
+    futures = [monitor.watch(job) for job in jobs]
+
+    with pytest.raises(JobsFailed) as e:
+        wait_for_jobs(futures)
+
+    assert [jobs[1]['jobid']] == [error.job['jobid'] for error in e.value.errors]
+    assert all(future.done() for future in futures)
+    with pytest.raises(JobError):
+        futures[1].result()
+
+
+def test_running_jobs_are_listed_in_bulk(fme):
+    monitor = JobMonitor(initial=0.05)
+    jobs = submit(6)
+    wait_for_jobs([monitor.watch(job) for job in jobs])
+
+    listings = [path for method, path in fme.requests if path.endswith(('/jobs/queued', '/jobs/running'))]
+    details = [path for method, path in fme.requests if '/jobs/id/' in path]
+    assert listings
+    # one detail request per job once it is finished, plus the few before it was listed
+    assert len(details) < 3 * len(jobs)
+
+
+def test_monitor_thread_stops_when_idle(fme):
+    monitor = JobMonitor(initial=0.05)
+    wait_for_jobs([monitor.watch(job) for job in submit(1)])
+    monitor.wakeup.set()
+    for _ in range(100):
+        if monitor.thread is None:
+            break
+        time.sleep(0.01)
+    assert monitor.thread is None
+
+    # a new job starts a new poller
+    assert ['SUCCESS'] == [r['status'] for r in wait_for_jobs([monitor.watch(job) for job in submit(1)])]
+
+
+def test_unexpected_errors_fail_the_job_not_the_monitor(fme, monkeypatch):
+    monitor = JobMonitor(initial=0.05)
+    jobs = submit(2)
+    get_job = fme_utils.get_job
+
+    def broken(job):
+        if job['jobid'] == jobs[0]['jobid']:
+            raise KeyError('status')
+        return get_job(job)
+
+    monkeypatch.setattr(fme_utils, 'get_job', broken)
+    futures = [monitor.watch(job) for job in jobs]
+
+    with pytest.raises(KeyError):
+        futures[0].result(timeout=10)
+    assert 'SUCCESS' == futures[1].result(timeout=10)['status']
+
+
+def test_errors_in_a_poll_round_fail_its_jobs(fme, monkeypatch):
+    monitor = JobMonitor(initial=0.05)
+    monkeypatch.setattr(monitor, '_active_job_statuses', lambda: {}['items'])
+    futures = [monitor.watch(job) for job in submit(3)]
+    for future in futures:
+        with pytest.raises(KeyError):
+            future.result(timeout=10)
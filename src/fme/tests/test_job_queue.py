@@ -0,0 +1,237 @@
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+import requests
+
+from fme.job_monitor import JobError, JobsFailed
+from fme.job_queue import JobQueue, JobTask, RetryPolicy, run_tasks
+
+
+class FakeMonitor(object):
+    def __init__(self):
+        self.watched = {}
+        self.expected = {}
+
+    def watch(self, job, callback=None, expected=None, follow_log=False):
+        future = Future()
+        future.add_done_callback(callback)
+        self.watched[job['jobid']] = future
+        self.expected[job['jobid']] = expected
+        return future
+
+    def finish(self, jobid, status='SUCCESS', job_log=None, **timings):
+        future = self.watched.pop(jobid)
+        if status == 'SUCCESS':
+            future.set_result(dict({'jobid': jobid, 'status': status}, **timings))
+        else:
+            future.set_exception(JobError({'jobid': jobid}, status, job_log))
+
+
+class FailingMonitor(FakeMonitor):
+    """Finishes every job at once, failing the jobs of which the id is in `failures`"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def watch(self, job, callback=None, expected=None, follow_log=False):
+        future = super().watch(job, callback, expected)
+        failure = self.failures.get(job['jobid'])
+        if failure:
+            self.failures[job['jobid']] = failure[1:]
+            self.finish(job['jobid'], *failure[0])
+        else:
+            self.finish(job['jobid'])
+        return future
+
+
+class InlineExecutor(object):
+    """Submits the waiting jobs at once, in the thread that finished a job"""
+
+    def submit(self, func, *args):
+        func(*args)
+
+
+@pytest.fixture
+def monitor():
+    return FakeMonitor()
+
+
+def submitter(submitted, jobid):
+    def submit():
+        submitted.append(jobid)
+        return {'jobid': jobid, 'urltransform': 'fmerest/v2/transformations'}
+    return submit
+
+
+def test_at_most_max_in_flight(monitor):
+    submitted = []
+    queue = JobQueue(monitor, max_in_flight=2, executor=InlineExecutor())
+    futures = [queue.submit(submitter(submitted, i)) for i in range(5)]
+    assert [0, 1] == submitted
+
+    monitor.finish(0)
+    assert [0, 1, 2] == submitted
+    assert {'jobid': 0, 'status': 'SUCCESS'} == futures[0].result()
+
+    monitor.finish(1, 'FME_FAILURE')
+    assert [0, 1, 2, 3] == submitted
+    with pytest.raises(JobError):
+        futures[1].result()
+
+
+def test_highest_priority_first(monitor):
+    submitted = []
+    queue = JobQueue(monitor, max_in_flight=1, executor=InlineExecutor())
+    queue.submit(submitter(submitted, 'first'), priority=0)
+    queue.submit(submitter(submitted, 'small'), priority=1)
+    queue.submit(submitter(submitted, 'large'), priority=10)
+    queue.submit(submitter(submitted, 'small too'), priority=1)
+
+    for jobid in ['first', 'large', 'small']:
+        monitor.finish(jobid)
+    assert ['first', 'large', 'small', 'small too'] == submitted
+
+
+def test_workspace_limits(monitor):
+    submitted = []
+    queue = JobQueue(monitor, max_in_flight=3, workspace_limits={'nlcs.fmw': 1}, executor=InlineExecutor())
+    queue.submit(submitter(submitted, 'nlcs 1'), priority=2, workspace='nlcs.fmw')
+    queue.submit(submitter(submitted, 'nlcs 2'), priority=2, workspace='nlcs.fmw')
+    queue.submit(submitter(submitted, 'dgn 1'), priority=1, workspace='dgn.fmw')
+    assert ['nlcs 1', 'dgn 1'] == submitted
+
+    monitor.finish('nlcs 1')
+    assert ['nlcs 1', 'dgn 1', 'nlcs 2'] == submitted
+
+
+def test_expected_run_time_of_the_workspace(monitor):
+    submitted = []
+    queue = JobQueue(monitor, max_in_flight=1, executor=InlineExecutor())
+    queue.submit(submitter(submitted, 0), workspace='dgn')
+    queue.submit(submitter(submitted, 1), workspace='dgn')
+    queue.submit(submitter(submitted, 2), workspace='dgn')
+    queue.submit(submitter(submitted, 3), workspace='dgn', expected=5.0)
+    queue.submit(submitter(submitted, 4), workspace='nlcs')
+
+    monitor.finish(0, run_time=30.0)
+    monitor.finish(1, run_time=40.0)
+    monitor.finish(2, run_time=20.0)
+    monitor.finish(3, run_time=10.0)
+    # unknown at first, then the shortest successful run of the workspace, unless given
+    assert {0: None, 1: 30.0, 2: 30.0, 3: 5.0, 4: None} == monitor.expected
+
+
+def test_failed_submission(monitor):
+    def broken():
+        raise ValueError("no FME")
+
+    submitted = []
+    queue = JobQueue(monitor, max_in_flight=1, executor=InlineExecutor())
+    failed = queue.submit(broken)
+    queue.submit(submitter(submitted, 'next'))
+
+    with pytest.raises(ValueError):
+        failed.result()
+    assert ['next'] == submitted
+
+
+def test_many_failed_submissions(monitor):
+    def broken():
+        raise ConnectionError("FME is gone")
+
+    submitted = []
+    queue = JobQueue(monitor, max_in_flight=1, executor=InlineExecutor())
+    queue.submit(submitter(submitted, 'first'))
+    failed = [queue.submit(broken) for _ in range(sys.getrecursionlimit())]
+    queue.submit(submitter(submitted, 'last'))
+
+    # the failures are handled one after the other, not each in the call of the one before
+    monitor.finish('first')
+    assert ['first', 'last'] == submitted
+    assert all(isinstance(future.exception(), ConnectionError) for future in failed)
+    assert 1 == queue.in_flight
+
+
+def task(name, submitted, split=None):
+    return JobTask(name, submitter(submitted, name), split=split)
+
+
+def test_failed_jobs_are_submitted_again():
+    submitted = []
+    monitor = FailingMonitor({'a': [('FME_FAILURE',), ('JOB_FAILURE',)]})
+    results = run_tasks(JobQueue(monitor, executor=InlineExecutor()), [task('a', submitted), task('b', submitted)], RetryPolicy(retries=2))
+    assert ['a', 'b', 'a', 'a'] == submitted
+    assert 2 == len(results)
+
+
+def test_permanent_failures_after_all_jobs():
+    submitted = []
+    monitor = FailingMonitor({'a': [('FME_FAILURE',)] * 3, 'b': [('ABORTED',)]})
+    with pytest.raises(JobsFailed) as e:
+        run_tasks(JobQueue(monitor, max_in_flight=1, executor=InlineExecutor()),
+                  [task('a', submitted), task('b', submitted), task('c', submitted)], RetryPolicy(retries=1))
+    assert ['a', 'b', 'c', 'a'] == submitted
+    assert [('a', 'FME_FAILURE'), ('b', 'ABORTED')] == sorted((error.job['jobid'], error.status) for error in e.value.errors)
+
+
+def test_failed_submissions_are_submitted_again():
+    submitted = []
+    failures = {'a': 1, 'b': 3}
+
+    def submit(task):
+        def run():
+            submitted.append(task.task)
+            if failures.get(task.task):
+                failures[task.task] -= 1
+                raise requests.ConnectionError("FME is gone")
+            return {'jobid': task.task, 'urltransform': 'fmerest/v2/transformations'}
+        return run
+
+    with pytest.raises(JobsFailed) as e:
+        run_tasks(JobQueue(FailingMonitor({}), max_in_flight=1, executor=InlineExecutor()),
+                  [task('a', []), task('b', []), task('c', [])], RetryPolicy(retries=2), submitter=submit)
+    # the submissions that still failed are reported once all jobs are finished
+    assert ['a', 'a', 'b', 'b', 'b', 'c'] == sorted(submitted)
+    assert [requests.ConnectionError] == [type(error) for error in e.value.errors]
+
+
+def test_resource_failures_are_split():
+    submitted = []
+    monitor = FailingMonitor({'big': [('FME_FAILURE', 'ERROR |Memory allocation failed')]})
+    big = task('big', submitted, split=lambda: [task('big 1', submitted), task('big 2', submitted)])
+    run_tasks(JobQueue(monitor, executor=InlineExecutor()), [big], RetryPolicy(retries=1, split=True))
+    assert ['big', 'big 1', 'big 2'] == submitted
+
+    # without `split` the task is submitted as a whole again
+    submitted.clear()
+    monitor.failures = {'big': [('FME_FAILURE', 'ERROR |Memory allocation failed')]}
+    run_tasks(JobQueue(monitor, executor=InlineExecutor()), [big], RetryPolicy(retries=1))
+    assert ['big', 'big'] == submitted
+
+
+def test_waiting_jobs_are_submitted_off_the_monitor_thread(monitor):
+    threads = []
+
+    def submit(jobid):
+        def run():
+            threads.append(threading.current_thread().name)
+            return {'jobid': jobid, 'urltransform': 'fmerest/v2/transformations'}
+        return run
+
+    queue = JobQueue(monitor, max_in_flight=1)
+    queue.submit(submit(0))
+    second = queue.submit(submit(1))
+    finisher = threading.Thread(target=monitor.finish, args=(0,), name='fme-job-monitor')
+    finisher.start()
+    finisher.join()
+    for _ in range(100):
+        if len(threads) == 2:
+            break
+        time.sleep(0.01)
+    assert threads[1].startswith('fme-job-queue')
+    monitor.finish(1)
+    assert {'jobid': 1, 'status': 'SUCCESS'} == second.result(timeout=5)
@@ -0,0 +1,32 @@
+from fme.manifest import Manifest, file_hash
+
+
+def test_file_hash(tmpdir):
+    tmpdir.join('a').write('same')
+    tmpdir.join('b').write('same')
+    tmpdir.join('c').write('other')
+    assert file_hash(str(tmpdir.join('a')), chunk_size=2) == file_hash(str(tmpdir.join('b')))
+    assert file_hash(str(tmpdir.join('a'))) != file_hash(str(tmpdir.join('c')))
+
+
+def test_changes():
+    manifest = Manifest({'a.fmw': '1', 'b.fmw': '2', 'gone.fmw': '3', 'other.csv': '4'})
+    local = {'a.fmw': '1', 'b.fmw': 'changed', 'new.fmw': '5', 'removed.fmw': '1'}
+    existing = {'a.fmw', 'b.fmw', 'gone.fmw', 'other.csv'}
+
+    upload, stale = manifest.changes(local, '*.fmw', existing)
+    assert ['b.fmw', 'new.fmw', 'removed.fmw'] == upload
+    # files of other patterns are left alone
+    assert ['gone.fmw'] == stale
+
+
+def test_update_keeps_other_patterns():
+    manifest = Manifest({'a.fmw': '1', 'gone.fmw': '3', 'other.csv': '4'})
+    manifest.update({'a.fmw': '2'}, '*.fmw')
+    assert {'a.fmw': '2', 'other.csv': '4'} == manifest.hashes
+
+
+def test_json_round_trip():
+    manifest = Manifest({'a.fmw': '1'})
+    assert manifest.hashes == Manifest.from_json(manifest.to_json()).hashes
+    assert {} == Manifest.from_json('Not Found').hashes
@@ -0,0 +1,59 @@
+import random
+import re
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+
+from fme.comparison import GML_DISPATCH
+from fme.parallel_unzip import TABLES_FILE, extract, feature_type, import_feature_types, mapping_feature_types, selected
+from fme.run_report import report
+
+NAMES = ['bgt_pand.gml', 'bgt_wegdeel.gml', 'bgt_waterdeel.gml', 'bgt_nieuw.gml']
+
+
+@pytest.fixture
+def archive(tmpdir):
+    rng = random.Random(1)
+    contents = {name: bytes(rng.getrandbits(8) for _ in range(20000)) for name in NAMES}
+    path = str(tmpdir.join('extract_bgt.zip'))
+    with ZipFile(path, 'w', ZIP_DEFLATED) as zf:
+        for name in NAMES:
+            zf.writestr(name, contents[name])
+    return path, contents
+
+
+def test_feature_types():
+    assert 'pand' == feature_type('bgt_pand.gml')
+    assert 'pand' == feature_type('bgt_pand')
+    # the GML files of the comparison are in the mapping
+    assert {feature_type(name) for name in GML_DISPATCH} == mapping_feature_types()
+
+
+def test_feature_types_of_all_tables_are_imported():
+    with open(TABLES_FILE, encoding='utf-8') as f:
+        tables = re.findall(r'CREATE TABLE imgeo\.(bgt_\w+)', f.read())
+    assert 'bgt_kruinlijn' in tables
+    feature_types = import_feature_types()
+    for table in tables:
+        assert selected('{}.gml'.format(table), feature_types), table
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_extract_selected_members(archive, tmpdir, processes):
+    path, contents = archive
+    report.reset()
+    with report.stage('download_bgt'):
+        timings = extract(path, str(tmpdir.join('data')), import_feature_types(), processes=processes)
+
+    assert ['bgt_pand.gml', 'bgt_waterdeel.gml', 'bgt_wegdeel.gml'] == sorted(timing.name for timing in timings)
+    for timing in timings:
+        assert contents[timing.name] == tmpdir.join('data', timing.name).read_binary()
+        assert 20000 == timing.size
+    assert not tmpdir.join('data', 'bgt_nieuw.gml').exists()
+    extractions = report.to_dict()['stages']['download_bgt']['extractions']
+    assert sorted(timing.name for timing in timings) == sorted(item['member'] for item in extractions)
+
+
+def test_extract_all_members(archive, tmpdir):
+    path, contents = archive
+    assert sorted(NAMES) == sorted(timing.name for timing in extract(path, str(tmpdir.join('data')), processes=1))
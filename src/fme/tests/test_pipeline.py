@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from fme.checkpoint import Checkpoint
+from fme.pipeline import Pipeline, PipelineError
+
+
+def test_add_unknown_dependency():
+    p = Pipeline()
+    with pytest.raises(PipelineError):
+        p.add('b', lambda: None, depends_on=['a'])
+
+
+def test_add_duplicate_stage():
+    p = Pipeline()
+    p.add('a', lambda: None)
+    with pytest.raises(PipelineError):
+        p.add('a', lambda: None)
+
+
+def test_run_respects_dependencies():
+    order = []
+    p = Pipeline(max_workers=4)
+    p.add('a', lambda: order.append('a'))
+    p.add('b', lambda: order.append('b'), depends_on=['a'])
+    p.add('c', lambda: order.append('c'), depends_on=['b'])
+    p.run()
+    assert ['a', 'b', 'c'] == order
+
+
+def test_run_independent_stages_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    p = Pipeline(max_workers=2)
+    p.add('a', barrier.wait)
+    p.add('b', barrier.wait)
+    p.add('c', lambda: 'done', depends_on=['a', 'b'])
+    assert 'done' == p.run()['c']
+
+
+def test_run_failure_skips_dependents():
+    called = []
+
+    def fail():
+        raise ValueError('failed')
+
+    p = Pipeline(max_workers=2)
+    p.add('a', fail)
+    p.add('b', lambda: called.append('b'), depends_on=['a'])
+    with pytest.raises(PipelineError) as e:
+        p.run()
+    assert isinstance(e.value.__cause__, ValueError)
+    assert [] == called
+
+
+def test_critical_path():
+    p = Pipeline(max_workers=3)
+    p.add('short', lambda: None)
+    p.add('long', lambda: time.sleep(0.2))
+    p.add('end', lambda: None, depends_on=['short', 'long'])
+    p.run()
+    path, total = p.critical_path()
+    assert ['long', 'end'] == path
+    assert total >= 0.2
+
+
+def test_run_skips_stages_completed_in_checkpoint(tmpdir):
+    checkpoint = Checkpoint(str(tmpdir.join('checkpoint.json')))
+    checkpoint.complete('a')
+
+    called = []
+    p = Pipeline(checkpoint=checkpoint)
+    p.add('a', lambda: called.append('a'))
+    p.add('b', lambda: called.append('b') or 'b done', depends_on=['a'])
+    p.run()
+
+    assert ['b'] == called
+    assert checkpoint.is_complete('b')
+    assert 'b done' == Checkpoint(checkpoint.path).load().stages['b']['outputs']
@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+import pytest
+
+from fme.polling import Backoff, PollTimeout, poll
+
+
+def test_backoff_grows_to_maximum():
+    backoff = Backoff(initial=1, maximum=5, factor=2, jitter=0)
+    assert [1, 2, 4, 5, 5] == [backoff.next_delay() for _ in range(5)]
+
+
+def test_backoff_jitter():
+    backoff = Backoff(initial=10, factor=1, jitter=0.1)
+    assert all(9 <= backoff.next_delay() <= 11 for _ in range(20))
+
+
+def test_backoff_expected_duration():
+    backoff = Backoff(initial=1, jitter=0, expected=100)
+    assert 89 < backoff.next_delay() <= 90
+    with patch('fme.polling.time.monotonic', return_value=backoff.started + 99.5):
+        assert 1 == backoff.next_delay()
+
+
+def test_backoff_deadline():
+    backoff = Backoff(initial=10, jitter=0, timeout=15)
+    assert 10 == pytest.approx(backoff.next_delay(), abs=0.1)
+    with patch('fme.polling.time.monotonic', return_value=backoff.started + 12):
+        assert 3 == pytest.approx(backoff.next_delay())
+    with patch('fme.polling.time.monotonic', return_value=backoff.started + 15):
+        with pytest.raises(PollTimeout):
+            backoff.next_delay()
+
+
+@patch('fme.polling.time.sleep')
+def test_poll(mock_sleep):
+    results = iter(['PENDING', 'PENDING', 'RUNNING', 'PAUSED'])
+    assert 'RUNNING' == poll(lambda: next(results), lambda status: status == 'RUNNING', jitter=0)
+    assert [((1.0,),), ((2.0,),)] == mock_sleep.call_args_list
+
+
+def test_poll_timeout():
+    with pytest.raises(PollTimeout, match='Waiting for server'):
+        poll(lambda: 'PENDING', lambda status: status == 'RUNNING', description='server',
+             initial=0.01, timeout=0.05)
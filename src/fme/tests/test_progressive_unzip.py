@@ -0,0 +1,107 @@
+import io
+import os
+import random
+import zlib
+from zipfile import BadZipFile, ZIP_DEFLATED, ZipFile
+
+import pytest
+
+from fme.emulator import Emulator, ranged_response
+from fme.progressive_unzip import ProgressiveExtractor
+from fme.ranged_download import RangedDownload
+
+NAMES = ['bgt_pand.gml', 'bgt_wegdeel.gml', 'bgt_waterdeel.gml']
+
+
+def make_zip():
+    rng = random.Random(1)
+    contents = {name: bytes(rng.getrandbits(8) for _ in range(30000)) for name in NAMES}
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w', ZIP_DEFLATED) as zf:
+        for name in NAMES:
+            zf.writestr(name, contents[name])
+    return buffer.getvalue(), contents
+
+
+def wait(extractor):
+    for future in list(extractor.futures):
+        future.result()
+
+
+def test_extract_while_downloading(tmpdir):
+    data, contents = make_zip()
+    extracted = []
+    with Emulator() as server:
+        server.route('GET', r'/extract.zip', lambda request: ranged_response(request, data))
+        download = RangedDownload('{}/extract.zip'.format(server.url), str(tmpdir.join('extract.zip')),
+                                  connections=2, part_size=8000, tail_first=True)
+        extractor = ProgressiveExtractor(download.partial, str(tmpdir.join('data')), extracted.append)
+        download.on_part = extractor.available
+        download.run()
+        paths = extractor.finish()
+
+    assert sorted(NAMES) == sorted(os.path.basename(path) for path in paths)
+    assert sorted(paths) == sorted(extracted)
+    for name in NAMES:
+        assert contents[name] == tmpdir.join('data', name).read_binary()
+
+
+def test_members_are_extracted_when_complete(tmpdir):
+    data, contents = make_zip()
+    partial = tmpdir.join('extract.zip.part')
+    partial.write_binary(bytes(len(data)))
+    with ZipFile(io.BytesIO(data)) as zf:
+        second = zf.getinfo(NAMES[1]).header_offset
+        start_dir = zf.start_dir
+    extracted = []
+    extractor = ProgressiveExtractor(str(partial), str(tmpdir.join('data')), extracted.append)
+
+    def arrive(start, end):
+        with open(str(partial), 'r+b') as f:
+            f.seek(start)
+            f.write(data[start:end + 1])
+        extractor.available(start, end)
+        wait(extractor)
+
+    # the first member, but no central directory yet
+    arrive(0, second - 1)
+    assert [] == extracted
+    # the central directory
+    arrive(start_dir, len(data) - 1)
+    assert [NAMES[0]] == [os.path.basename(path) for path in extracted]
+    arrive(second, start_dir - 1)
+    assert NAMES == [os.path.basename(path) for path in extracted]
+    extractor.finish()
+
+
+def test_incomplete_file_is_an_error(tmpdir):
+    data, contents = make_zip()
+    partial = tmpdir.join('extract.zip.part')
+    partial.write_binary(data[:-1000] + bytes(1000))
+    extractor = ProgressiveExtractor(str(partial), str(tmpdir.join('data')))
+    extractor.available(0, len(data) - 1001)
+    with pytest.raises(BadZipFile):
+        extractor.finish()
+
+
+def test_damaged_member_is_an_error(tmpdir):
+    data, contents = make_zip()
+    with ZipFile(io.BytesIO(data)) as zf:
+        offset = zf.getinfo(NAMES[0]).header_offset + 100
+    damaged = bytearray(data)
+    damaged[offset] ^= 0xFF
+    partial = tmpdir.join('extract.zip.part')
+    partial.write_binary(bytes(damaged))
+    extractor = ProgressiveExtractor(str(partial), str(tmpdir.join('data')))
+    extractor.available(0, len(data) - 1)
+    with pytest.raises((BadZipFile, zlib.error)):
+        extractor.finish()
+
+
+def test_only_selected_members_are_extracted(tmpdir):
+    data, contents = make_zip()
+    partial = tmpdir.join('extract.zip.part')
+    partial.write_binary(data)
+    extractor = ProgressiveExtractor(str(partial), str(tmpdir.join('data')), select=lambda name: name != NAMES[1])
+    extractor.available(0, len(data) - 1)
+    assert [NAMES[0], NAMES[2]] == sorted(os.path.basename(path) for path in extractor.finish())
@@ -0,0 +1,69 @@
+import hashlib
+import json
+
+import pytest
+
+from fme.emulator import Emulator, ranged_response
+from fme.ranged_download import DownloadError, RangedDownload, download
+
+CONTENT = bytes(range(256)) * 400
+
+
+@pytest.fixture
+def server():
+    with Emulator() as emulator:
+        emulator.ranges = []
+
+        def get(request):
+            emulator.ranges.append(request.headers.get('Range'))
+            return ranged_response(request, CONTENT)
+
+        emulator.route('GET', r'/extract.zip', get)
+        emulator.route('GET', r'/no-ranges.zip', lambda request: (200, {}, CONTENT))
+        yield emulator
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr('fme.ranged_download.time.sleep', lambda delay: None)
+
+
+def test_parallel_download(server, tmpdir):
+    target = str(tmpdir.join('extract.zip'))
+    assert len(CONTENT) == download('{}/extract.zip'.format(server.url), target, connections=3, part_size=10000,
+                                    sha256=hashlib.sha256(CONTENT).hexdigest())
+    assert CONTENT == tmpdir.join('extract.zip').read_binary()
+    # the probe and 11 parts
+    assert 12 == len(server.ranges)
+    assert not tmpdir.join('extract.zip.part.json').exists()
+
+
+def test_resume_with_missing_parts(server, tmpdir):
+    url = '{}/extract.zip'.format(server.url)
+    partial = bytearray(len(CONTENT))
+    partial[:20000] = CONTENT[:20000]
+    tmpdir.join('extract.zip.part').write_binary(bytes(partial))
+    tmpdir.join('extract.zip.part.json').write(
+        json.dumps({'url': url, 'total': len(CONTENT), 'etag': None, 'done': [0, 10000]}))
+
+    download(url, str(tmpdir.join('extract.zip')), part_size=10000)
+    assert CONTENT == tmpdir.join('extract.zip').read_binary()
+    assert 'bytes=0-9999' not in server.ranges
+    assert 'bytes=20000-29999' in server.ranges
+
+
+def test_transient_errors_are_retried(server, tmpdir):
+    server.http_error_rate = 0.3
+    download('{}/extract.zip'.format(server.url), str(tmpdir.join('extract.zip')), part_size=10000, retries=10)
+    assert CONTENT == tmpdir.join('extract.zip').read_binary()
+
+
+def test_checksum_mismatch(server, tmpdir):
+    with pytest.raises(DownloadError):
+        download('{}/extract.zip'.format(server.url), str(tmpdir.join('extract.zip')), sha256='0' * 64)
+    assert not tmpdir.join('extract.zip').exists()
+
+
+def test_server_without_ranges(server, tmpdir):
+    RangedDownload('{}/no-ranges.zip'.format(server.url), str(tmpdir.join('extract.zip'))).run()
+    assert CONTENT == tmpdir.join('extract.zip').read_binary()
@@ -0,0 +1,65 @@
+import io
+import random
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+
+from fme.emulator import Emulator, ranged_response
+from fme.ranged_download import DownloadError
+from fme.remote_zip import RangedFile, RemoteZip, extract_members
+
+NAMES = ['bgt_pand.gml', 'bgt_wegdeel.gml', 'bgt_waterdeel.gml', 'bgt_bak.gml']
+
+
+@pytest.fixture
+def server():
+    rng = random.Random(1)
+    contents = {name: bytes(rng.getrandbits(8) for _ in range(50000)) for name in NAMES}
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w', ZIP_DEFLATED) as zf:
+        for name in NAMES:
+            zf.writestr(name, contents[name])
+    with Emulator() as emulator:
+        emulator.route('GET', r'/extract.zip', lambda request: ranged_response(request, buffer.getvalue()))
+        emulator.route('GET', r'/norange.zip', lambda request: (200, {}, buffer.getvalue()))
+        emulator.contents = contents
+        emulator.data = buffer.getvalue()
+        yield emulator
+
+
+def test_ranged_file_reads_like_a_file(server):
+    data = server.data
+    with RangedFile('{}/extract.zip'.format(server.url), block_size=4096, tail_size=1024) as f:
+        assert len(data) == f.seek(0, io.SEEK_END)
+        f.seek(1000)
+        assert data[1000:1100] == f.read(100)
+        # read ahead
+        assert data[1100:5000] == f.read(3900)
+        assert 2 == f.requests
+        f.seek(-10, io.SEEK_END)
+        assert data[-10:] == f.read()
+        assert b'' == f.read(1)
+
+
+def test_extract_selected_members(server, tmpdir):
+    with RemoteZip('{}/extract.zip'.format(server.url), block_size=8192, tail_size=4096) as archive:
+        assert NAMES == archive.namelist()
+        # the end of central directory record and the central directory come with the first request
+        assert 1 == archive.file.requests
+        paths = archive.extract(['bgt_wegdeel.gml'], str(tmpdir))
+        assert archive.file.downloaded < len(server.data) / 2
+
+    assert [str(tmpdir.join('bgt_wegdeel.gml'))] == paths
+    assert server.contents['bgt_wegdeel.gml'] == tmpdir.join('bgt_wegdeel.gml').read_binary()
+    assert not tmpdir.join('bgt_pand.gml').exists()
+
+
+def test_extract_members_skips_missing(server, tmpdir):
+    paths = extract_members('{}/extract.zip'.format(server.url), ['bgt_bak.gml', 'bgt_put.gml'],
+                            str(tmpdir.join('GML')))
+    assert [str(tmpdir.join('GML', 'bgt_bak.gml'))] == paths
+
+
+def test_server_without_ranges_is_an_error(server):
+    with pytest.raises(DownloadError):
+        RemoteZip('{}/norange.zip'.format(server.url))
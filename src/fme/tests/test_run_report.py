@@ -0,0 +1,43 @@
+import json
+import threading
+
+from fme.run_report import NO_STAGE, RunReport
+
+
+def test_counters_attributed_to_stage():
+    report = RunReport()
+    with report.stage('download_bgt'):
+        report.add_bytes_downloaded('pdok', 10)
+        report.add_bytes_downloaded('pdok', 5)
+    report.add_rows_inserted('imgeo.x', 3)
+
+    result = report.to_dict()
+    assert {'pdok': 15} == result['stages']['download_bgt']['bytes_downloaded']
+    assert {'imgeo.x': 3} == result['stages'][NO_STAGE]['rows_inserted']
+    assert {'pdok': 15} == result['totals']['bytes_downloaded']
+
+
+def test_bind_keeps_stage_in_other_thread():
+    report = RunReport()
+    with report.stage('upload_data'):
+        upload = report.bind(lambda: report.add_bytes_uploaded('fme', 7))
+    t = threading.Thread(target=upload)
+    t.start()
+    t.join()
+    assert {'fme': 7} == report.to_dict()['stages']['upload_data']['bytes_uploaded']
+
+
+def test_write(tmpdir):
+    report = RunReport()
+    with report.stage('transformation_db'):
+        report.add_job({'jobid': 1}, 'SUCCESS', queue_time=2.0, run_time=3.0)
+    report.stage_finished('transformation_db', 5.5)
+    report.set_critical_path(['transformation_db'])
+
+    path = str(tmpdir.join('report.json'))
+    report.write(path)
+    with open(path) as f:
+        result = json.load(f)
+    assert ['transformation_db'] == result['critical_path']
+    assert 5.5 == result['stages']['transformation_db']['wall_time']
+    assert 'SUCCESS' == result['stages']['transformation_db']['jobs'][0]['status']
@@ -0,0 +1,45 @@
+from concurrent.futures import Future
+
+import fme.transform_shapes as transform_shapes
+from fme.job_queue import JobQueue
+
+
+class ImmediateMonitor(object):
+    """Finishes every job as soon as it is watched"""
+
+    def watch(self, job, callback=None, expected=None, follow_log=False):
+        future = Future()
+        future.add_done_callback(callback)
+        future.set_result({'jobid': job['jobid'], 'status': 'SUCCESS'})
+        return future
+
+
+class InlineExecutor(object):
+    def submit(self, func, *args):
+        func(*args)
+
+
+def test_shape_jobs_are_submitted_through_the_queue(monkeypatch):
+    events = []
+
+    def start(shape_type):
+        events.append(('job', shape_type))
+        return {'jobid': len(events)}
+
+    monkeypatch.setattr(transform_shapes, 'shape_object_types', ['a', 'b'])
+    monkeypatch.setattr(transform_shapes, 'start_transformation_shapes_for', start)
+    monkeypatch.setattr(transform_shapes, 'download_shape_files', lambda t: events.append(('download', t)))
+    monkeypatch.setattr(transform_shapes, 'remove_shape_results', lambda t: events.append(('remove', t)))
+    monkeypatch.setattr(transform_shapes, 'zip_upload_and_cleanup_shape_results', lambda: events.append(('zip',)))
+
+    queue = JobQueue(ImmediateMonitor(), max_in_flight=1, executor=InlineExecutor())
+    submitted = []
+    queue_submit = queue.submit
+    monkeypatch.setattr(queue, 'submit', lambda submit, **kwargs: submitted.append(kwargs) or queue_submit(
+        submit, **kwargs))
+
+    transform_shapes.start_transformation_shapes(queue)
+
+    assert [('job', 'a'), ('download', 'a'), ('remove', 'a'),
+            ('job', 'b'), ('download', 'b'), ('remove', 'b'), ('zip',)] == events
+    assert [transform_shapes.SHAPES_WORKSPACE] * 2 == [kwargs['workspace'] for kwargs in submitted]
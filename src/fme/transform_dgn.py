@@ -1,12 +1,6 @@
-import json
 import logging
 from datetime import datetime
-from zipfile import ZipFile
 
-import os
-import requests
-
-import bgt_setup
 import fme.fme_utils as fme_utils
 from objectstore.objectstore import ObjectStore
 
@@ -41,36 +35,6 @@ def upload_dgn_files():
     log.info("ZIP and upload DGNv8 products to BGT objectstore")
 
     store = ObjectStore('BGT')
-    headers = {
-        'Content-Type': "application/json",
-        'Authorization': 'fmetoken token={FME_INSTANCE_API_TOKEN}'.format(FME_INSTANCE_API_TOKEN=bgt_setup.FME_INSTANCE_API_TOKEN),
-    }
-    url = '{FME_BASE_URL}/fmerest/v2/resources/connections/' \
-          'FME_SHAREDRESOURCE_DATA/filesys/{folder}?' \
-          'accept=json&depth=1&detail=low'.format(FME_BASE_URL=bgt_setup.FME_BASE_URL, folder='DGNv8')
-    if not os.path.exists('/tmp/data'):
-        os.makedirs('/tmp/data')
-    zip_filename = '/tmp/data/DGNv8_DGN.zip'
-    zf = ZipFile(zip_filename, mode='w')
-
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        try:
-            for entry in json.loads(response.content)['contents']:
-                filename = entry['name']
-                path = entry['path']
-                upload_path = "DGNv8_DGN"
-                log.info(f"Upload file {upload_path}/{filename}")
-                file_content = fme_utils.download(f'{path}/{filename}', text=False)
-                zf.writestr(filename, file_content)
-        finally:
-            zf.close()
-
-        with open(zip_filename, mode='rb') as f:
-            store.put_to_objectstore(
-                'BGT_Kaartbladen/DGNv8/DGNv8-latest.zip', f.read(), 'application/octet-stream')
-
-        os.remove(zip_filename)
-    else:
-        response.raise_for_status()
+    store.put_stream(
+        'BGT_Kaartbladen/DGNv8/DGNv8-latest.zip', fme_utils.zip_folder('DGNv8'), 'application/octet-stream')
     log.info("ZIP and upload DGNv8 products to BGT objectstore done")
@@ -1,4 +1,5 @@
 import logging
+import tempfile
 from datetime import datetime
 
 import fme.fme_utils as fme_utils
@@ -55,11 +56,13 @@ def upload_gebieden():
             timestamp=''
         )
         log.info(f"Download file {download_path}")
-        file_content = fme_utils.download(download_path, text=False)
-        log.info(f"Upload {filename}")
-        upload_path_template = f'Kaartbladindeling/{filename}'
-        store.put_to_objectstore(
-            upload_path_template.format(timestamp='-latest'),
-            file_content,
-            'application/octet-stream'
-        )
+        with tempfile.TemporaryFile() as file_content:
+            fme_utils.download_to(download_path, file_content)
+            file_content.seek(0)
+            log.info(f"Upload {filename}")
+            upload_path_template = f'Kaartbladindeling/{filename}'
+            store.put_to_objectstore(
+                upload_path_template.format(timestamp='-latest'),
+                file_content,
+                'application/octet-stream'
+            )
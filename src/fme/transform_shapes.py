@@ -1,17 +1,21 @@
 import logging
 import shutil
 from datetime import datetime
+from functools import partial
 from zipfile import ZipFile
 
 import os
-import requests
 
 import bgt_setup
 import fme.fme_utils as fme_utils
+from fme.http_session import session
+from fme.job_queue import JobTask, run_tasks
 from objectstore.objectstore import ObjectStore
 
 log = logging.getLogger(__name__)
 
+SHAPES_WORKSPACE = 'aanmaak_esrishape_csv_zip.fmw'
+
 shape_object_types = [
     'imgeo_extractie.vw_bgt_begroeidterreindeel',
     'imgeo_extractie.vw_bgt_kruinlijn',
@@ -64,7 +68,7 @@ def start_transformation_shapes_for(shape_type):
 
     return fme_utils.run_transformation_job(
         'BGT-SHAPES',
-        'aanmaak_esrishape_csv_zip.fmw',
+        SHAPES_WORKSPACE,
         {
             "subsection": "REST_SERVICE",
             "FMEDirectives": {},
@@ -90,8 +94,7 @@ def download_shape_files(shape_type):
         if not os.path.exists(directory):
             os.makedirs(directory)
 
-        with open(f'/tmp/data/shaperesults{filename}', 'wb') as file:
-            file.write(fme_utils.download(filename, text=False))
+        fme_utils.download_to(filename, f'/tmp/data/shaperesults{filename}')
 
     log.info(f"downloaded shape results for {shape_type}")
 
@@ -117,17 +120,14 @@ def collect_shape_files_to_fetch():
                     res.append('{}{}'.format(file_object['path'], file_object['name']))
         return res
 
-    headers = {
-        'Content-Type': "application/json",
-        'Authorization': 'fmetoken token={FME_INSTANCE_API_TOKEN}'.format(FME_INSTANCE_API_TOKEN=bgt_setup.FME_INSTANCE_API_TOKEN),
-    }
+    headers = fme_utils.fme_instance_api_auth('application/json')
     files_to_fetch = []
 
     for fme_folder in ['ASCII_totaal', 'Esri_Shape_totaal', 'ASCII_gebieden', 'Esri_Shape_gebieden']:
         url = '{FME_BASE_URL}/fmerest/v2/resources/connections/' \
               'FME_SHAREDRESOURCE_DATA/filesys/{folder}?' \
               'accept=json&depth=4&detail=low'.format(FME_BASE_URL=bgt_setup.FME_BASE_URL, folder=fme_folder)
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=headers)
         if response.status_code == 200:
             if '_gebieden' in fme_folder:
                 files_to_fetch += get_paths2(response.json()['contents'])
@@ -138,27 +138,36 @@ def collect_shape_files_to_fetch():
 
 def remove_shape_results(shape_type):
     log.info(f"remove results for {shape_type}")
-    headers = {
-        'Content-Type': "application/json",
-        'Authorization': 'fmetoken token={FME_INSTANCE_API_TOKEN}'.format(FME_INSTANCE_API_TOKEN=bgt_setup.FME_INSTANCE_API_TOKEN),
-    }
+    headers = fme_utils.fme_instance_api_auth('application/json')
     for fme_folder in ['ASCII_totaal', 'Esri_Shape_totaal', 'ASCII_gebieden', 'Esri_Shape_gebieden']:
         url = '{FME_BASE_URL}/fmerest/v2/resources/connections/' \
               'FME_SHAREDRESOURCE_DATA/filesys/{folder}?' \
               'accept=json&depth=4&detail=low'.format(FME_BASE_URL=bgt_setup.FME_BASE_URL, folder=fme_folder)
-        response = requests.delete(url, headers=headers)
+        response = session.delete(url, headers=headers)
         if response.status_code == 204:
             log.info(f"removed folder {fme_folder}")
         else:
             log.info(f"Removing folder {fme_folder} failed {response.status_code}")
 
 
+def _zip_directory(root, directory, f):
+    """
+    Write a zip with `directory` in `root` and everything in it to the file-like
+    object `f`, with the paths in the zip relative to `root`
+    """
+    with ZipFile(f, "w") as zf:
+        for dirname, subdirs, files in os.walk(os.path.join(root, directory)):
+            zf.write(dirname, os.path.relpath(dirname, root))
+            for filename in files:
+                path = os.path.join(dirname, filename)
+                zf.write(path, os.path.relpath(path, root))
+
+
 def zip_upload_and_cleanup_shape_results():
     store = ObjectStore('BGT')
     names = ["latest"]
-    cwd = os.getcwd()
+    root = '/tmp/data/shaperesults'
 
-    os.chdir('/tmp/data/shaperesults')
     log.info("Upload Zip Shape results")
 
     for source_folder, destination_folder in {
@@ -167,35 +176,30 @@ def zip_upload_and_cleanup_shape_results():
         'ASCII_gebieden':       'BGT_Gebieden',
         'Esri_Shape_gebieden':  'BGT_Gebieden'
     }.items():
-        zipfile_name = f"/tmp/data/shaperesults/{source_folder}.zip"
-        with ZipFile(f'{source_folder}.zip', "w") as zf:
-            for dirname, subdirs, files in os.walk(source_folder):
-                zf.write(dirname)
-                for filename in files:
-                    zf.write(os.path.join(dirname, filename))
-
         for name in names:
-            log.info(f"upload {zipfile_name}:{name} to object store")
-            with open(zipfile_name, 'rb') as uploadfile:
-                store.put_to_objectstore(
-                    '{}/{}-{}.zip'.format(destination_folder, source_folder, name),
-                    uploadfile,
-                    'application/octet-stream')
-
-    os.chdir(cwd)
+            log.info(f"upload {source_folder}.zip:{name} to object store")
+            store.put_stream(
+                '{}/{}-{}.zip'.format(destination_folder, source_folder, name),
+                partial(_zip_directory, root, source_folder),
+                'application/octet-stream')
+
     log.info("Clean up results")
-    shutil.rmtree('/tmp/data/shaperesults', ignore_errors=True)
+    shutil.rmtree(root, ignore_errors=True)
     log.info("Zipped results and uploaded them to the objectstore")
 
 
-def start_transformation_shapes():
+def start_transformation_shapes(queue):
     """
-    Transform the shapes per shape object type
+    Transform the shapes per shape object type. The jobs are submitted through
+    `queue`, one at a time: every job writes to the same FME folders, which are
+    downloaded and emptied before the next job starts.
+    :param queue: JobQueue submitting the jobs
     :return:
     """
     log.info("Start transformation of shapes")
     for shape_type in shape_object_types:
-        fme_utils.wait_for_job_to_complete(start_transformation_shapes_for(shape_type), sleep_time=1)
+        run_tasks(queue, [JobTask(shape_type, partial(start_transformation_shapes_for, shape_type),
+                                  workspace=SHAPES_WORKSPACE)])
         download_shape_files(shape_type)
         remove_shape_results(shape_type)
 
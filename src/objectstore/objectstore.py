@@ -1,6 +1,10 @@
 import logging
+import queue
+import threading
+
 from swiftclient.client import Connection
 from bgt_setup import OBJECTSTORES
+from fme.run_report import report, size_of
 
 log = logging.getLogger(__name__)
 
@@ -9,6 +13,85 @@ logging.getLogger("urllib3").setLevel(logging.WARNING)
 logging.getLogger("swiftclient").setLevel(logging.WARNING)
 
 
+class _Pipe(object):
+    """
+    Bytes written in one thread and read in another. The writer blocks while
+    `max_chunks` chunks of `chunk_size` bytes are waiting to be read, so the
+    memory used does not depend on the amount of data passed through.
+    """
+
+    def __init__(self, chunk_size=64 * 1024, max_chunks=16):
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(max_chunks)
+        self.pending = bytearray()
+        self.buffer = b''
+        self.position = 0
+        self.finished = False
+        self.aborted = threading.Event()
+
+    def _put(self, item):
+        while not self.aborted.is_set():
+            try:
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+        raise IOError("Reader of the pipe stopped")
+
+    # writer side
+
+    def write(self, data):
+        self.pending += data
+        if len(self.pending) >= self.chunk_size:
+            self._put(bytes(self.pending))
+            self.pending = bytearray()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self, error=None):
+        """End the data, with `error` raised in the reader when given"""
+        if self.aborted.is_set():
+            return
+        if self.pending and error is None:
+            self._put(bytes(self.pending))
+        self.pending = bytearray()
+        self._put(error)
+
+    # reader side
+
+    def read(self, size=-1) -> bytes:
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            item = self.chunks.get()
+            if isinstance(item, BaseException):
+                self.finished = True
+                raise item
+            if item is None:
+                self.finished = True
+            else:
+                self.buffer += item
+        size = len(self.buffer) if size < 0 else size
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        self.position += len(data)
+        return data
+
+    def tell(self) -> int:
+        return self.position
+
+    def abort(self):
+        """Stop the writer, the data will not be read"""
+        self.aborted.set()
+
+
+class _PipeWriter(object):
+    """The writer side of a `_Pipe`, unseekable so a ZipFile writes it as a stream"""
+
+    def __init__(self, pipe):
+        self.write = pipe.write
+        self.flush = pipe.flush
+
+
 class ObjectStore():
     RESP_LIMIT = 10000  # serverside limit of the response
 
@@ -50,7 +133,41 @@ class ObjectStore():
         return file_list
 
     def put_to_objectstore(self, object_name, object_content, content_type):
-        return self.conn.put_object(self.container, object_name, contents=object_content, content_type=content_type)
+        res = self.conn.put_object(self.container, object_name, contents=object_content, content_type=content_type)
+        report.add_bytes_uploaded('objectstore', size_of(object_content))
+        return res
+
+    def put_stream(self, object_name, produce, content_type):
+        """
+        Upload an object that is written while it is uploaded, such as a zip
+        built on the fly. `produce` gets a file-like object to write the
+        contents to and runs in another thread; the contents are sent with
+        chunked transfer encoding, without holding them in memory or on disk.
+        :param object_name:
+        :param produce: callable writing the contents to the file-like object it gets
+        :param content_type:
+        :return: the result of `put_object`
+        """
+        pipe = _Pipe()
+
+        def run():
+            try:
+                produce(_PipeWriter(pipe))
+            except BaseException as e:
+                log.error("Writing %s failed: %s", object_name, e)
+                pipe.close(e)
+            else:
+                pipe.close()
+
+        producer = threading.Thread(target=report.bind(run), name='put-{}'.format(object_name), daemon=True)
+        producer.start()
+        try:
+            res = self.conn.put_object(self.container, object_name, contents=pipe, content_type=content_type)
+        finally:
+            pipe.abort()
+            producer.join()
+        report.add_bytes_uploaded('objectstore', pipe.tell())
+        return res
 
     def delete_from_objectstore(self, object_name):
         try:
@@ -3,6 +3,7 @@ import os.path
 import mimetypes
 import pytest
 
+from fme.emulator import emulated_services
 from ..objectstore  import ObjectStore
 
 
@@ -37,3 +38,26 @@ def test_objects(objectstore):
 
     res = objectstore._get_full_container_list([], prefix='bgttest/')
     assert len(res) == 5
+
+
+def test_put_stream():
+    content = bytes(range(256)) * 10000
+
+    def write(f):
+        for i in range(0, len(content), 1000):
+            f.write(content[i:i + 1000])
+
+    with emulated_services() as (_, swift):
+        ObjectStore('BGT').put_stream('BGT_Totaal/big.bin', write, 'application/octet-stream')
+        assert content == swift.containers['BGT']['BGT_Totaal/big.bin']
+
+
+def test_put_stream_fails_when_the_writer_fails():
+    def broken(f):
+        f.write(b'partial')
+        raise ValueError("no zip")
+
+    with emulated_services() as (_, swift):
+        with pytest.raises(ValueError):
+            ObjectStore('BGT').put_stream('BGT_Totaal/broken.zip', broken, 'application/octet-stream')
+        assert 'BGT_Totaal/broken.zip' not in swift.containers['BGT']